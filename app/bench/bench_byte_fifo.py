@@ -0,0 +1,136 @@
+'''Micro-benchmark for the ByteFifo receive buffer
+
+Pushes thousands of concatenated Solarman V5 frames into a ByteFifo and
+consumes them frame by frame, the same way the protocol classes do it.
+The burst is run with two sizes to show that the cost per frame does not
+grow with the amount of buffered data. The 'single' run receives one frame
+per read, which is the common case on an inverter connection.
+The results are compared with the former implementation and with an
+offset based read cursor.
+
+usage: python app/bench/bench_byte_fifo.py [frames] [rounds]
+'''
+import os
+import sys
+import struct
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from byte_fifo import ByteFifo  # noqa: E402
+
+
+class LegacyFifo:
+    '''former implementation, which copies every consumed frame'''
+    def __init__(self):
+        self.buf = bytearray()
+
+    def __iadd__(self, data):
+        self.buf.extend(data)
+        return self
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    def peek(self, size: int = None) -> bytearray:
+        if not size:
+            return self.buf
+        return self.buf[:size]
+
+    def get(self, size: int = None) -> bytearray:
+        if not size:
+            data = self.buf
+            self.buf = bytearray()
+        else:
+            data = self.buf[:size]
+            self.buf[:size] = b''
+        return data
+
+
+class CursorFifo(LegacyFifo):
+    '''read cursor with lazy compaction'''
+    def __init__(self):
+        super().__init__()
+        self.rd = 0
+
+    def __len__(self) -> int:
+        return len(self.buf) - self.rd
+
+    def peek(self, size: int = None) -> bytearray:
+        return self.buf[self.rd:self.rd+size]
+
+    def get(self, size: int = None) -> bytearray:
+        rd = self.rd
+        data = self.buf[rd:rd+size]
+        rd += size
+        if rd >= len(self.buf):
+            self.buf = bytearray()
+            rd = 0
+        elif rd > (len(self.buf) >> 1):
+            del self.buf[:rd]
+            rd = 0
+        self.rd = rd
+        return data
+
+
+def v5_frame(ctrl: int, seq: int, data: bytes) -> bytes:
+    '''build a Solarman V5 frame with valid checksum'''
+    msg = struct.pack('<BHHHL', 0xA5, len(data), ctrl, seq, 2070233889)
+    msg += data
+    check = sum(msg[1:]) & 0xff
+    return msg + struct.pack('<BB', check, 0x15)
+
+
+def build_burst(frames: int) -> bytes:
+    data_ind = v5_frame(0x4210, 0x0101, bytes(0x1a4 - 13))
+    hbeat_ind = v5_frame(0x4710, 0x0102, b'\x00')
+    burst = bytearray()
+    for i in range(frames):
+        burst += data_ind if i % 4 else hbeat_ind
+    return bytes(burst)
+
+
+def parse(fifo) -> int:
+    cnt = 0
+    while len(fifo) >= 11:
+        hdr = fifo.peek(11)
+        data_len = struct.unpack_from('<H', hdr, 1)[0]
+        fifo.get(data_len + 13)
+        cnt += 1
+    return cnt
+
+
+def consume_burst(fifo_cls, burst: bytes, _) -> int:
+    fifo = fifo_cls()
+    fifo += burst
+    return parse(fifo)
+
+
+def consume_single(fifo_cls, _, frames: list[bytes]) -> int:
+    fifo = fifo_cls()
+    cnt = 0
+    for frame in frames:
+        fifo += frame
+        cnt += parse(fifo)
+    return cnt
+
+
+def main(frames: int = 5000, rounds: int = 5):
+    for name, run, cnt in (('burst x1 ', consume_burst, frames),
+                           ('burst x10', consume_burst, frames*10),
+                           ('single   ', consume_single, frames)):
+        burst = build_burst(cnt)
+        single = [bytes(build_burst(1))] * cnt
+        print(f'{name}: {cnt} frames, {len(burst)} bytes')
+        for fifo_name, fifo_cls in (('legacy', LegacyFifo),
+                                    ('cursor', CursorFifo),
+                                    ('actual', ByteFifo)):
+            assert run(fifo_cls, burst, single) == cnt
+            sec = min(timeit.repeat(lambda: run(fifo_cls, burst, single),
+                                    number=3, repeat=rounds)) / 3
+            print(f'  {fifo_name}: {sec*1000:8.2f} ms  '
+                  f'{sec*1e9/cnt:8.0f} ns/frame')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,127 @@
+'''Benchmark of the two connection engines
+
+Compares the StreamReader based loop of AsyncStream with the
+asyncio.Protocol based engine. A listener with the selected engine
+answers every received frame, N clients send M frames each over the
+loopback interface and wait for each response, like an inverter does.
+Reported are the processed messages per second and the memory, which is
+allocated per idle connection (measured with tracemalloc).
+
+usage: python app/bench/bench_conn_engine.py [connections] [messages]
+'''
+import os
+import sys
+import time
+import asyncio
+import logging
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import async_protocol  # noqa: E402
+from async_stream import AsyncStreamServer, StreamPtr  # noqa: E402
+from infos import Infos  # noqa: E402
+
+FRAME = b'\xa5' + bytes(30) + b'\x15'
+
+
+class Listener():
+    def __init__(self, engine: str):
+        self.engine = engine
+        self.conns = set()
+        self.server = None
+
+    async def start(self) -> int:
+        if self.engine == 'protocol':
+            start_server = async_protocol.start_server
+        else:
+            start_server = asyncio.start_server
+        self.server = await start_server(self.handle_client,
+                                         '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_client(self, reader, writer):
+        ifc = AsyncStreamServer(reader, writer, None, None, StreamPtr(None))
+
+        def app_read():
+            while ifc.rx_len() >= len(FRAME):
+                ifc.rx_get(len(FRAME))
+                ifc.tx_add(FRAME)
+                ifc.tx_flush()
+            return 0
+
+        ifc.rx_set_cb(app_read)
+        self.conns.add(ifc)
+        await ifc.loop()
+        self.conns.discard(ifc)
+        ifc.close()
+
+
+async def client(port: int, msgs: int, start: asyncio.Event):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    await start.wait()
+    for _ in range(msgs):
+        writer.write(FRAME)
+        await reader.readexactly(len(FRAME))
+    writer.close()
+    await writer.wait_closed()
+
+
+async def wait_for_conns(listener: Listener, cnt: int):
+    while len(listener.conns) < cnt:
+        await asyncio.sleep(0.01)
+
+
+async def run_throughput(engine: str, conns: int, msgs: int) -> float:
+    listener = Listener(engine)
+    port = await listener.start()
+    start = asyncio.Event()
+    tasks = [asyncio.create_task(client(port, msgs, start))
+             for _ in range(conns)]
+    await wait_for_conns(listener, conns)
+    t0 = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    sec = time.perf_counter() - t0
+    await listener.stop()
+    return conns * msgs / sec
+
+
+async def run_memory(engine: str, conns: int) -> float:
+    listener = Listener(engine)
+    port = await listener.start()
+    writers = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(conns):
+        _, writer = await asyncio.open_connection('127.0.0.1', port)
+        writers.append(writer)
+    await wait_for_conns(listener, conns)
+    await asyncio.sleep(0.1)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    for writer in writers:
+        writer.close()
+    await listener.stop()
+    # the client side of the loopback connections is included, it is the
+    # same for both engines
+    return (after - before) / conns
+
+
+def main(conns: int = 50, msgs: int = 400):
+    logging.disable(logging.CRITICAL)
+    Infos.static_init()
+    print(f'{conns} connections, {msgs} messages per connection')
+    for engine in ('stream', 'protocol'):
+        rate = asyncio.run(run_throughput(engine, conns, msgs))
+        mem = asyncio.run(run_memory(engine, conns))
+        print(f'  {engine:8}: {rate:10.0f} msg/s  '
+              f'{mem/1024:8.1f} KiB/connection')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,89 @@
+'''Benchmark of the GEN3PLUS data frame parser
+
+Parses 0x4210 data frames of the sensor lists 0x02b0 (inverter), 0x1097
+(inverter, partly defined) and 0x3026 (battery) into an InfosG3P db. Two
+frames with different values are parsed alternately, so every register
+is updated each time. The former parser, which scans the whole register
+map for every frame, is compared with the compiled parse plans of
+InfosG3P.parse().
+
+usage: python app/bench/bench_g3p_parse.py [frames] [rounds]
+'''
+import os
+import sys
+import timeit
+import random
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from infos import Fmt  # noqa: E402
+from gen3plus.infos_g3p import InfosG3P, RegisterSel  # noqa: E402
+
+SENSORS = (0x02b0, 0x1097, 0x3026)
+
+
+class LegacyInfosG3P(InfosG3P):
+    def parse(self, buf, msg_type: int, rcv_ftype: int,
+              sensor: int = 0, node_id: str = ''):
+        '''former implementation of InfosG3P.parse()'''
+        reg_map = RegisterSel.get(sensor)
+        for idx, row in reg_map.items():
+            if 'calc' == idx or 'len' == idx:
+                continue
+            addr = idx & 0xffff
+            ftype = (idx >> 16) & 0xff
+            mtype = (idx >> 24) & 0xff
+            if ftype != rcv_ftype or mtype != msg_type:
+                continue
+            if not isinstance(row, dict):
+                continue
+            info_id = row['reg']
+            result = Fmt.get_value(buf, addr, row)
+            if result is None:
+                continue
+            keys, level, unit, must_incr = self._key_obj(info_id)
+            if keys:
+                name, update = self.update_db(keys, must_incr, result)
+                yield keys[0], update
+                if update:
+                    self.tracer.log(level, f'[{node_id}] GEN3PLUS: {name}'
+                                           f' : {result}{unit}')
+        yield from self.calc(sensor, node_id)
+
+
+def build_frame(rnd, sensor: int, incr: int) -> bytes:
+    # printable bytes for the string registers, the counters (must_incr)
+    # are increasing, so every value is different
+    size = RegisterSel.get(sensor)['len']
+    data = bytearray((rnd.randrange(0x20, 0x7e) + incr) & 0x7f
+                     for _ in range(size))
+    data[0x0c:0x0e] = sensor.to_bytes(2, 'little')
+    return bytes(data)
+
+
+def run(db, frames, sensor, cnt) -> int:
+    vals = 0
+    for i in range(cnt):
+        for _ in db.parse(frames[i & 1], 0x42, 1, sensor):
+            vals += 1
+    return vals
+
+
+def main(cnt: int = 2000, rounds: int = 5):
+    logging.disable(logging.CRITICAL)
+    rnd = random.Random(4711)
+    for sensor in SENSORS:
+        frames = [build_frame(rnd, sensor, 0), build_frame(rnd, sensor, 1)]
+        print(f'sensor list {sensor:04x}, {len(frames[0])} bytes:')
+        for name, cls in (('legacy', LegacyInfosG3P), ('plan  ', InfosG3P)):
+            db = cls(client_mode=False)
+            vals = run(db, frames, sensor, 2)
+            sec = min(timeit.repeat(lambda: run(db, frames, sensor, cnt),
+                                    number=1, repeat=rounds))
+            print(f'  {name}: {cnt/sec:9.0f} frames/s  '
+                  f'{sec*1e6/cnt:7.1f} us/frame  ({vals//2} values)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,78 @@
+'''Benchmark of the Home Assistant discovery run
+
+Builds the discovery payloads of a GEN3PLUS inverter (sensor list 0x02b0)
+and of a GEN3PLUS battery (sensor list 0x3026) with all device values,
+like InverterBase does it after new inverter, collector or battery data.
+The former run, which builds and serializes every entity again, is
+compared with the cached payloads of Infos.ha_conf(). The last column
+shows the number of topics, which are published again, if the payloads
+are compared with the last published ones.
+
+usage: python app/bench/bench_ha_discovery.py [runs] [rounds]
+'''
+import os
+import sys
+import timeit
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from infos import Infos, Register  # noqa: E402
+from gen3plus.infos_g3p import InfosG3P  # noqa: E402
+
+DEVICES = (('inverter', '02b0', 2), ('battery ', '3026', 0))
+DEV_VALUES = {
+    Register.CHIP_MODEL: 'LSW5BLE_17_02B0_1.05',
+    Register.CHIP_TYPE: 'IGEN TECH',
+    Register.COLLECTOR_FW_VERSION: 'V1.1.00.0B',
+    Register.MAC_ADDR: '40:2a:8f:4f:51:54',
+    Register.COLLECTOR_SNR: '4165545823',
+    Register.EQUIPMENT_MODEL: 'TSOL-MSxx00',
+    Register.MANUFACTURER: 'TSUN',
+    Register.VERSION: 'V5.0.11',
+    Register.SERIAL_NUMBER: 'Y17E00000000000E',
+    Register.BATT_HW_VERS: 'V1.0',
+    Register.BATT_SW_VERS: 'V2.1',
+    Register.PV1_MANUFACTURER: 'Fabrikant',
+    Register.PV1_MODEL: 'Modell',
+}
+
+
+def discovery(db: Infos, published: dict, legacy: bool) -> int:
+    '''one discovery run, returns the number of topics to publish'''
+    if legacy:
+        db.ha_cache.clear()     # the former run built every entity
+    cnt = 0
+    for data_json, component, node_id, id in db.ha_confs(
+            'tsun/', 'garagendach/', 'Y17E00000000000E', 'roof'):
+        topic = f'homeassistant/{component}/{node_id}{id}/config'
+        if legacy or published.get(topic) != data_json:
+            published[topic] = data_json
+            cnt += 1
+    return cnt
+
+
+def main(cnt: int = 200, rounds: int = 5):
+    logging.disable(logging.CRITICAL)
+    Infos.static_init()
+    for name, sensor, inputs in DEVICES:
+        print(f'{name} (sensor list {sensor}):')
+        for variant, legacy in (('legacy', True), ('cached', False)):
+            db = InfosG3P(client_mode=False)
+            db.set_db_def_value(Register.SENSOR_LIST, sensor)
+            db.set_db_def_value(Register.NO_INPUTS, inputs)
+            for reg, value in DEV_VALUES.items():
+                db.set_db_def_value(reg, value)
+            published = {}
+            entities = discovery(db, published, legacy)
+            sec = min(timeit.repeat(
+                lambda: discovery(db, published, legacy),
+                number=cnt, repeat=rounds))
+            topics = discovery(db, published, legacy)
+            print(f'  {variant}: {cnt/sec:8.0f} runs/s  '
+                  f'{sec*1e6/cnt:7.1f} us/run  ({entities} entities,'
+                  f' {topics} published again)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
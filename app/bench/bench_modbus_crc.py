@@ -0,0 +1,91 @@
+'''Benchmark of the MODBUS CRC-16 engine
+
+Calculates and verifies the CRC of realistic MODBUS RTU frames: read and
+write requests (8 bytes) and read responses with 1..120 registers (7 to
+245 bytes). The results of the former byte-wise implementation, of the
+python implementation with the 16-bit table and of the selected backend
+(crcmod, if installed) are compared. The verify runs check one valid and
+one broken frame, like the former code did with two CRC calculations.
+
+usage: python app/bench/bench_modbus_crc.py [frames] [rounds]
+'''
+import os
+import sys
+import random
+import struct
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import crc16  # noqa: E402
+
+LEGACY_TAB = []
+
+
+def legacy_crc(buffer: bytes) -> int:
+    '''former implementation, byte by byte'''
+    crc = 0xFFFF
+    for cur in buffer:
+        crc = (crc >> 8) ^ LEGACY_TAB[(crc ^ cur) & 0xFF]
+    return crc
+
+
+def legacy_verify(msg: bytes) -> tuple[bool, int]:
+    '''former check, a second run calculates the expected CRC'''
+    valid = 0 == legacy_crc(msg)
+    crc = 0
+    if not valid:
+        crc = legacy_crc(msg[:-2])
+    return valid, crc
+
+
+def build_frames(cnt: int) -> list[bytes]:
+    rnd = random.Random(4711)
+    frames = []
+    for i in range(cnt):
+        if i % 3 == 0:
+            pdu = struct.pack('>BBHH', 1, rnd.choice((3, 6)),
+                              rnd.randrange(0x10000), rnd.randrange(1, 120))
+        else:
+            regs = rnd.randrange(1, 121)
+            pdu = struct.pack('>BBB', 1, 3, 2*regs) + rnd.randbytes(2*regs)
+        frames.append(pdu + struct.pack('<H', crc16.calc_crc(pdu)))
+    return frames
+
+
+def main(cnt: int = 2000, rounds: int = 5):
+    for index in range(256):
+        crc = index
+        for _ in range(8):
+            crc = (crc >> 1) ^ crc16.CRC_POLY if crc & 1 else crc >> 1
+        LEGACY_TAB.append(crc)
+
+    frames = build_frames(cnt)
+    broken = [f[:-1] + bytes([f[-1] ^ 0xff]) for f in frames]
+    size = sum(map(len, frames))
+    print(f'{cnt} frames, {size/cnt:.0f} bytes on average, '
+          f'backend: {crc16.BACKEND}')
+
+    variants = [('legacy ', legacy_crc),
+                ('python ', crc16._calc_crc_py)]
+    if crc16.BACKEND != 'python':
+        variants.append((f'{crc16.BACKEND:7}', crc16.calc_crc))
+    for name, calc in variants:
+        assert all(calc(f) == 0 for f in frames)
+        sec = min(timeit.repeat(lambda: [calc(f) for f in frames],
+                                number=1, repeat=rounds))
+        print(f'  calc   {name}: {cnt/sec:10.0f} frames/s  '
+              f'{sec*1e9/size:6.1f} ns/byte')
+
+    for name, verify in (('legacy ', legacy_verify),
+                         ('actual ', crc16.verify_crc)):
+        def run():
+            for f, b in zip(frames, broken):
+                verify(f)
+                verify(b)
+        sec = min(timeit.repeat(run, number=1, repeat=rounds))
+        print(f'  verify {name}: {2*cnt/sec:10.0f} frames/s')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
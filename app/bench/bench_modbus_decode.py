@@ -0,0 +1,86 @@
+'''Benchmark of the MODBUS response decoding
+
+Decodes the responses of the three polling blocks 0x3000 (48 registers),
+0x1000 (16 registers) and 0x0000 (45 registers) into an InfosG3P db. Two
+responses with different values are decoded alternately, so every mapped
+register is updated each time. The former decoder, which looks up every
+register in the mapping and probes the row, is compared with the
+compiled decode plans of Modbus.__process_data().
+
+usage: python app/bench/bench_modbus_decode.py [responses] [rounds]
+'''
+import os
+import sys
+import timeit
+import random
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from infos import Fmt  # noqa: E402
+from modbus import Modbus  # noqa: E402
+from gen3plus.infos_g3p import InfosG3P  # noqa: E402
+
+BLOCKS = ((0x3000, 48), (0x1000, 16), (0x0000, 45))
+
+
+def legacy_process_data(mb, info_db, buf: bytes, first_reg, elmlen):
+    '''former implementation of Modbus.__process_data()'''
+    for i in range(0, elmlen):
+        addr = first_reg+i
+        if addr in mb.mb_reg_mapping:
+            row = mb.mb_reg_mapping[addr]
+            info_id = row['reg']
+            keys, level, unit, must_incr = info_db._key_obj(info_id)
+            if keys:
+                result = Fmt.get_value(buf, 3+2*i, row)
+                name, update = info_db.update_db(keys, must_incr,
+                                                 result)
+                yield keys[0], update, result
+                if update:
+                    info_db.tracer.log(level,
+                                       f'[{mb.node_id}] MODBUS: {name}'
+                                       f' : {result}{unit}')
+                    logging.log(level, f'[{mb.node_id}] MODBUS: {name} :'
+                                       f' {result}{unit}')
+
+
+def actual_process_data(mb, info_db, buf: bytes, first_reg, elmlen):
+    return mb._Modbus__process_data(info_db, buf, first_reg, elmlen)
+
+
+def build_rsp(rnd, elmlen: int, incr: int) -> bytes:
+    # counters (must_incr) are increasing, so every value is different
+    data = bytes(rnd.randrange(0x20, 0x7f) for _ in range(2*elmlen))
+    data = bytes((b + incr) & 0x7f for b in data)
+    return bytes((1, 3, 2*elmlen)) + data + b'\x00\x00'
+
+
+def run(decode, mb, db, rsps, first_reg, elmlen, cnt) -> int:
+    elms = 0
+    for i in range(cnt):
+        for _ in decode(mb, db, rsps[i & 1], first_reg, elmlen):
+            elms += 1
+    return elms
+
+
+def main(cnt: int = 2000, rounds: int = 5):
+    logging.disable(logging.CRITICAL)
+    rnd = random.Random(4711)
+    mb = Modbus(None)
+    for first_reg, elmlen in BLOCKS:
+        rsps = [build_rsp(rnd, elmlen, 0), build_rsp(rnd, elmlen, 1)]
+        print(f'block {first_reg:#06x}, {elmlen} registers:')
+        for name, decode in (('legacy', legacy_process_data),
+                             ('plan  ', actual_process_data)):
+            db = InfosG3P(client_mode=False)
+            elms = run(decode, mb, db, rsps, first_reg, elmlen, 2)
+            sec = min(timeit.repeat(
+                lambda: run(decode, mb, db, rsps, first_reg, elmlen, cnt),
+                number=1, repeat=rounds))
+            print(f'  {name}: {cnt/sec:9.0f} rsp/s  {sec*1e6/cnt:7.1f} us/rsp'
+                  f'  ({elms//2} mapped registers)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,141 @@
+'''Benchmark of the GEN3 (Talent) data sequence decoder
+
+Decodes the data sequences of the collector and inverter data frames,
+which are used in tests/test_talent.py, into an InfosG3 db. The frames
+are taken from the fixtures of the test module. The former decoder with
+an if-chain per data type, which decodes every element, is compared with
+the table-driven decoder of InfosG3.parse(), which skips the values of
+unmapped addresses.
+
+usage: python app/bench/bench_talent_parse.py [frames] [rounds]
+'''
+import os
+import sys
+import ast
+import struct
+import timeit
+import logging
+
+BENCH_DIR = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from gen3.infos_g3 import InfosG3, RegisterSel  # noqa: E402
+
+FRAMES = ('msg_controller_ind', 'msg_controller_ms3000_ind',
+          'msg_inverter_ind2', 'msg_inverter_ms3000_ind')
+
+
+class LegacyInfosG3(InfosG3):
+    def parse(self, buf, ind=0, sensor: int = 0, node_id: str = ''):
+        '''former implementation of InfosG3.parse()'''
+        reg_map = RegisterSel.get(sensor)
+        result = struct.unpack_from('!l', buf, ind)
+        elms = result[0]
+        i = 0
+        ind += 4
+        while i < elms:
+            result = struct.unpack_from('!lB', buf, ind)
+            addr = result[0]
+            if addr not in reg_map:
+                row = None
+                info_id = -1
+            else:
+                row = reg_map[addr]
+                info_id = row['reg']
+            data_type = result[1]
+            ind += 5
+
+            if data_type == 0x54:   # 'T' -> Pascal-String
+                str_len = buf[ind]
+                result = struct.unpack_from(f'!{str_len+1}p', buf,
+                                            ind)[0].decode(encoding='ascii',
+                                                           errors='replace')
+                ind += str_len+1
+            elif data_type == 0x00:  # 'Nul' -> end
+                i = elms  # abort the loop
+            elif data_type == 0x41:  # 'A' -> Nop ??
+                i += 1
+                continue
+            elif data_type == 0x42:  # 'B' -> byte, int8
+                result = struct.unpack_from('!B', buf, ind)[0]
+                ind += 1
+            elif data_type == 0x49:  # 'I' -> int32
+                result = struct.unpack_from('!l', buf, ind)[0]
+                ind += 4
+            elif data_type == 0x53:  # 'S' -> short, int16
+                result = struct.unpack_from('!h', buf, ind)[0]
+                ind += 2
+            elif data_type == 0x46:  # 'F' -> float32
+                result = round(struct.unpack_from('!f', buf, ind)[0], 2)
+                ind += 4
+            elif data_type == 0x4c:  # 'L' -> long, int64
+                result = struct.unpack_from('!q', buf, ind)[0]
+                ind += 8
+            else:
+                return
+
+            if row and 'ratio' in row:
+                result = round(result * row['ratio'], 2)
+            keys, level, unit, must_incr = self._key_obj(info_id)
+            if keys:
+                name, update = self.update_db(keys, must_incr, result)
+                yield keys[0], update
+                if update:
+                    self.tracer.log(level, f'[{node_id}] GEN3: {name} :'
+                                           f' {result}{unit}')
+                    logging.log(level, f'[{node_id}] GEN3: {name} :'
+                                       f' {result}{unit}')
+            i += 1
+
+
+def load_fixtures(names) -> dict:
+    '''evaluate the fixture functions of tests/test_talent.py, without
+    importing the test module'''
+    fname = os.path.join(BENCH_DIR, '..', 'tests', 'test_talent.py')
+    with open(fname) as f:
+        tree = ast.parse(f.read())
+    frames = {}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name in names:
+            node.decorator_list = []
+            glob = {}
+            exec(compile(ast.Module([node], []), fname, 'exec'), glob)
+            frames[node.name] = glob[node.name]()
+    return frames
+
+
+def split_frame(frame: bytes) -> tuple[int, int]:
+    '''returns the offset of the data sequence and the sensor list'''
+    hdr_len = 5 + frame[4] + 2
+    data_id, id_len = struct.unpack_from('!lB', frame, hdr_len)
+    return hdr_len + 5 + id_len + 9, data_id
+
+
+def run(db, buf, ind, sensor, cnt) -> int:
+    vals = 0
+    for _ in range(cnt):
+        db.db.clear()
+        for _ in db.parse(buf, ind, sensor):
+            vals += 1
+    return vals
+
+
+def main(cnt: int = 2000, rounds: int = 5):
+    logging.disable(logging.CRITICAL)
+    frames = load_fixtures(FRAMES)
+    for name in FRAMES:
+        buf = frames[name]
+        ind, sensor = split_frame(buf)
+        elms = struct.unpack_from('!l', buf, ind)[0]
+        print(f'{name}: sensor list {sensor:08x}, {elms} elements')
+        for variant, cls in (('legacy', LegacyInfosG3), ('table ', InfosG3)):
+            db = cls()
+            vals = run(db, buf, ind, sensor, 1)
+            sec = min(timeit.repeat(lambda: run(db, buf, ind, sensor, cnt),
+                                    number=1, repeat=rounds))
+            print(f'  {variant}: {cnt/sec:9.0f} frames/s  '
+                  f'{sec*1e6/cnt:7.1f} us/frame  ({vals} values)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,97 @@
+'''Benchmark of the Solarman V5 ack responses
+
+Builds ack responses for data, heartbeat and sync frames on a SolarmanV5
+instance with a minimal transmit interface. The 'legacy' run builds the
+frames from scratch with the generic header functions (struct.pack of the
+header and payload, checksum over the whole frame), the 'template' run
+uses the prepared frame templates of __send_ack_rsp(). Logging is
+disabled for both runs.
+
+usage: python app/bench/bench_v5_ack.py [acks] [rounds]
+'''
+import os
+import sys
+import struct
+import timeit
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from byte_fifo import ByteFifo  # noqa: E402
+from infos import Infos  # noqa: E402
+from gen3plus.solarman_v5 import SolarmanV5, Sequence  # noqa: E402
+
+ACKS = ((0x1210, 1), (0x1710, 1), (0x1310, 0), (0x1810, 0))
+
+
+class TxIfc():
+    '''the parts of AsyncIfc, which are used to build a response'''
+    def __init__(self):
+        self.tx_fifo = ByteFifo()
+
+    def tx_add(self, data) -> None:
+        self.tx_fifo += data
+
+    def tx_len(self) -> int:
+        return len(self.tx_fifo)
+
+    def tx_peek(self, size: int = None) -> bytearray:
+        return self.tx_fifo.peek(size)
+
+
+class AckBuilder(SolarmanV5):
+    def __init__(self):
+        # skip the constructor, only the send path is used
+        self.ifc = TxIfc()
+        self.seq = Sequence(True)
+        self.snr = 2070233889
+        self.server_side = True
+        self.switch = {}
+
+    def _timestamp(self):
+        return 1700000000
+
+    def legacy_ack(self, msgtype, ftype, ack=1):
+        self._build_header(msgtype)
+        self.ifc.tx_add(struct.pack('<BBLL', ftype, ack,
+                                    self._timestamp(),
+                                    self._heartbeat()))
+        self._finish_send_msg()
+
+    def template_ack(self, msgtype, ftype, ack=1):
+        self._SolarmanV5__send_ack_rsp(msgtype, ftype, ack)
+
+
+def run(builder: AckBuilder, fnc, acks: int) -> int:
+    fifo = builder.ifc.tx_fifo
+    for i in range(acks):
+        fnc(*ACKS[i & 3])
+        fifo.get()
+    return acks
+
+
+def main(acks: int = 50000, rounds: int = 5):
+    logging.disable(logging.CRITICAL)
+    Infos.static_init()
+    builder = AckBuilder()
+
+    # both variants must build identical frames
+    for ctrl, ftype in ACKS:
+        builder.seq.set_recv(0x1234)
+        builder.legacy_ack(ctrl, ftype)
+        legacy = bytes(builder.ifc.tx_fifo.get())
+        builder.seq.set_recv(0x1234)
+        builder.template_ack(ctrl, ftype)
+        assert legacy == bytes(builder.ifc.tx_fifo.get())
+
+    print(f'{acks} acks')
+    for name, fnc in (('legacy  ', builder.legacy_ack),
+                      ('template', builder.template_ack)):
+        sec = min(timeit.repeat(lambda: run(builder, fnc, acks),
+                                number=1, repeat=rounds))
+        print(f'  {name}: {acks/sec:10.0f} acks/s  '
+              f'{sec*1e9/acks:6.0f} ns/ack')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,197 @@
+'''Recorded frames and frame builders for the load harness
+
+The templates are captures of real GEN3 (Talent) and GEN3PLUS (Solarman V5)
+inverters, taken from the unit and system tests. The builders replace the
+serial numbers, so every simulated inverter gets its own identity.
+'''
+import struct
+
+G3_SNR = b'R170000000000001'
+G3_INV_NO = b'T170000000000001'
+G3P_SNR = 2070233889
+G3P_INV_SERIAL = b'Y17E7A0F010B013E'
+
+G3_CONTACT_IND = bytes.fromhex(
+    '0000002c1052313730303030303030303030303031910008736f6c6172687562'
+    '0f736f6c617268756240313233343536'
+)
+G3_GET_TIME_REQ = bytes.fromhex(
+    '0000001310523137303030303030303030303030319122'
+)
+G3_COLLECTOR_IND = bytes.fromhex(
+    '0000012f105231373030303030303030303030303191710e1000001052313730'
+    '3030303030303030303030310100000189c66355500000001500092ba8541052'
+    '53575f3430305f56312e30302e3036000927c054065261796d6f6e00092f9054'
+    '0b5253572d312d313030303100095a88540f742e7261796d6f6e696f742e636f'
+    '6d00095aec541c6c6f676765722e74616c656e742d6d6f6e69746f72696e672e'
+    '636f6d000d00204900000001000c35004900000064000c96a8490000001d000c'
+    '7f384900000001000cfc384900000001000cf850490000012c000c63e0490000'
+    '0000000c67c84900000000000c5058490000000100095e70490000138d00095e'
+    'd4490000138d00095b504900000002000d040849000000000007a18449000000'
+    '01000c5059490000004c000d1f604900000000'
+)
+G3_INVERTER_IND = bytes.fromhex(
+    '0000050210523137303030303030303030303030319104019000011054313730'
+    '3030303030303030303030310100000189c6636108000000a300000064530001'
+    '000000c85300020000012c530000000001904900000000000001915300000000'
+    '0192530000000001935300000000019453000000000195530000000001965300'
+    '000000019753000000000198530000000001995300000000019a530000000001'
+    '9b5300000000019c5300000000019d5300000000019e5300000000019f530000'
+    '000001a0530000000001f44900000000000001f5530000000001f65300000000'
+    '01f7530000000001f8530000000001f9530000000001fa530000000001fb5300'
+    '00000001fc530000000001fd530000000001fe530000000001ff530000000002'
+    '0053000000000201530000000002025300000000020353000000000204530000'
+    '000002584900000000000002595300000000025a5300000000025b5300000000'
+    '025c5300000000025d5300000000025e5300000000025f530000000002605300'
+    '0000000261530000000002625300000000026353000000000264530000000002'
+    '65530000000002665300000000026753000000000268530000000002bc490000'
+    '0000000002bd530000000002be530000000002bf530000000002c05300000000'
+    '02c1530000000002c2530000000002c3530000000002c4530000000002c55300'
+    '00000002c6530000000002c7530000000002c8530000000002c9530000000002'
+    'ca530000000002cb530000000002cc5300000000032053000000000384535011'
+    '000003e846436166660000044c463eeb851f000004b0464248147b0000051453'
+    '001700000578530000000005dc530258000006404642d36666000006a4464206'
+    '666600000708463ff47ae10000076c4642810000000007d04642060000000008'
+    '34463fae147b00000898464236cccd000008fc46000000000000096046000000'
+    '00000009c4460000000000000a28460000000000000a8c460000000000000af0'
+    '460000000000000b54463fd9999a00000bb846418ae14800000c1c463f8a3d71'
+    '00000c8046411bd70a00000ce4463f1eb85200000d484640f3d70a00000dac46'
+    '0000000000000e10460000000000000e74460000000000000ed8460000000000'
+    '000f3c53000000000fa0530000000010045355aa00001068530000000010cc53'
+    '00000000113053000000001194530000000011f853ffff0000125c53ffff0000'
+    '12c05300020000132453ffff0000138853ffff000013ec53ffff0000145053ff'
+    'ff000014b453ffff0000151853ffff0000157c53000000002710530002000027'
+    '7453003c000027d85300680000283c530500000028a046437900000000290446'
+    '43480000000029684642483333000029cc46423e3d7100002a3053000100002a'
+    '94464337000000002af84642ce000000002b5c53009600002bc053001000002c'
+    '24464390000000002c88464395000000002cec53000600002d5053000600002d'
+    'b446437d000000002e1846423deb8500002e7c46423deb8500002ee053000300'
+    '002f4453000300002fa846424deb850000300c46424deb850000307053000300'
+    '0030d45300030000313846420800000000319c53000500003200530400000032'
+    '64530001000032c853139c0000332c530fa00000339053004f000033f4530066'
+    '000034585303e8000034bc5304000000352053000000003584530000000035e8'
+    '5300000000364c53000000013880530002000138815300010001388253000100'
+    '013883530000'
+)
+G3P_DEVICE_IND = bytes.fromhex(
+    'a5d400104100012143657b02bad200001900000000000000053c780164014c53'
+    '5735424c455f31375f303242305f312e30350000000000000000000000000000'
+    '000000000000402a8f4f51543139322e3136382e38302e34390000000f0001b0'
+    '020f00ff56312e312e30302e3042000000000000000000000000000000000000'
+    '000000000000000000000000fefe000000000000000000000000000000000000'
+    '0000000000000000000000000000000000000000000000416c6c6975732d486f'
+    '6d650000000000000000000000000000000000000000000000000000000000d2'
+    '15'
+)
+G3P_INVERTER_IND = bytes.fromhex(
+    'a59901104201022143657b01b002bcc824326c1f0000a047e433010003080000'
+    '5931374537413046303130423031334500000000000000000000000000000000'
+    '0000000000000000000000000000000000000000000000000000000000000000'
+    '0000000000000000000000000000000000000000000000000000000000000000'
+    '0000000000000000000000000000000000000000000000000000000000000000'
+    '0000000000000000000000000000000000000000000000000000000000000000'
+    '00010002000000000000000000000000401008c80049138d003600000258067a'
+    '016100a80254015a008a01e4015a00bd028f001100010000000b000027980004'
+    '00000c04000300000ae7000500000c750000000006160200000055aa00010000'
+    '00000000ffff07d0000304000400040004000001ffff00010006006800680500'
+    '09cd07b6139c1324000107ae040f0041000f0a640a640006000609f6128c128c'
+    '0010001014521452001000100151000504000001139c0fa0004e006603e80400'
+    '09ce07a8139c13260000000000000000000000000400040000000000ffff0000'
+    '00000000c115'
+)
+G3P_HEARTBEAT_IND = bytes.fromhex(
+    'a50100104710842143657b003015'
+)
+
+
+def crc16(pdu: bytes) -> int:
+    '''Modbus CRC-16'''
+    crc = 0xffff
+    for byte in pdu:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xa001
+            else:
+                crc >>= 1
+    return crc
+
+
+def modbus_rsp(req: bytes) -> bytes:
+    '''build a Modbus RTU response for a request of the proxy'''
+    addr, func, reg, cnt = struct.unpack_from('>BBHH', req)
+    if func in (3, 4):       # read registers, return a ramp of values
+        pdu = struct.pack('>BBB', addr, func, 2*cnt)
+        pdu += b''.join(struct.pack('>H', (reg+i) & 0xff)
+                        for i in range(cnt))
+    else:                    # echo write requests
+        pdu = bytes(req[:6])
+    return pdu + struct.pack('<H', crc16(pdu))
+
+
+def g3_frame(snr: bytes, ctrl: int, msg_id: int, data: bytes) -> bytes:
+    '''build a GEN3 (Talent) frame'''
+    return struct.pack('!lB', len(snr)+3+len(data), len(snr)) + snr + \
+        struct.pack('!BB', ctrl, msg_id) + data
+
+
+def g3_frames(no: int) -> dict:
+    '''return the recorded GEN3 frames for simulated inverter no'''
+    snr = f'R17{no:013d}'.encode()
+    inv_no = f'T17{no:013d}'.encode()
+
+    def replace(frame: bytes) -> bytes:
+        return frame.replace(G3_SNR, snr).replace(G3_INV_NO, inv_no)
+
+    return {
+        'snr': snr,
+        'contact_ind': replace(G3_CONTACT_IND),
+        'get_time_req': replace(G3_GET_TIME_REQ),
+        'collector_ind': replace(G3_COLLECTOR_IND),
+        'inverter_ind': replace(G3_INVERTER_IND),
+    }
+
+
+def g3_hbeat_ind(snr: bytes, timestamp: int) -> bytes:
+    return g3_frame(snr, 0x91, 0x99, struct.pack('!Bq', 1, timestamp))
+
+
+def g3_modbus_rsp(snr: bytes, req: bytes) -> bytes:
+    '''answer a GEN3 Modbus request frame'''
+    pdu = modbus_rsp(req[28:])
+    return g3_frame(snr, 0x91, 0x77,
+                    b'\x17\x18\x19\x1a' + struct.pack('!B', len(pdu)) + pdu)
+
+
+def v5_frame(ctrl: int, seq: int, snr: int, data: bytes) -> bytes:
+    '''build a Solarman V5 frame with a valid checksum'''
+    msg = struct.pack('<BHHHL', 0xA5, len(data), ctrl, seq, snr) + data
+    return msg + struct.pack('<BB', sum(msg[1:]) & 0xff, 0x15)
+
+
+def v5_rebuild(frame: bytes, snr: int, seq: int) -> bytes:
+    '''replace the serial number and sequence of a recorded V5 frame'''
+    _, _, ctrl, _, _ = struct.unpack_from('<BHHHL', frame)
+    return v5_frame(ctrl, seq, snr, frame[11:-2])
+
+
+def g3p_frames(no: int) -> dict:
+    '''return the recorded GEN3PLUS frames for simulated inverter no'''
+    snr = 3000000000 + no
+    inv_serial = f'Y17{no:013d}'.encode()
+    return {
+        'snr': snr,
+        'inv_serial': inv_serial.decode(),
+        'device_ind': v5_rebuild(G3P_DEVICE_IND, snr, 0x0100),
+        'inverter_ind': v5_rebuild(
+            G3P_INVERTER_IND.replace(G3P_INV_SERIAL, inv_serial), snr, 0),
+        'hbeat_ind': v5_rebuild(G3P_HEARTBEAT_IND, snr, 0),
+    }
+
+
+def g3p_modbus_rsp(snr: int, req: bytes) -> bytes:
+    '''answer a GEN3PLUS Modbus request frame (0x4510) with 0x1510'''
+    _, _, _, seq, _ = struct.unpack_from('<BHHHL', req)
+    pdu = modbus_rsp(req[26:-2])
+    data = struct.pack('<BBLLL', 2, 1, 0, 0, 0) + pdu
+    return v5_frame(0x1510, (seq & 0xff) << 8 | (seq & 0xff), snr, data)
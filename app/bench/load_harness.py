@@ -0,0 +1,464 @@
+'''Connection-scale load harness for the proxy listeners
+
+Opens N simulated GEN3 (Talent) and GEN3PLUS (Solarman V5) inverters
+against the proxy listeners, which run with server.handle_client like in
+production. The inverters replay recorded contact-info, data and heartbeat
+frames at a configurable rate and answer the Modbus polling requests of the
+proxy. A local stand-in for the TSUN cloud accepts the forwarded frames and
+a minimal MQTT broker accepts the publishes of the proxy.
+
+The simulated inverters, the cloud and the broker run in a separate process,
+so the measured RSS and event-loop lag belong to the proxy only.
+
+Reported are:
+  - p50/p99/max of the frame-processing latency, measured by the inverters
+    as the time between sending a frame and receiving the response
+  - frames per second, which the proxy received and answered
+  - RSS per inverter connection (incl. the related cloud connection)
+  - p50/p99/max of the event-loop lag of the proxy
+
+usage: python app/bench/load_harness.py --g3 50 --g3p 50 --rate 2
+       python app/bench/load_harness.py -h
+'''
+import os
+import sys
+import time
+import struct
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from collections import deque
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import load_frames as frames
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'src')
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples)-1, int(len(samples) * pct / 100))]
+
+
+def rss() -> int:
+    '''resident set size of this process in bytes'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:    # pragma: no cover
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+'''
+The simulated world: inverters, TSUN cloud and MQTT broker
+'''
+
+
+class Stats():
+    def __init__(self):
+        self.latency = []
+        self.tx_frames = 0
+        self.rx_acks = 0
+        self.mb_reqs = 0
+        self.measure = False
+
+    def ack(self, sent: float) -> None:
+        self.rx_acks += 1
+        if self.measure:
+            self.latency.append(time.perf_counter() - sent)
+
+
+class SimInverter():
+    '''base class of a simulated inverter'''
+    def __init__(self, no: int, port: int, rate: float, stats: Stats):
+        self.no = no
+        self.port = port
+        self.interval = 1 / rate
+        self.stats = stats
+        self.pending = deque()   # send timestamps of unanswered frames
+        self.writer = None
+        self.up = asyncio.Event()
+
+    async def run(self, stop: asyncio.Event) -> None:
+        reader, self.writer = await asyncio.open_connection('127.0.0.1',
+                                                            self.port)
+        rx_task = asyncio.create_task(self.rx_loop(reader))
+        try:
+            await self.startup()
+            await asyncio.sleep(random.random() * self.interval)
+            cycle = 0
+            while not stop.is_set():
+                self.send(self.cyclic_frame(cycle))
+                cycle += 1
+                try:
+                    await asyncio.wait_for(stop.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            rx_task.cancel()
+            self.writer.close()
+
+    def send(self, frame: bytes, ack: bool = True) -> None:
+        if ack:
+            self.pending.append(time.perf_counter())
+        self.stats.tx_frames += 1
+        self.writer.write(frame)
+
+    async def rx_loop(self, reader) -> None:
+        while True:
+            frame = await self.read_frame(reader)
+            if self.is_modbus_req(frame):
+                self.stats.mb_reqs += 1
+                self.send(self.modbus_rsp(frame), ack=False)
+            elif self.pending:
+                self.stats.ack(self.pending.popleft())
+                if not self.pending:
+                    self.up.set()
+
+
+class SimG3(SimInverter):
+    '''simulated GEN3 inverter'''
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.frames = frames.g3_frames(self.no)
+        self.snr = self.frames['snr']
+
+    async def startup(self) -> None:
+        self.send(self.frames['contact_ind'])
+        self.send(self.frames['get_time_req'])
+        await self.up.wait()
+
+    def cyclic_frame(self, cycle: int) -> bytes:
+        match cycle % 4:
+            case 0:
+                return frames.g3_hbeat_ind(self.snr, int(time.time()*1000))
+            case 1:
+                return self.frames['collector_ind']
+        return self.frames['inverter_ind']
+
+    async def read_frame(self, reader) -> bytes:
+        hdr = await reader.readexactly(4)
+        return hdr + await reader.readexactly(struct.unpack('!l', hdr)[0])
+
+    def is_modbus_req(self, frame: bytes) -> bool:
+        return frame[21:23] == b'\x70\x77'
+
+    def modbus_rsp(self, frame: bytes) -> bytes:
+        return frames.g3_modbus_rsp(self.snr, frame)
+
+
+class SimG3P(SimInverter):
+    '''simulated GEN3PLUS inverter'''
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.frames = frames.g3p_frames(self.no)
+        self.snr = self.frames['snr']
+
+    async def startup(self) -> None:
+        self.send(self.frames['device_ind'])
+        await self.up.wait()
+
+    def cyclic_frame(self, cycle: int) -> bytes:
+        if cycle % 3 == 0:
+            return self.frames['hbeat_ind']
+        return self.frames['inverter_ind']
+
+    async def read_frame(self, reader) -> bytes:
+        hdr = await reader.readexactly(3)
+        return hdr + await reader.readexactly(
+            struct.unpack_from('<H', hdr, 1)[0] + 10)
+
+    def is_modbus_req(self, frame: bytes) -> bool:
+        return struct.unpack_from('<H', frame, 3)[0] == 0x4510
+
+    def modbus_rsp(self, frame: bytes) -> bytes:
+        return frames.g3p_modbus_rsp(self.snr, frame)
+
+
+class FakeCloud():
+    '''stand-in for the TSUN cloud, which accepts all forwarded frames'''
+    def __init__(self):
+        self.conns = 0
+        self.rx_bytes = 0
+
+    async def handle_client(self, reader, writer) -> None:
+        self.conns += 1
+        while data := await reader.read(4096):
+            self.rx_bytes += len(data)
+        writer.close()
+
+
+class FakeBroker():
+    '''minimal MQTT 3.1.1 broker, which only acknowledges the packets'''
+    def __init__(self):
+        self.publishes = 0
+
+    async def handle_client(self, reader, writer) -> None:
+        try:
+            while True:
+                ptype = (await reader.readexactly(1))[0]
+                size, mult = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    size += (byte & 0x7f) * mult
+                    mult *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(size)
+                self.dispatch(ptype, body, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    def dispatch(self, ptype: int, body: bytes, writer) -> None:
+        match ptype >> 4:
+            case 1:     # CONNECT
+                writer.write(b'\x20\x02\x00\x00')
+            case 3:     # PUBLISH
+                self.publishes += 1
+                qos = (ptype >> 1) & 3
+                if qos:
+                    topic_len = struct.unpack_from('!H', body)[0]
+                    pid = body[2+topic_len:4+topic_len]
+                    writer.write((b'\x40\x02' if qos == 1
+                                  else b'\x50\x02') + pid)
+            case 6:     # PUBREL
+                writer.write(b'\x70\x02' + body[:2])
+            case 8:     # SUBSCRIBE
+                ind, cnt = 2, 0
+                while ind < len(body):
+                    ind += struct.unpack_from('!H', body, ind)[0] + 3
+                    cnt += 1
+                writer.write(bytes([0x90, 2+cnt]) + body[:2] + bytes(cnt))
+            case 10:    # UNSUBSCRIBE
+                writer.write(b'\xb0\x02' + body[:2])
+            case 12:    # PINGREQ
+                writer.write(b'\xd0\x00')
+
+
+async def run_world(conn, args) -> None:
+    loop = asyncio.get_running_loop()
+    cloud = FakeCloud()
+    broker = FakeBroker()
+    cloud_srv = await asyncio.start_server(cloud.handle_client,
+                                           '127.0.0.1', 0)
+    broker_srv = await asyncio.start_server(broker.handle_client,
+                                            '127.0.0.1', 0)
+    conn.send((cloud_srv.sockets[0].getsockname()[1],
+               broker_srv.sockets[0].getsockname()[1]))
+    port_g3, port_g3p = await loop.run_in_executor(None, conn.recv)
+
+    stats = Stats()
+    stop = asyncio.Event()
+    sims = [SimG3(no, port_g3, args.rate, stats)
+            for no in range(args.g3)]
+    sims += [SimG3P(no, port_g3p, args.rate, stats)
+             for no in range(args.g3p)]
+    tasks = []
+    for sim in sims:      # ramp up the connections
+        tasks.append(asyncio.create_task(sim.run(stop)))
+        await asyncio.sleep(args.ramp / max(len(sims), 1))
+    await asyncio.gather(*(sim.up.wait() for sim in sims))
+    conn.send('connected')
+
+    await asyncio.sleep(args.warmup)
+    stats.measure = True
+    tx_frames, rx_acks = stats.tx_frames, stats.rx_acks
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    duration = time.perf_counter() - start
+    stats.measure = False
+    result = {
+        'duration': duration,
+        'tx_frames': stats.tx_frames - tx_frames,
+        'rx_acks': stats.rx_acks - rx_acks,
+        'mb_reqs': stats.mb_reqs,
+        'latency': stats.latency,
+        'cloud_conns': cloud.conns,
+        'cloud_bytes': cloud.rx_bytes,
+        'mqtt_publishes': broker.publishes,
+    }
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    conn.send(result)
+    # keep the broker alive, until the proxy has been shut down
+    await loop.run_in_executor(None, conn.recv)
+    cloud_srv.close()
+    broker_srv.close()
+
+
+def world_main(conn, args) -> None:
+    asyncio.run(run_world(conn, args))
+
+
+'''
+The proxy under test
+'''
+
+
+async def lag_probe(samples: list, interval: float = 0.05) -> None:
+    '''measure how late the event loop wakes up a sleeping task'''
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+def config_proxy(args, cloud_port: int, mqtt_port: int) -> None:
+    from cnf.config import Config
+    cnf = Config.act_config
+    cnf['mqtt'] = cnf['mqtt'] | {'host': '127.0.0.1', 'port': mqtt_port,
+                                 'user': None, 'passwd': None}
+    for key in ('tsun', 'solarman'):
+        cnf[key] = cnf[key] | {'enabled': args.cloud, 'host': '127.0.0.1',
+                               'port': cloud_port}
+    cnf['proxy'] = {'engine': args.engine}
+    inverters = {'allow_all': False}
+    for no in range(args.g3):
+        inverters[f'R17{no:013d}'] = {
+            'node_id': f'g3_{no}/', 'suggested_area': '',
+            'modbus_polling': True, 'monitor_sn': 0, 'sensor_list': 0}
+    for no in range(args.g3p):
+        inverters[f'Y17{no:013d}'] = {
+            'node_id': f'g3p_{no}/', 'suggested_area': '',
+            'modbus_polling': True, 'monitor_sn': 3000000000 + no,
+            'sensor_list': 0x02b0}
+    cnf['inverters'] = inverters
+    cnf['batteries'] = {}
+
+
+async def run_proxy(conn, args) -> dict:
+    loop = asyncio.get_running_loop()
+    # run in a temporary directory, the server writes logs and configs
+    os.chdir(tempfile.mkdtemp(prefix='load_harness_'))
+    os.symlink(os.path.join(SRC_DIR, 'cnf'), 'cnf')
+    os.mkdir('config')
+    import server
+    import async_protocol
+    from proxy import Proxy
+    from messages import Message
+
+    for name in ('', 'msg', 'conn', 'data', 'tracer', 'mqtt', 'asyncio'):
+        logging.getLogger(name).setLevel(args.log_level)
+    if args.mb_interval:
+        Message.MB_START_TIMEOUT = args.mb_interval
+        Message.MB_REGULAR_TIMEOUT = args.mb_interval
+
+    cloud_port, mqtt_port = await loop.run_in_executor(None, conn.recv)
+    config_proxy(args, cloud_port, mqtt_port)
+    Proxy.class_init()
+
+    if async_protocol.use_protocol_engine():
+        start_server = async_protocol.start_server
+    else:
+        start_server = asyncio.start_server
+    listeners = []
+    for inv_class, port in ((server.InverterG3, args.port_g3),
+                            (server.InverterG3P, args.port_g3p)):
+        listeners.append(await start_server(
+            lambda r, w, i=inv_class: server.handle_client(r, w, i),
+            '127.0.0.1', port))
+
+    lag = []
+    probe = asyncio.create_task(lag_probe(lag))
+    rss_start = rss()
+    conn.send(tuple(srv.sockets[0].getsockname()[1] for srv in listeners))
+    await loop.run_in_executor(None, conn.recv)     # all connected
+    await asyncio.sleep(args.warmup)
+    rss_conn = rss()
+    del lag[:]
+    result = await loop.run_in_executor(None, conn.recv)
+    probe.cancel()
+
+    result['rss_start'] = rss_start
+    result['rss_conn'] = rss_conn
+    result['lag'] = lag
+    for srv in listeners:
+        srv.close()
+    await asyncio.sleep(0.5)      # let the connection loops terminate
+    await Proxy.class_close(loop)
+    conn.send('done')
+    return result
+
+
+def report(args, res: dict) -> None:
+    conns = args.g3 + args.g3p
+    lat = [x * 1000 for x in res['latency']]
+    lag = [x * 1000 for x in res['lag']]
+    rss_conn = (res['rss_conn'] - res['rss_start']) / max(conns, 1)
+    print(f"inverters  : {args.g3} GEN3 + {args.g3p} GEN3PLUS, "
+          f"{args.rate} frames/s each, engine: {args.engine}")
+    print(f"duration   : {res['duration']:.1f}s")
+    print(f"frames     : {res['tx_frames']/res['duration']:.0f} frames/s "
+          f"received, {res['rx_acks']/res['duration']:.0f} frames/s "
+          f"answered")
+    print(f"latency    : p50 {percentile(lat, 50):.2f}ms  "
+          f"p99 {percentile(lat, 99):.2f}ms  max {max(lat, default=0):.2f}ms")
+    print(f"loop lag   : p50 {percentile(lag, 50):.2f}ms  "
+          f"p99 {percentile(lag, 99):.2f}ms  max {max(lag, default=0):.2f}ms")
+    print(f"RSS        : {res['rss_conn']/2**20:.1f}MiB, "
+          f"{rss_conn/1024:.1f}KiB per connection")
+    print(f"modbus     : {res['mb_reqs']} requests answered")
+    print(f"cloud      : {res['cloud_conns']} connections, "
+          f"{res['cloud_bytes']} bytes")
+    print(f"mqtt       : {res['mqtt_publishes']} publishes")
+
+
+def parse_args(arg_list: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description='Load harness for the proxy listeners')
+    parser.add_argument('--g3', type=int, default=20,
+                        help='number of simulated GEN3 inverters')
+    parser.add_argument('--g3p', type=int, default=20,
+                        help='number of simulated GEN3PLUS inverters')
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='frames per second of each inverter')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='measuring time in seconds')
+    parser.add_argument('--warmup', type=float, default=2.0,
+                        help='time after the ramp-up before measuring')
+    parser.add_argument('--ramp', type=float, default=2.0,
+                        help='time to open all connections')
+    parser.add_argument('--mb-interval', type=int, default=5,
+                        help='Modbus polling interval of the proxy in sec'
+                             ' (0: keep the default)')
+    parser.add_argument('--engine', choices=['stream', 'protocol'],
+                        default='stream', help='connection engine')
+    parser.add_argument('--no-cloud', dest='cloud', action='store_false',
+                        help='disable the forwarding to the cloud stand-in')
+    parser.add_argument('--port-g3', type=int, default=5005,
+                        help='GEN3 listener port (0: any free port)')
+    parser.add_argument('--port-g3p', type=int, default=10000,
+                        help='GEN3PLUS listener port (0: any free port)')
+    parser.add_argument('--log-level', default='WARNING',
+                        help='log level of the proxy')
+    return parser.parse_args(arg_list)
+
+
+def main(arg_list: list[str] | None = None) -> None:
+    args = parse_args(arg_list)
+    conn, world_conn = multiprocessing.Pipe()
+    world = multiprocessing.get_context('spawn').Process(
+        target=world_main, args=(world_conn, args), daemon=True)
+    world.start()
+
+    # the cloud stand-in listens on the loopback address, which would
+    # trigger the loop protection of InverterBase.create_remote()
+    sys.path.insert(0, SRC_DIR)
+    with patch('inverter_base.ip_address',
+               lambda _: SimpleNamespace(is_private=False)):
+        res = asyncio.run(run_proxy(conn, args))
+    world.join(5)
+    report(args, res)
+
+
+if __name__ == '__main__':
+    main()
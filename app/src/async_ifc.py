@@ -69,6 +69,11 @@ class AsyncIfc(ABC):
         '''returns size numbers of byte without removing them'''
         pass  # pragma: no cover
 
+    @abstractmethod
+    def rx_view(self, offset: int = 0, length: int = None) -> memoryview:
+        '''returns a zero-copy memoryview of length bytes at offset'''
+        pass  # pragma: no cover
+
     @abstractmethod
     def rx_log(self, level, info):
         ''' logs the receive queue'''
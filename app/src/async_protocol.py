@@ -0,0 +1,238 @@
+import asyncio
+import logging
+
+from cnf.config import Config
+
+logger = logging.getLogger('conn')
+
+
+def use_protocol_engine() -> bool:
+    '''check if the asyncio.Protocol based engine is configured'''
+    return Config.get('proxy').get('engine', 'stream') == 'protocol'
+
+
+async def open_connection(host: str, port: int):
+    '''open a client connection with the protocol engine
+
+    Like asyncio.open_connection() a (reader, writer) tuple is returned,
+    but both are the same StreamProtocol instance'''
+    loop = asyncio.get_running_loop()
+    _, proto = await loop.create_connection(StreamProtocol, host, port)
+    return proto, proto
+
+
+async def start_server(client_connected_cb, host: str, port: int):
+    '''start a listener with the protocol engine
+
+    client_connected_cb is called for each new connection like in
+    asyncio.start_server(), the reader and writer arguments are the
+    same StreamProtocol instance'''
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(
+        lambda: StreamProtocol(client_connected_cb), host, port)
+
+
+class StreamProtocol(asyncio.Protocol):
+    '''Connection engine based on asyncio.Protocol
+
+    The received bytes are passed from data_received() straight to the
+    receive callback of the attached AsyncStream, which fills the rx fifo
+    and triggers the protocol parser. Instead of a wait_for() per read,
+    a single idle timer per connection detects dead connections. The timer
+    is only rearmed when it expires, so receiving data costs no timer
+    handling at all.
+
+    The instance provides the subset of the StreamReader and StreamWriter
+    API which is used by AsyncStream, so it is passed as reader and as
+    writer.
+    '''
+    def __init__(self, client_connected_cb=None):
+        self.transport = None
+        self._loop = None
+        self._conn_cb = client_connected_cb
+        self._task = None
+        self._rx_cb = None
+        self._rx_buf = bytearray()  # data received before the stream runs
+        self._rx_pending = False
+        self._rx_exc = None
+        self._running = False
+        self._event = asyncio.Event()
+        self._eof = False
+        self._exc = None
+        self._closed = None
+        self._paused = False
+        self._drain_waiter = None
+        self._timer = None
+        self._timed_out = False
+        self._idle_to = 0
+        self._last_rx = 0
+
+    '''
+    asyncio.Protocol callbacks
+    '''
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        self._loop = asyncio.get_running_loop()
+        self._closed = self._loop.create_future()
+        self._last_rx = self._loop.time()
+        if self._conn_cb:
+            res = self._conn_cb(self, self)
+            if asyncio.iscoroutine(res):
+                self._task = self._loop.create_task(res)
+
+    def data_received(self, data: bytes) -> None:
+        self._last_rx = self._loop.time()
+        if not self._running or not self._rx_cb:
+            self._rx_buf += data
+            return
+        self.__rx(data)
+
+    def eof_received(self) -> bool:
+        self._eof = True
+        self._event.set()
+        return False    # let the transport close itself
+
+    def connection_lost(self, exc) -> None:
+        self._eof = True
+        self._exc = exc
+        self._event.set()
+        self.__cancel_timer()
+        if self._closed and not self._closed.done():
+            self._closed.set_result(None)
+        self.__wakeup_drain(exc)
+
+    def pause_writing(self) -> None:
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        self.__wakeup_drain(None)
+
+    '''
+    reader API
+    '''
+    def attach(self, rx_cb) -> None:
+        '''register the receive callback of the AsyncStream'''
+        self._rx_cb = rx_cb
+
+    async def wait_rx(self, timeout: float) -> None:
+        '''wait until received data was processed
+
+        raises TimeoutError if no data was received for timeout seconds,
+        RuntimeError if the peer closed the connection and OSError on a
+        connection error'''
+        if not self._running:
+            self._running = True
+            if self._rx_buf:
+                data, self._rx_buf = self._rx_buf, bytearray()
+                self.__rx(data)
+        self.__arm_timer(timeout)
+        while not self._event.is_set():
+            await self._event.wait()
+        self._event.clear()
+
+        if self._rx_exc:
+            exc, self._rx_exc = self._rx_exc, None
+            raise exc
+        if self._rx_pending:
+            self._rx_pending = False
+            if self._eof or self._timed_out:
+                self._event.set()   # report it with the next call
+            return
+        if self._timed_out:
+            self._timed_out = False
+            raise asyncio.TimeoutError
+        if isinstance(self._exc, OSError):
+            raise self._exc
+        if self._eof:
+            raise RuntimeError("Peer closed.")
+
+    def feed_eof(self) -> None:
+        '''abort a waiting wait_rx() call'''
+        self._rx_cb = None
+        self._eof = True
+        self._event.set()
+        self.__cancel_timer()
+
+    '''
+    writer API
+    '''
+    def write(self, data: bytes) -> None:
+        self.transport.write(data)
+
+    def writelines(self, data) -> None:
+        self.transport.writelines(data)
+
+    async def drain(self) -> None:
+        if self._exc:
+            raise self._exc
+        if self.transport.is_closing():
+            await asyncio.sleep(0)
+            return
+        if self._paused:
+            self._drain_waiter = self._loop.create_future()
+            await self._drain_waiter
+
+    def get_extra_info(self, name: str, default=None):
+        return self.transport.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def wait_closed(self) -> None:
+        await self._closed
+
+    '''
+    Our private methods
+    '''
+    def __rx(self, data) -> None:
+        try:
+            wait = self._rx_cb(data)
+            if wait and wait > 0:
+                self.transport.pause_reading()
+                self._loop.call_later(wait, self.__resume_reading)
+        except Exception as exc:
+            self._rx_exc = exc     # raise it in the loop of the AsyncStream
+        self._rx_pending = True
+        self._event.set()
+
+    def __resume_reading(self) -> None:
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+
+    def __arm_timer(self, timeout: float) -> None:
+        if self._timer and timeout == self._idle_to:
+            return
+        self.__cancel_timer()
+        self._idle_to = timeout
+        self._timer = self._loop.call_at(self._last_rx + timeout,
+                                         self.__idle_timeout)
+
+    def __cancel_timer(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def __idle_timeout(self) -> None:
+        deadline = self._last_rx + self._idle_to
+        if deadline > self._loop.time():
+            # data was received meanwhile, so rearm the timer
+            self._timer = self._loop.call_at(deadline, self.__idle_timeout)
+            return
+        self._timer = None
+        self._last_rx = self._loop.time()
+        self._timed_out = True
+        self._event.set()
+
+    def __wakeup_drain(self, exc) -> None:
+        waiter = self._drain_waiter
+        if waiter is None or waiter.done():
+            return
+        self._drain_waiter = None
+        if exc is None:
+            waiter.set_result(None)
+        else:
+            waiter.set_exception(exc)
@@ -7,8 +7,11 @@ from itertools import count
 
 from proxy import Proxy
 from byte_fifo import ByteFifo
+from async_protocol import StreamProtocol
 from async_ifc import AsyncIfc
 from infos import Infos
+from metrics import Histogram, Metrics
+from publisher import Publisher
 
 
 import gc
@@ -81,6 +84,10 @@ class AsyncIfcImpl(AsyncIfc):
         '''returns size numbers of byte without removing them'''
         return self.rx_fifo.peek(size)
 
+    def rx_view(self, offset: int = 0, length: int = None) -> memoryview:
+        '''returns a zero-copy memoryview of length bytes at offset'''
+        return self.rx_fifo.view(offset, length)
+
     def rx_log(self, level, info):
         ''' logs the receive queue'''
         self.rx_fifo.logging(level, info)
@@ -149,14 +156,75 @@ class AsyncStream(AsyncIfcImpl):
         self.tx_fifo.reg_trigger(self.__write_cb)
         self._reader = reader
         self._writer = writer
+        if isinstance(reader, StreamProtocol):
+            self.__proto = reader     # asyncio.Protocol based engine
+            reader.attach(self._rx_data)
+        else:
+            self.__proto = None       # StreamReader based engine
         self.r_addr = writer.get_extra_info('peername')
         self.l_addr = writer.get_extra_info('sockname')
         self.proc_start = None  # start processing start timestamp
         self.proc_max = 0
+        self.proc_hist = Histogram()  # processing time of this connection
         self.async_publ_mqtt = None  # will be set AsyncStreamServer only
+        self.tx_chunks = []   # pending chunks for the next vectored write
+        # per connection counters of the vectored write path
+        self.tx_stats = {'writes': 0, 'chunks': 0, 'bytes': 0, 'drains': 0}
 
     def __write_cb(self):
-        self._writer.write(self.tx_fifo.get())
+        self._tx_queue(self.tx_fifo.get())
+
+    def _tx_queue(self, data: bytes) -> None:
+        '''queue data for the next vectored write
+
+        The first queued chunk schedules a send for the next loop
+        iteration, so all chunks which are queued until then are sent
+        with a single writer call'''
+        if not data:
+            return
+        if not self.tx_chunks:
+            try:
+                asyncio.get_running_loop().call_soon(self._tx_send)
+            except RuntimeError:   # no running event loop, write through
+                self.tx_chunks.append(data)
+                self._tx_send()
+                return
+        self.tx_chunks.append(data)
+
+    def _tx_send(self) -> None:
+        '''send all queued chunks with one writer call'''
+        chunks = self.tx_chunks
+        if not chunks:
+            return
+        self.tx_chunks = []
+        if len(chunks) == 1:
+            self._writer.write(chunks[0])
+        else:
+            self._writer.writelines(chunks)
+        stats = self.tx_stats
+        stats['writes'] += 1
+        stats['chunks'] += len(chunks)
+        stats['bytes'] += sum(map(len, chunks))
+
+    async def _tx_drain(self) -> None:
+        '''check the transport after queueing data
+
+        The queued chunks are sent by the scheduled _tx_send(), so all
+        writes of a loop iteration are coalesced into one writer call. A
+        closing transport raises ConnectionResetError, like the drain() of
+        a StreamWriter, so the caller notices a broken connection. drain()
+        is only awaited, if the write buffer is above the high-water
+        mark'''
+        if not self.tx_chunks:
+            return
+        if self._writer.is_closing():
+            self.tx_chunks = []
+            raise ConnectionResetError('Connection lost')
+        transport = self._writer.transport
+        if transport.get_write_buffer_size() > \
+           transport.get_write_buffer_limits()[1]:
+            self.tx_stats['drains'] += 1
+            await self._writer.drain()
 
     def __timeout(self) -> int:
         if self.timeout_cb:
@@ -165,17 +233,19 @@ class AsyncStream(AsyncIfcImpl):
 
     async def loop(self) -> Self:
         """Async loop handler for precessing all received messages"""
-        self.proc_start = time.time()
         while True:
             try:
                 self.__calc_proc_time()
                 dead_conn_to = self.__timeout()
-                await asyncio.wait_for(self.__async_read(),
-                                       dead_conn_to)
+                if self.__proto:
+                    await self.__proto.wait_rx(dead_conn_to)
+                else:
+                    await asyncio.wait_for(self.__async_read(),
+                                           dead_conn_to)
 
                 await self.__async_write()
                 await self.__async_forward()
-                if self.async_publ_mqtt:
+                if self.async_publ_mqtt and not Publisher.notify(self):
                     await self.async_publ_mqtt()
 
             except asyncio.TimeoutError:
@@ -202,13 +272,16 @@ class AsyncStream(AsyncIfcImpl):
                 Infos.inc_counter('SW_Exception')
                 logger.exception(
                     f"Exception for {self.r_addr}")
-            await asyncio.sleep(0)  # be cooperative to other task
+            if not self.__proto:
+                await asyncio.sleep(0)  # be cooperative to other task
 
     def __calc_proc_time(self):
         if self.proc_start:
             proc = time.time() - self.proc_start
             if proc > self.proc_max:
                 self.proc_max = proc
+            self.proc_hist.observe(proc)
+            Metrics.proc_time.observe(proc)
             self.proc_start = None
 
     async def disc(self) -> None:
@@ -216,6 +289,7 @@ class AsyncStream(AsyncIfcImpl):
         if self._writer.is_closing():
             return
         logger.debug(f'AsyncStream.disc() l{self.l_addr} | r{self.r_addr}')
+        self._tx_send()
         self._writer.close()
         await self._writer.wait_closed()
 
@@ -226,9 +300,12 @@ class AsyncStream(AsyncIfcImpl):
            hint: must be called before releasing the connection instance
         """
         super().close()
+        logger.debug(f'[{self.node_id}:{self.conn_no}] tx: {self.tx_stats}')
         self._reader.feed_eof()          # abort awaited read
         if self._writer.is_closing():
+            self.tx_chunks = []
             return
+        self._tx_send()
         self._writer.close()
 
     def healthy(self) -> bool:
@@ -250,23 +327,30 @@ class AsyncStream(AsyncIfcImpl):
         """Async read handler to read received data from TCP stream"""
         data = await self._reader.read(4096)
         if data:
-            self.proc_start = time.time()
-            rx_filter = getattr(self, "rx_filter", None)
-            if callable(rx_filter):
-                data = rx_filter(data)           # call receive filter
-            self.rx_fifo += data
-            wait = self.rx_fifo()                # call read in parent class
+            wait = self._rx_data(data)
             if wait and wait > 0:
                 await asyncio.sleep(wait)
         else:
             raise RuntimeError("Peer closed.")
 
+    def _rx_data(self, data: bytes) -> float:
+        '''store received data in the rx fifo and call the parser
+
+        Called by both connection engines, returns the time in sec the
+        parser wants to wait before reading more data'''
+        self.proc_start = time.time()
+        rx_filter = getattr(self, "rx_filter", None)
+        if callable(rx_filter):
+            data = rx_filter(data)           # call receive filter
+        self.rx_fifo += data
+        return self.rx_fifo()                # call read in parent class
+
     async def __async_write(self, headline: str = 'Transmit to ') -> None:
         """Async write handler to transmit the send_buffer"""
         if len(self.tx_fifo) > 0:
             self.tx_fifo.logging(logging.INFO, f'{headline}{self.r_addr}:')
-            self._writer.write(self.tx_fifo.get())
-            await self._writer.drain()
+            self._tx_queue(self.tx_fifo.get())
+        await self._tx_drain()
 
     async def __async_forward(self) -> None:
         """forward handler transmits data over the remote connection"""
@@ -363,8 +447,8 @@ class AsyncStreamServer(AsyncStream):
             self.remote.ifc.update_header_cb(self.fwd_fifo.peek())
             self.fwd_fifo.logging(logging.INFO, 'Forward to '
                                   f'{self.remote.ifc.r_addr}:')
-            self.remote.ifc._writer.write(self.fwd_fifo.get())
-            await self.remote.ifc._writer.drain()
+            self.remote.ifc._tx_queue(self.fwd_fifo.get())
+            await self.remote.ifc._tx_drain()
 
 
 class AsyncStreamClient(AsyncStream):
@@ -413,5 +497,5 @@ class AsyncStreamClient(AsyncStream):
             self.remote.ifc.update_header_cb(self.fwd_fifo.peek())
             self.fwd_fifo.logging(logging.INFO, 'Forward to '
                                   f'{self.remote.ifc.r_addr}:')
-            self.remote.ifc._writer.write(self.fwd_fifo.get())
-            await self.remote.ifc._writer.drain()
+            self.remote.ifc._tx_queue(self.fwd_fifo.get())
+            await self.remote.ifc._tx_drain()
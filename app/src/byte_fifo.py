@@ -13,7 +13,11 @@ class ByteFifo:
         self.__trigger_cb = cb
 
     def __iadd__(self, data):
-        self.__buf.extend(data)
+        try:
+            self.__buf.extend(data)
+        except BufferError:
+            # a memoryview of the buffer is still alive
+            self.__buf = self.__buf + data
         return self
 
     def __call__(self):
@@ -24,13 +28,21 @@ class ByteFifo:
 
     def get(self, size: int = None) -> bytearray:
         '''removes size numbers of byte and return them'''
-        if not size:
+        if not size or size >= len(self.__buf):
+            # hand over the whole buffer without copying it
             data = self.__buf
             self.clear()
         else:
             data = self.__buf[:size]
-            # The fast delete syntax
-            self.__buf[:size] = b''
+            try:
+                # The fast delete syntax. CPython only moves the start
+                # pointer of the bytearray, so the remaining bytes are not
+                # copied and consuming a frame is amortized O(1)
+                self.__buf[:size] = b''
+            except BufferError:
+                # a memoryview of the buffer is still alive, so we can't
+                # resize the buffer in place
+                self.__buf = self.__buf[size:]
         return data
 
     def peek(self, size: int = None) -> bytearray:
@@ -39,6 +51,16 @@ class ByteFifo:
             return self.__buf
         return self.__buf[:size]
 
+    def view(self, offset: int = 0, size: int = None) -> memoryview:
+        '''returns a zero-copy window of size bytes starting at offset
+
+        The window shares the memory with the buffer. Don't keep it after
+        the frame is processed, otherwise the buffer must be copied on the
+        next resize.'''
+        if size is None:
+            return memoryview(self.__buf)[offset:]
+        return memoryview(self.__buf)[offset:offset+size]
+
     def clear(self):
         self.__buf = bytearray()
 
@@ -0,0 +1,47 @@
+'''Structured records of changed register values
+
+Every value update of a connection, which changes the stored value, can
+be recorded in a ring buffer. The web UI or the debugging endpoint
+'/-/changes' reads the records instead of parsing the trace logs.
+
+The ring buffer is opt-in and is enabled with `proxy.change_log = <size>`
+in the config. If it is disabled, recording costs only a None check.
+'''
+import time
+from collections import deque
+
+
+class ChangeLog:
+    ring: deque | None = None
+    '''ring buffer with the change records, None if disabled'''
+    seq = 0
+    '''sequence number of the last record'''
+
+    @classmethod
+    def enable(cls, size: int) -> None:
+        '''Enable the ring buffer for the last size records, a size of 0
+        disables the recording'''
+        if size > 0:
+            cls.ring = deque(cls.ring or (), maxlen=size)
+        else:
+            cls.ring = None
+
+    @classmethod
+    def add(cls, node_id: str, source: str, name: str, value,
+            unit: str) -> None:
+        '''Record a changed value'''
+        cls.seq += 1
+        cls.ring.append((cls.seq, time.time(), node_id, source, name,
+                         value, unit))
+
+    @classmethod
+    def records(cls, since: int = 0, node_id: str | None = None) \
+            -> list[dict]:
+        '''Returns the records with a sequence number above since, for all
+        nodes or only for node_id'''
+        if cls.ring is None:
+            return []
+        return [{'seq': seq, 'ts': ts, 'node_id': node, 'source': source,
+                 'name': name, 'value': value, 'unit': unit}
+                for seq, ts, node, source, name, value, unit in cls.ring
+                if seq > since and (node_id is None or node == node_id)]
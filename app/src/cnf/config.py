@@ -62,7 +62,14 @@ class Config():
             'user': Or(None, And(Use(str),
                                  Use(lambda s: s if len(s) > 0 else None))),
             'passwd': Or(None, And(Use(str),
-                                   Use(lambda s: s if len(s) > 0 else None)))
+                                   Use(lambda s: s if len(s) > 0 else None))),
+            Optional('queue_size'): And(Use(int), lambda n: n > 0),
+            Optional('queue_policy'): Or('block', 'drop'),
+            Optional('window'): And(Use(int), lambda n: n > 0),
+            Optional('spool_size'): And(Use(int), lambda n: n >= 0),
+            Optional('spool_file'): Use(str),
+            Optional('spool_all'): [str],
+            Optional('spool_rate'): And(Use(float), lambda n: n > 0)
         },
         'ha': {
             'auto_conf_prefix': Use(str),
@@ -71,6 +78,17 @@ class Config():
             'proxy_node_id': Use(str),
             'proxy_unique_id': Use(str)
         },
+        Optional('proxy'): {
+            Optional('engine', default='stream'): Or('stream', 'protocol'),
+            Optional('change_log', default=0): And(Use(int),
+                                                   lambda n: n >= 0)
+        },
+        Optional('publish'): {
+            Optional(str): {
+                Optional('deadband'): And(Use(float), lambda n: n >= 0),
+                Optional('min_interval'): And(Use(float), lambda n: n >= 0)
+            }
+        },
         'gen3plus': {
             'at_acl': {
                 Or('mqtt', 'tsun'): {
@@ -95,6 +113,19 @@ class Config():
                     Optional('forward', default=False): Use(bool),
                 },
                 Optional('modbus_polling', default=True): Use(bool),
+                Optional('modbus_max_len'):
+                    And(Use(int), lambda n: 1 <= n <= 125),
+                Optional('modbus_max_gap'): And(Use(int), lambda n: n >= 0),
+                Optional('modbus_max_retries'):
+                    And(Use(int), lambda n: 0 <= n <= 5),
+                Optional('modbus_cache_age'):
+                    And(Use(float), lambda n: n >= 0),
+                Optional('modbus_interval'): And({
+                    'min': And(Use(int), lambda n: n >= 1),
+                    'max': And(Use(int), lambda n: n >= 1),
+                    Optional('change', default=0.05):
+                        And(Use(float), lambda n: n >= 0),
+                }, lambda d: d['min'] <= d['max']),
                 Optional('modbus_scanning'): {
                     'start': Use(int),
                     Optional('step', default=0x400): Use(int),
@@ -143,6 +174,19 @@ class Config():
                     Optional('forward', default=False): Use(bool),
                 },
                 Optional('modbus_polling', default=True): Use(bool),
+                Optional('modbus_max_len'):
+                    And(Use(int), lambda n: 1 <= n <= 125),
+                Optional('modbus_max_gap'): And(Use(int), lambda n: n >= 0),
+                Optional('modbus_max_retries'):
+                    And(Use(int), lambda n: 0 <= n <= 5),
+                Optional('modbus_cache_age'):
+                    And(Use(float), lambda n: n >= 0),
+                Optional('modbus_interval'): And({
+                    'min': And(Use(int), lambda n: n >= 1),
+                    'max': And(Use(int), lambda n: n >= 1),
+                    Optional('change', default=0.05):
+                        And(Use(float), lambda n: n >= 0),
+                }, lambda d: d['min'] <= d['max']),
                 Optional('modbus_scanning'): {
                     'start': Use(int),
                     Optional('step', default=0x400): Use(int),
@@ -221,9 +265,9 @@ here. The default config reader is handled in the Config.init method'''
             rd_config = reader.get_config()
             config = cls.act_config.copy()
             for key in ['tsun', 'solarman', 'mqtt', 'ha', 'inverters',
-                        'gen3plus', 'batteries']:
+                        'gen3plus', 'batteries', 'proxy', 'publish']:
                 if key in rd_config:
-                    config[key] = config[key] | rd_config[key]
+                    config[key] = config.get(key, {}) | rd_config[key]
 
             cls.act_config = cls.conf_schema.validate(config)
         except FileNotFoundError:
@@ -0,0 +1,86 @@
+'''CRC-16 engine for the MODBUS RTU frames
+
+The CRC is known as CRC-16-ANSI(reverse) or CRC-16/MODBUS.
+see: https://en.wikipedia.org/wiki/Computation_of_cyclic_redundancy_checks
+
+If the optional package 'crcmod' with its C extension is installed, it is
+used as backend. Otherwise a pure Python implementation processes two
+bytes per loop iteration with a single lookup in a 16-bit table: since
+the CRC register has only 16 bits, one lookup replaces two steps of the
+classic byte-wise algorithm. The table needs 128kB and is built on the
+first call.
+
+functions:
+    calc_crc():   returns the CRC-16 of a buffer
+    verify_crc(): checks the trailing CRC of a frame and returns the
+                  validity and the expected CRC of the frame
+'''
+import struct
+from array import array
+
+CRC_POLY = 0xA001  # (LSBF/reverse)
+CRC_INIT = 0xFFFF
+
+_tab8 = []
+'''classic table for the byte-wise algorithm'''
+_tab16 = array('H')
+'''table for 16-bit words (little endian)'''
+
+
+def _build_tabs() -> None:
+    '''Build the CRC-16 helper tables, called on the first CRC calculation
+    '''
+    for index in range(256):
+        crc = index
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ CRC_POLY
+            else:
+                crc >>= 1
+        _tab8.append(crc)
+
+    # CRC of a word with a zero start value. For the start value crc the
+    # CRC is: _tab16[crc ^ word]
+    _tab16.extend(_tab8[(_tab8[w & 0xff] ^ (w >> 8)) & 0xff] ^
+                  (_tab8[w & 0xff] >> 8) for w in range(0x10000))
+
+
+def _calc_crc_py(buffer: bytes, crc: int = CRC_INIT) -> int:
+    '''Build CRC-16 for buffer and returns it'''
+    if not _tab8:
+        _build_tabs()
+    tab16 = _tab16
+    words = len(buffer) >> 1
+    for word in struct.unpack_from(f'<{words}H', buffer):
+        crc = tab16[crc ^ word]
+    if len(buffer) & 1:
+        crc = (crc >> 8) ^ _tab8[(crc ^ buffer[-1]) & 0xFF]
+    return crc
+
+
+try:  # pragma: no cover
+    import crcmod.predefined
+    import crcmod._crcfunext  # noqa: F401, only the C extension is faster
+    _crcmod_fnc = crcmod.predefined.mkPredefinedCrcFun('modbus')
+
+    def _calc_crc_ext(buffer: bytes, crc: int = CRC_INIT) -> int:
+        '''Build CRC-16 for buffer with the crcmod backend'''
+        return _crcmod_fnc(bytes(buffer), crc)
+
+    calc_crc = _calc_crc_ext
+    BACKEND = 'crcmod'
+except ImportError:
+    calc_crc = _calc_crc_py
+    BACKEND = 'python'
+
+
+def verify_crc(msg: bytes) -> tuple[bool, int]:
+    '''Check the trailing CRC-16 of msg
+
+    The CRC is calculated only once, over the frame without the trailing
+    CRC. Returns a tuple with the validity and the expected CRC.
+    '''
+    if len(msg) < 2:
+        return False, CRC_INIT
+    expected = calc_crc(memoryview(msg)[:-2])
+    return expected == (msg[-2] | (msg[-1] << 8)), expected
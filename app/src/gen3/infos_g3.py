@@ -5,6 +5,7 @@ from typing import Generator
 from itertools import chain
 
 from infos import Infos, Register
+from value_store import PUBLISH
 
 
 class RegisterMap:
@@ -204,64 +205,64 @@ class InfosG3(Infos):
             if res:
                 yield res
 
+    __elms = struct.Struct('!l')
+    '''number of elements of a data sequence'''
+    __tlv_hdr = struct.Struct('!lB')
+    '''element header: address and data type'''
+    __tlv_types = {
+        0x42: struct.Struct('!B'),   # 'B' -> byte, int8
+        0x49: struct.Struct('!l'),   # 'I' -> int32
+        0x53: struct.Struct('!h'),   # 'S' -> short, int16
+        0x46: struct.Struct('!f'),   # 'F' -> float32
+        0x4c: struct.Struct('!q'),   # 'L' -> long, int64
+    }
+    '''decoder of the data types with a fixed size'''
+    __plans = {}
+    '''compiled register maps by sensor list'''
+
     def parse(self, buf, ind=0, sensor: int = 0, node_id: str = '') -> \
             Generator[tuple[str, bool], None, None]:
         '''parse a data sequence received from the inverter and
         stores the values in Infos.db
 
         buf: buffer of the sequence to parse'''
-        reg_map = RegisterSel.get(sensor)
-        result = struct.unpack_from('!l', buf, ind)
-        elms = result[0]
-        i = 0
+        plan = self.__plans.get(sensor)
+        if plan is None:
+            plan = self.__compile_plan(sensor)
+        tlv_types = self.__tlv_types
+        unpack_hdr = self.__tlv_hdr.unpack_from
+        elms = self.__elms.unpack_from(buf, ind)[0]
         ind += 4
-        while i < elms:
-            result = struct.unpack_from('!lB', buf, ind)
-            addr = result[0]
-            if addr not in reg_map:
-                row = None
-                info_id = -1
-            else:
-                row = reg_map[addr]
-                info_id = row['reg']
-            data_type = result[1]
+        for i in range(elms):
+            addr, data_type = unpack_hdr(buf, ind)
             ind += 5
+            entry = plan.get(addr)
+            tlv = tlv_types.get(data_type)
+            if tlv is not None:
+                if entry is None:      # skip values which are not mapped
+                    ind += tlv.size
+                    continue
+                result = tlv.unpack_from(buf, ind)[0]
+                ind += tlv.size
+                if data_type == 0x46:
+                    result = round(result, 2)
 
-            if data_type == 0x54:   # 'T' -> Pascal-String
+            elif data_type == 0x54:   # 'T' -> Pascal-String
                 str_len = buf[ind]
+                if entry is None:
+                    ind += str_len+1
+                    continue
                 result = struct.unpack_from(f'!{str_len+1}p', buf,
                                             ind)[0].decode(encoding='ascii',
                                                            errors='replace')
                 ind += str_len+1
 
-            elif data_type == 0x00:  # 'Nul' -> end
-                i = elms  # abort the loop
+            elif data_type == 0x00:   # 'Nul' -> end
+                return
 
-            elif data_type == 0x41:  # 'A' -> Nop ??
-                ind += 0
-                i += 1
+            elif data_type == 0x41:   # 'A' -> Nop ??
                 continue
 
-            elif data_type == 0x42:  # 'B' -> byte, int8
-                result = struct.unpack_from('!B', buf, ind)[0]
-                ind += 1
-
-            elif data_type == 0x49:  # 'I' -> int32
-                result = struct.unpack_from('!l', buf, ind)[0]
-                ind += 4
-
-            elif data_type == 0x53:  # 'S' -> short, int16
-                result = struct.unpack_from('!h', buf, ind)[0]
-                ind += 2
-
-            elif data_type == 0x46:  # 'F' -> float32
-                result = round(struct.unpack_from('!f', buf, ind)[0], 2)
-                ind += 4
-
-            elif data_type == 0x4c:  # 'L' -> long, int64
-                result = struct.unpack_from('!q', buf, ind)[0]
-                ind += 8
-
             else:
                 self.inc_counter('Invalid_Data_Type')
                 logging.error(f"Infos.parse: data_type: {data_type}"
@@ -269,27 +270,24 @@ class InfosG3(Infos):
                               " not supported")
                 return
 
-            result = self.__modify_val(row, result)
-
-            yield from self.__store_result(addr, result, info_id, node_id)
-            i += 1
-
-    def __modify_val(self, row, result):
-        if row and 'ratio' in row:
-            result = round(result * row['ratio'], 2)
-        return result
-
-    def __store_result(self, addr, result, info_id, node_id):
-        keys, level, unit, must_incr = self._key_obj(info_id)
-        if keys:
-            name, update = self.update_db(keys, must_incr, result)
-            yield keys[0], update
-        else:
-            update = False
-            name = str(f'info-id.0x{addr:x}')
-        if update:
-            self.tracer.log(level, f'[{node_id}] GEN3: {name} :'
-                                   f' {result}{unit}')
+            group, slot, must_incr, level, unit, ratio = entry
+            if ratio is not None:
+                result = round(result * ratio, 2)
+            update = self.update_db_slot(slot, must_incr, result)
+            yield group, update == PUBLISH
+            if update:
+                self.value_changed(level, node_id, 'GEN3', slot, result,
+                                   unit, root=True)
 
-            logging.log(level, f'[{node_id}] GEN3: {name} :'
-                               f' {result}{unit}')
+    def __compile_plan(self, sensor: int) -> dict:
+        '''Build the decode plan of the register map for a sensor list.
+        The plan holds an entry for every address with a db key: db group,
+        db slot, must_incr flag, log level, unit and ratio'''
+        plan = {}
+        for addr, row in RegisterSel.get(sensor).items():
+            keys, level, unit, must_incr = self._key_obj(row['reg'])
+            if keys:
+                plan[addr] = (keys[0], self.key_slot(keys), must_incr,
+                              level, unit, row.get('ratio'))
+        self.__plans[sensor] = plan
+        return plan
@@ -52,6 +52,7 @@ class Talent(Message):
         self.contact_mail = b''
         self.ts_offset = 0        # time offset between tsun cloud and local
         self.db = InfosG3()
+        self.db.store.flush_cb = self._publish_flushed
         self.switch = {
             0x00: self.msg_contact_info,
             0x13: self.msg_ota_update,
@@ -88,6 +89,8 @@ class Talent(Message):
         # deallocated by the garbage collector ==> we get a memory leak
         self.switch.clear()
         self.log_lvl.clear()
+        self.db.store.flush_cb = None
+        self.db.store.cancel_flush()
         super().close()
 
     def __set_serial_no(self, serial_no: str):
@@ -148,8 +151,7 @@ class Talent(Message):
         tsun = Config.get('tsun')
         if tsun['enabled']:
             buflen = self.header_len+self.data_len
-            buffer = self.ifc.rx_peek(buflen)
-            self.ifc.fwd_add(buffer)
+            self.ifc.fwd_add(self.ifc.rx_view(0, buflen))
             self.ifc.fwd_log(logging.DEBUG, 'Store for forwarding:')
 
             fnc = self.switch.get(self.msg_id, self.msg_unknown)
@@ -172,6 +174,7 @@ class Talent(Message):
         self.ifc.tx_flush()
 
     def mb_timout_cb(self, exp_cnt):
+        self._adapt_polling()
         self.mb_timer.start(self.mb_timeout)
         if self.mb_scan:
             self._send_modbus_scan()
@@ -180,10 +183,10 @@ class Talent(Message):
         if 2 == (exp_cnt % 30):
             # logging.info("Regular Modbus Status request")
             self._send_modbus_cmd(Modbus.INV_ADDR, Modbus.READ_REGS, 0x2000,
-                                  96, logging.DEBUG)
+                                  96, logging.DEBUG, Modbus.PRIO_SLOW)
         else:
             self._send_modbus_cmd(Modbus.INV_ADDR, Modbus.READ_REGS, 0x3000,
-                                  48, logging.DEBUG)
+                                  48, logging.DEBUG, Modbus.PRIO_POLL)
 
     def _init_new_client_conn(self) -> bool:
         contact_name = self.contact_name
@@ -236,24 +239,30 @@ class Talent(Message):
 
     def _update_header(self, _forward_buffer):
         '''update header for message before forwarding,
-        add time offset to timestamp'''
+        add time offset to timestamp
+
+        The timestamps are patched in place for every message in the
+        buffer. Without a time offset there is nothing to do'''
+        if not self.ts_offset:
+            return
         _len = len(_forward_buffer)
         ofs = 0
         while ofs < _len:
-            result = struct.unpack_from('!lB', _forward_buffer, 0)
+            result = struct.unpack_from('!lB', _forward_buffer, ofs)
             msg_len = 4 + result[0]
             id_len = result[1]    # len of variable id string
-            if _len < 2*id_len + 21:
+            if _len - ofs < 2*id_len + 21:
                 return
 
-            result = struct.unpack_from('!B', _forward_buffer, id_len+6)
-            msg_code = result[0]
-            if msg_code == 0x71 or msg_code == 0x04:
-                result = struct.unpack_from('!q', _forward_buffer, 13+2*id_len)
+            msg_code = _forward_buffer[ofs+id_len+6]
+            ts_ofs = ofs + 13 + 2*id_len
+            if (msg_code == 0x71 or msg_code == 0x04) and \
+               ts_ofs + 8 <= ofs + msg_len:     # ack msgs have no timestamp
+                result = struct.unpack_from('!q', _forward_buffer, ts_ofs)
                 ts = result[0] + self.ts_offset
                 logger.debug(f'offset: {self.ts_offset:08x}'
                              f'  proxy-time: {ts:08x}')
-                struct.pack_into('!q', _forward_buffer, 13+2*id_len, ts)
+                struct.pack_into('!q', _forward_buffer, ts_ofs, ts)
             ofs += msg_len
 
     # check if there is a complete header in the buffer, parse it
@@ -516,7 +525,7 @@ class Talent(Message):
 
         inv_update = False
 
-        for key, update in self.db.parse(self.ifc.rx_peek(), self.header_len
+        for key, update in self.db.parse(self.ifc.rx_view(), self.header_len
                                          + msg_hdr_len, data_id, self.node_id):
             if update:
                 if key == 'inverter':
@@ -571,8 +580,7 @@ class Talent(Message):
         self.__msg_modbus(hdr_len)
 
     def __msg_modbus(self, hdr_len):
-        data = self.ifc.rx_peek()[self.header_len:
-                                  self.header_len+self.data_len]
+        data = self.ifc.rx_view(self.header_len, self.data_len)
 
         if self.ctrl.is_req():
             rstream = self.ifc.remote.stream
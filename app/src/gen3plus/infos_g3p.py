@@ -1,9 +1,11 @@
 
+import struct
 import logging
 from collections.abc import Generator
 from itertools import chain
 
 from infos import Infos, Register, ProxyMode, Fmt
+from value_store import PUBLISH
 
 
 class RegisterFunc:
@@ -259,6 +261,8 @@ class RegisterSel:
 
 class InfosG3P(Infos):
     __slots__ = ('client_mode', )
+    __plans = {}
+    '''compiled parse plans, by (sensor, msg_type, ftype)'''
 
     def __init__(self, client_mode: bool):
         super().__init__()
@@ -314,23 +318,56 @@ class InfosG3P(Infos):
         stores the values in Infos.db
 
         buf: buffer of the sequence to parse'''
-        reg_map = RegisterSel.get(sensor)
-        for idx, row in reg_map.items():
+        plan = self.__plans.get((sensor, msg_type, rcv_ftype))
+        if plan is None:
+            plan = self.__compile_plan(sensor, msg_type, rcv_ftype)
+
+        buf_len = len(buf)
+        for ofs, end, get, group, slot, must_incr, level, unit in plan:
+            if end > buf_len:
+                break  # sorted by offset, the following values are missing too
+            result = get(buf, ofs)
+            if result is None:
+                continue
+            update = self.update_db_slot(slot, must_incr, result)
+            yield group, update == PUBLISH
+            if update:
+                self.value_changed(level, node_id, 'GEN3PLUS', slot, result,
+                                   unit)
+        yield from self.calc(sensor, node_id)
+
+    @classmethod
+    def reset_plans(cls) -> None:
+        '''Drop the compiled parse plans, must be called after a change of
+        the register maps'''
+        cls.__plans.clear()
+
+    def __compile_plan(self, sensor: int, msg_type: int,
+                       rcv_ftype: int) -> list[tuple]:
+        '''Build the parse plan for the message type and the frame type of
+        a sensor list. The plan holds only the registers of this frame with
+        a db key, sorted by offset: offset, end of the value, value getter,
+        db group, db slot, must_incr flag, log level and unit'''
+        plan = []
+        for idx, row in RegisterSel.get(sensor).items():
             if 'calc' == idx or 'len' == idx:
                 continue
-            addr = idx & 0xffff
             ftype = (idx >> 16) & 0xff
             mtype = (idx >> 24) & 0xff
             if ftype != rcv_ftype or mtype != msg_type:
                 continue
-            if not isinstance(row, dict):
+            if not isinstance(row, dict) or 'fmt' not in row:
                 continue
-            info_id = row['reg']
-            result = Fmt.get_value(buf, addr, row)
-            if result is None:
+            keys, level, unit, must_incr = self._key_obj(row['reg'])
+            if not keys:
                 continue
-            yield from self.__update_val(node_id, "GEN3PLUS", info_id, result)
-        yield from self.calc(sensor, node_id)
+            addr = idx & 0xffff
+            end = addr + struct.calcsize(row['fmt'])
+            plan.append((addr, end, Fmt.getter(row), keys[0],
+                         self.key_slot(keys), must_incr, level, unit))
+        plan.sort(key=lambda entry: entry[0])
+        self.__plans[(sensor, msg_type, rcv_ftype)] = plan
+        return plan
 
     def calc(self, sensor: int = 0, node_id: str = '') \
             -> Generator[tuple[str, bool], None, None]:
@@ -350,11 +387,12 @@ class InfosG3P(Infos):
     def __update_val(self, node_id, source: str, info_id, result):
         keys, level, unit, must_incr = self._key_obj(info_id)
         if keys:
-            name, update = self.update_db(keys, must_incr, result)
-            yield keys[0], update
+            slot = self.key_slot(keys)
+            update = self.update_db_slot(slot, must_incr, result)
+            yield keys[0], update == PUBLISH
             if update:
-                self.tracer.log(level, f'[{node_id}] {source}: {name}'
-                                       f' : {result}{unit}')
+                self.value_changed(level, node_id, source, slot, result,
+                                   unit)
 
     def build(self, msg_type: int, rcv_ftype: int, sensor: int = 0):
         reg_map = RegisterSel.get(sensor)
@@ -157,18 +157,24 @@ class SolarmanBase(Message):
     '''
     def __update_header(self, _forward_buffer):
         '''update header for message before forwarding,
-        set sequence and checksum'''
+        set sequence and checksum
+
+        Only the two sequence bytes change, so the checksum is corrected by
+        the difference of the old and the new bytes. The cost doesn't
+        depend on the payload length'''
         _len = len(_forward_buffer)
         ofs = 0
         while ofs < _len:
-            result = struct.unpack_from('<BH', _forward_buffer, ofs)
-            data_len = result[1]    # len of variable id string
-
-            struct.pack_into('<H', _forward_buffer, ofs+5,
-                             self.seq.get_send())
-
-            check = sum(_forward_buffer[ofs+1:ofs+data_len+11]) & 0xff
-            struct.pack_into('<B', _forward_buffer, ofs+data_len+11, check)
+            data_len = _forward_buffer[ofs+1] | (_forward_buffer[ofs+2] << 8)
+            crc_ofs = ofs + data_len + 11
+            seq = self.seq.get_send()
+            lo, hi = seq & 0xff, seq >> 8
+
+            _forward_buffer[crc_ofs] = (
+                _forward_buffer[crc_ofs] + lo + hi -
+                _forward_buffer[ofs+5] - _forward_buffer[ofs+6]) & 0xff
+            _forward_buffer[ofs+5] = lo
+            _forward_buffer[ofs+6] = hi
             ofs += (13 + data_len)
 
     def __process_complete_received_msg(self):
@@ -226,7 +232,7 @@ class SolarmanBase(Message):
 
             return False
 
-        check = sum(buf[1:buf_len-2]) & 0xff
+        check = sum(self.ifc.rx_view(1, buf_len-3)) & 0xff
         if check != crc:
             self.inc_counter('Invalid_Msg_Format')
             logger.debug(f'CRC {int(crc):#02x} {int(check):#08x}'
@@ -256,7 +262,7 @@ class SolarmanBase(Message):
     Message handler methods
     '''
     def msg_response(self):
-        data = self.ifc.rx_peek()[self.header_len:]
+        data = self.ifc.rx_view(self.header_len)
         result = struct.unpack_from('<BBLL', data, 0)
         ftype = result[0]  # always 2
         valid = result[1] == 1  # status
@@ -279,6 +285,13 @@ class SolarmanV5(SolarmanBase):
     '''Data up time in client mode'''
     HDR_FMT = '<BLLL'
     '''format string for packing of the header'''
+    ACK_FMT = '<BHHHLBBLLBB'
+    '''format string of a complete ack response frame'''
+    ACK_LEN = 23
+    '''length of an ack response frame'''
+    __ack_tmpl = {}
+    '''prepared ack frames and checksum of their fixed bytes, by
+    (ctrl, ftype, ack, heartbeat)'''
 
     def __init__(self, inverter, addr, ifc: "AsyncIfc",
                  server_side: bool, client_mode: bool):
@@ -287,6 +300,7 @@ class SolarmanV5(SolarmanBase):
 
         self.inverter = inverter
         self.db = InfosG3P(client_mode)
+        self.db.store.flush_cb = self._publish_flushed
         self.no_forwarding = False
         '''not allowed to connect to TSUN cloud by connection type'''
         self.establish_inv_emu = False
@@ -369,6 +383,8 @@ class SolarmanV5(SolarmanBase):
         self.switch.clear()
         self.log_lvl.clear()
         self.background_tasks.clear()
+        self.db.store.flush_cb = None
+        self.db.store.cancel_flush()
         super().close()
 
     def send_start_cmd(self, snr: int, host: str,
@@ -403,11 +419,9 @@ class SolarmanV5(SolarmanBase):
         if self.mb_scan:
             self._send_modbus_cmd(self.mb_inv_no, Modbus.READ_REGS,
                                   self.mb_start_reg, self.mb_bytes,
-                                  logging.INFO)
+                                  logging.INFO, Modbus.PRIO_SCAN)
         else:
-            for reg in self.mb_regs:
-                self._send_modbus_cmd(Modbus.INV_ADDR, Modbus.READ_REGS,
-                                      reg['addr'], reg['len'], logging.DEBUG)
+            self._send_modbus_reads(self.mb_regs, logging.DEBUG)
 
         self.mb_timer.start(self.mb_timeout)
 
@@ -426,7 +440,8 @@ class SolarmanV5(SolarmanBase):
             '<BHHHLBL', build_msg, 0, 0xA5, _len-11, 0x4110,
             0, self.snr, 2, self._emu_timestamp())
         self.ifc.fwd_add(build_msg)
-        self.ifc.fwd_add(struct.pack('<BB', 0, 0x15))    # crc & stop
+        check = sum(build_msg[1:_len-2]) & 0xff
+        self.ifc.fwd_add(struct.pack('<BB', check, 0x15))    # crc & stop
 
     def _set_config_parms(self, inv: dict, serial_no: str = ""):
         '''init connection with params from the configuration'''
@@ -527,11 +542,38 @@ class SolarmanV5(SolarmanBase):
         return 60                  # pragma: no cover
 
     def __send_ack_rsp(self, msgtype, ftype, ack=1):
-        self._build_header(msgtype)
-        self.ifc.tx_add(struct.pack('<BBLL', ftype, ack,
-                                    self._timestamp(),
-                                    self._heartbeat()))
-        self._finish_send_msg()
+        '''send an ack response, built from a prepared frame template
+
+        Only the sequence, the serial number and the timestamp differ
+        between two acks, so just these bytes are patched into a copy of
+        the template and added to the checksum of the fixed bytes'''
+        key = (msgtype, ftype, ack, self._heartbeat())
+        tmpl = self.__ack_tmpl.get(key)
+        if tmpl is None:
+            tmpl = self.__build_ack_tmpl(*key)
+        frame, check = tmpl
+        buf = bytearray(frame)
+        struct.pack_into('<HLBBL', buf, 5, self.seq.get_send(), self.snr,
+                         ftype, ack, self._timestamp())
+        buf[self.ACK_LEN-2] = (check + sum(buf[5:17])) & 0xff
+        self.send_msg_ofs = self.ifc.tx_len()
+        self.ifc.tx_add(buf)
+        if logger.isEnabledFor(logging.INFO):
+            _fnc, _str = self.get_fnc_handler(msgtype)
+            logger.info(self._flow_str(self.server_side, 'tx') +
+                        f' Ctl: {int(msgtype):#04x} Msg: {_str}')
+
+    @classmethod
+    def __build_ack_tmpl(cls, msgtype, ftype, ack, heartbeat) \
+            -> tuple[bytes, int]:
+        frame = struct.pack(cls.ACK_FMT, 0xA5, cls.ACK_LEN-13, msgtype,
+                            0, 0, ftype, ack, 0, heartbeat, 0, 0x15)
+        # the checksum covers the bytes between start and checksum, the
+        # bytes at offset 5..16 are summed up when the ack is sent
+        check = sum(frame[1:5]) + sum(frame[17:cls.ACK_LEN-2])
+        tmpl = cls.__ack_tmpl[(msgtype, ftype, ack, heartbeat)] = \
+            (frame, check)
+        return tmpl
 
     def send_modbus_cb(self, pdu: bytearray, log_lvl: int, state: str):
         if self.state != State.up:
@@ -547,6 +589,7 @@ class SolarmanV5(SolarmanBase):
         self.ifc.tx_flush()
 
     def mb_timout_cb(self, exp_cnt):
+        self._adapt_polling()
         self.mb_timer.start(self.mb_timeout)
         if self.mb_scan:
             self._send_modbus_scan()
@@ -557,16 +600,13 @@ class SolarmanV5(SolarmanBase):
                     self.mb_regs,
                 ) = self.sensor_list_detection.next()
 
-            for reg in self.mb_regs:
-                self._send_modbus_cmd(Modbus.INV_ADDR, Modbus.READ_REGS,
-                                      reg['addr'], reg['len'], logging.INFO)
-
             if 1 == (exp_cnt % 30):
                 # logging.info("Regular Modbus Status request")
-                for reg in self.mb_slow_regs:
-                    self._send_modbus_cmd(Modbus.INV_ADDR, Modbus.READ_REGS,
-                                          reg['addr'], reg['len'],
-                                          logging.INFO)
+                # the slow registers can be merged with the regular ones
+                self._send_modbus_reads(self.mb_regs, logging.INFO,
+                                        self.mb_slow_regs)
+            else:
+                self._send_modbus_reads(self.mb_regs, logging.INFO)
 
     def at_cmd_forbidden(self, cmd: str, connection: str) -> bool:
         return not cmd.startswith(tuple(self.at_acl[connection]['allow'])) or \
@@ -620,7 +660,8 @@ class SolarmanV5(SolarmanBase):
         self.ifc.tx_flush()
 
     def __forward_msg(self):
-        self.forward(self.ifc.rx_peek(), self.header_len+self.data_len+2)
+        buflen = self.header_len+self.data_len+2
+        self.forward(self.ifc.rx_view(0, buflen), buflen)
 
     def __build_model_name(self):
         """Determines and sets the inverter model name based on its
@@ -683,7 +724,7 @@ class SolarmanV5(SolarmanBase):
     def __process_data(self, ftype, ts, sensor=0):
         inv_update = False
         msg_type = self.control >> 8
-        for key, update in self.db.parse(self.ifc.rx_peek(), msg_type,
+        for key, update in self.db.parse(self.ifc.rx_view(), msg_type,
                                          ftype, sensor, self.node_id):
             if update:
                 if key == 'inverter':
@@ -705,7 +746,7 @@ class SolarmanV5(SolarmanBase):
         self.__forward_msg()
 
     def msg_dev_ind(self):
-        data = self.ifc.rx_peek()[self.header_len:]
+        data = self.ifc.rx_view(self.header_len)
         result = struct.unpack_from(self.HDR_FMT, data, 0)
         ftype = result[0]  # always 2
         total = result[1]
@@ -754,7 +795,7 @@ class SolarmanV5(SolarmanBase):
         self.new_state_up()
 
     def msg_sync_start(self):
-        data = self.ifc.rx_peek()[self.header_len:]
+        data = self.ifc.rx_view(self.header_len)
         result = struct.unpack_from(self.HDR_FMT, data, 0)
         ftype = result[0]
         total = result[1]
@@ -767,12 +808,11 @@ class SolarmanV5(SolarmanBase):
         self.__send_ack_rsp(0x1310, ftype)
 
     def msg_command_req(self):
-        data = self.ifc.rx_peek()[self.header_len:
-                                  self.header_len+self.data_len]
+        data = self.ifc.rx_view(self.header_len, self.data_len)
         result = struct.unpack_from('<B', data, 0)
         ftype = result[0]
         if ftype == self.AT_CMD:
-            at_cmd = data[15:].decode()
+            at_cmd = data[15:].tobytes().decode()
             if self.at_cmd_forbidden(cmd=at_cmd, connection='tsun'):
                 self.inc_counter('AT_Command_Blocked')
                 return
@@ -819,13 +859,12 @@ class SolarmanV5(SolarmanBase):
         return logging.WARNING
 
     def msg_command_rsp(self):
-        data = self.ifc.rx_peek()[self.header_len:
-                                  self.header_len+self.data_len]
+        data = self.ifc.rx_view(self.header_len, self.data_len)
         ftype = data[0]
         if ftype == self.AT_CMD or \
            ftype == self.AT_CMD_RSP:
             if not self.inverter.forward_at_cmd_resp:
-                data_json = data[14:].decode("utf-8")
+                data_json = data[14:].tobytes().decode("utf-8")
                 node_id = self.node_id
                 key = 'at_resp'
                 logger.info(f'{key}: {data_json}')
@@ -929,7 +968,7 @@ class SolarmanV5(SolarmanBase):
                     self.mb_timout_cb(0)
 
     def msg_hbeat_ind(self):
-        data = self.ifc.rx_peek()[self.header_len:]
+        data = self.ifc.rx_view(self.header_len)
         result = struct.unpack_from('<B', data, 0)
         ftype = result[0]
 
@@ -938,7 +977,7 @@ class SolarmanV5(SolarmanBase):
         self.new_state_up()
 
     def msg_sync_end(self):
-        data = self.ifc.rx_peek()[self.header_len:]
+        data = self.ifc.rx_view(self.header_len)
         result = struct.unpack_from(self.HDR_FMT, data, 0)
         ftype = result[0]
         total = result[1]
@@ -3,7 +3,9 @@ import json
 import struct
 import os
 from enum import Enum
-from typing import Generator
+from typing import Generator, Callable
+from value_store import StoreLayout, ValueStore
+from change_log import ChangeLog
 
 
 class ProxyMode(Enum):
@@ -46,6 +48,11 @@ class Register(Enum):
     AT_COMMAND_BLOCKED = 61
     CLOUD_CONN_CNT = 62
     DCU_COMMAND = 63
+    PROC_TIME_P99 = 64
+    LOOP_LAG_P99 = 65
+    MQTT_QUEUE_DEPTH = 66
+    MQTT_LATENCY_P99 = 67
+    MODBUS_RTT_P99 = 68
     OUTPUT_POWER = 83
     RATED_POWER = 84
     INVERTER_TEMP = 85
@@ -221,8 +228,11 @@ class Register(Enum):
 
 class Fmt:
     @staticmethod
-    def get_value(buf: bytes, idx: int, row: dict):
-        '''Get a value from buf and interpret as in row defined'''
+    def get_value(buf: bytes | memoryview, idx: int, row: dict):
+        '''Get a value from buf and interpret as in row defined
+
+        buf can be a memoryview of the receive buffer, the value is
+        unpacked in place without copying the frame'''
         fmt = row['fmt']
         try:
             res = struct.unpack_from(fmt, buf, idx)
@@ -241,6 +251,38 @@ class Fmt:
             result = result + row['offset']
         return result
 
+    @staticmethod
+    def getter(row: dict) -> Callable[[bytes | memoryview, int], object]:
+        '''Compile the row definition into a function get(buf, idx)
+
+        get(buf, idx) returns the same value as get_value(buf, idx, row),
+        but the format is precompiled into a struct.Struct and the row is
+        not probed for func, ratio, quotient and offset on every call'''
+        unpack = struct.Struct(row['fmt']).unpack_from
+        func = row.get('func')
+        ratio = row.get('ratio')
+        quotient = row.get('quotient')
+        offset = row.get('offset')
+
+        def get(buf: bytes | memoryview, idx: int):
+            try:
+                res = unpack(buf, idx)
+            except Exception:
+                return None
+            result = res[0]
+            if isinstance(result, (bytearray, bytes)):
+                result = result.decode().split('\x00')[0]
+            if func is not None:
+                result = func(res)
+            if ratio is not None:
+                result = round(result * ratio, 2)
+            if quotient is not None:
+                result = round(result/quotient)
+            if offset is not None:
+                result = result + offset
+            return result
+        return get
+
     @staticmethod
     def hex4(val: tuple | str, reverse=False) -> str | int:
         if not reverse:
@@ -321,7 +363,7 @@ class ClrAtMidnight:
 
 
 class Infos:
-    __slots__ = ('db', 'tracer', )
+    __slots__ = ('store', 'tracer', 'ha_cache')
 
     LIGHTNING = 'mdi:lightning-bolt'
     COUNTER = 'mdi:counter'
@@ -344,6 +386,10 @@ class Infos:
     app_name = os.getenv('SERVICE_NAME', 'proxy')
     version = os.getenv('VERSION', 'unknown')
     new_stat_data = {}
+    __layout = StoreLayout()
+    '''slots of the value stores, shared by all connections'''
+    __reg_slots = {}
+    '''slot number of every register in info_defs'''
 
     @classmethod
     def static_init(cls):
@@ -361,8 +407,64 @@ class Infos:
         prxy['mdl'] = cls.app_name
 
     def __init__(self):
-        self.db = {}
+        if not self.__reg_slots:
+            self.__init_slots()
+        self.store = ValueStore(self.__layout)
         self.tracer = logging.getLogger('data')
+        self.ha_cache = {}
+        '''(arguments, device, result) of the last ha_conf() by register'''
+
+    @classmethod
+    def __init_slots(cls) -> None:
+        '''assign a slot to every register, in the order of info_defs'''
+        for reg, row in cls.__info_defs.items():
+            if isinstance(row, dict) and row.get('name'):
+                cls.__reg_slots[reg] = cls.__layout.slot(row['name'])
+
+    @classmethod
+    def set_publish_filter(cls, cnf: dict) -> None:
+        '''Set the publish filters of the registers from the config
+
+        cnf ==> dict with a register name, like 'grid.Voltage', or a group
+                name, like 'grid', as key and a dict with the optional
+                values 'deadband' and 'min_interval' (in seconds). The
+                settings of a register override the settings of its group
+        '''
+        if not cls.__reg_slots:
+            cls.__init_slots()
+        layout = cls.__layout
+        filters = {}
+        for name, flt in sorted(cnf.items(), key=lambda x: '.' in x[0]):
+            if '.' in name:
+                slot = layout.slots.get(tuple(name.split('.')))
+                if slot is None:
+                    logging.warning(f'publish filter: unknown register'
+                                    f' "{name}"')
+                    continue
+                slots = [slot]
+            else:
+                grp = layout.group_idx.get(name)
+                if grp is None:
+                    logging.warning(f'publish filter: unknown group'
+                                    f' "{name}"')
+                    continue
+                slots = [slot for slot, idx in enumerate(layout.group_of)
+                         if idx == grp]
+            for slot in slots:
+                deadband, min_interval = filters.get(slot, (0, 0))
+                filters[slot] = (flt.get('deadband', deadband),
+                                 flt.get('min_interval', min_interval))
+        layout.filters = {slot: flt for slot, flt in filters.items()
+                          if any(flt)}
+
+    @property
+    def db(self) -> ValueStore:
+        '''value store with the dict interface of the nested db dict'''
+        return self.store
+
+    @db.setter
+    def db(self, value: dict) -> None:
+        self.store.load(value)
 
     __info_devs = {
         'proxy':      {'singleton': True,   'name': 'Proxy', 'mf': 'Stefan Allius'},  # noqa: E501
@@ -639,6 +741,11 @@ class Infos:
         Register.AT_COMMAND_BLOCKED: {'name': ['proxy', 'AT_Command_Blocked'], 'singleton': True,   'ha': {'dev': 'proxy', 'comp': 'sensor', 'dev_cla': None, 'stat_cla': None, 'id': 'at_cmd_blocked_', 'fmt': FMT_INT, 'name': 'AT Command Blocked',   'icon': COUNTER, 'ent_cat': 'diagnostic'}},  # noqa: E501
         Register.DCU_COMMAND:        {'name': ['proxy', 'DCU_Command'],        'singleton': True,   'ha': {'dev': 'proxy', 'comp': 'sensor', 'dev_cla': None, 'stat_cla': None, 'id': 'dcu_cmd_',       'fmt': FMT_INT, 'name': 'DCU Command',          'icon': COUNTER, 'ent_cat': 'diagnostic'}},  # noqa: E501
         Register.MODBUS_COMMAND:     {'name': ['proxy', 'Modbus_Command'],     'singleton': True,   'ha': {'dev': 'proxy', 'comp': 'sensor', 'dev_cla': None, 'stat_cla': None, 'id': 'modbus_cmd_',    'fmt': FMT_INT, 'name': 'Modbus Command',       'icon': COUNTER, 'ent_cat': 'diagnostic'}},  # noqa: E501
+        Register.PROC_TIME_P99:      {'name': ['proxy', 'Proc_Time_P99'],      'singleton': True,   'unit': 'ms', 'ha': {'dev': 'proxy', 'comp': 'sensor', 'dev_cla': 'duration', 'stat_cla': 'measurement', 'id': 'proc_time_p99_', 'fmt': FMT_INT, 'name': 'Processing Time P99', 'icon': GAUGE, 'ent_cat': 'diagnostic'}},  # noqa: E501
+        Register.LOOP_LAG_P99:       {'name': ['proxy', 'Loop_Lag_P99'],       'singleton': True,   'unit': 'ms', 'ha': {'dev': 'proxy', 'comp': 'sensor', 'dev_cla': 'duration', 'stat_cla': 'measurement', 'id': 'loop_lag_p99_',  'fmt': FMT_INT, 'name': 'Event Loop Lag P99',  'icon': GAUGE, 'ent_cat': 'diagnostic'}},  # noqa: E501
+        Register.MQTT_QUEUE_DEPTH:   {'name': ['proxy', 'MQTT_Queue_Depth'],   'singleton': True,   'ha': {'dev': 'proxy', 'comp': 'sensor', 'dev_cla': None, 'stat_cla': 'measurement', 'id': 'mqtt_queue_depth_', 'fmt': FMT_INT, 'name': 'MQTT Queue Depth', 'icon': GAUGE, 'ent_cat': 'diagnostic'}},  # noqa: E501
+        Register.MQTT_LATENCY_P99:   {'name': ['proxy', 'MQTT_Latency_P99'],   'singleton': True,   'unit': 'ms', 'ha': {'dev': 'proxy', 'comp': 'sensor', 'dev_cla': 'duration', 'stat_cla': 'measurement', 'id': 'mqtt_latency_p99_', 'fmt': FMT_INT, 'name': 'MQTT Publish Latency P99', 'icon': GAUGE, 'ent_cat': 'diagnostic'}},  # noqa: E501
+        Register.MODBUS_RTT_P99:     {'name': ['proxy', 'Modbus_RTT_P99'],     'singleton': True,   'unit': 'ms', 'ha': {'dev': 'proxy', 'comp': 'sensor', 'dev_cla': 'duration', 'stat_cla': 'measurement', 'id': 'modbus_rtt_p99_', 'fmt': FMT_INT, 'name': 'MODBUS Round-Trip Time P99', 'icon': GAUGE, 'ent_cat': 'diagnostic'}},  # noqa: E501
         # 0xffffff03:  {'name':['proxy', 'Voltage'],                        'level': logging.DEBUG, 'unit': 'V',    'ha':{'dev':'proxy', 'dev_cla': 'voltage',     'stat_cla': 'measurement', 'id':'proxy_volt_',  'fmt':FMT_FLOAT,'name': 'Grid Voltage'}},  # noqa: E501
 
         # events
@@ -831,11 +938,10 @@ class Infos:
             return idx               # return idx as a fixed value
         elif idx in self.info_defs:
             row = self.info_defs[idx]
-            if 'singleton' in row and row['singleton']:
-                db_dict = self.stat
-            else:
-                db_dict = self.db
+            if not ('singleton' in row and row['singleton']):
+                return self.get_db_value(idx)
 
+            db_dict = self.stat
             keys = row['name']
 
             for key in keys:
@@ -925,24 +1031,35 @@ class Infos:
     def __ha_conf(self, row, key, ha_prfx, node_id, snr,
                   sug_area: str) -> tuple[str, str, str, str] | None:
         ha = row['ha']
+        dev = None
+        if 'dev' in ha:
+            device = self.info_devs[ha['dev']]
+            if 'dep' in device and self.ignore_this_device(device['dep']):  # noqa: E501
+                return None
+            dev = self.__build_dev(device, key, ha, snr, sug_area)
+
+        # the payload depends only on the arguments and the device values,
+        # so an unchanged entity is not built and serialized again
+        ctx = (ha_prfx, node_id, snr, sug_area)
+        cached = self.ha_cache.get(key)
+        if cached is not None and cached[0] == ctx and cached[1] == dev:
+            return cached[2]
+
         if 'comp' in ha:
             component = ha['comp']
         else:
             component = 'sensor'
         attr = self.__build_attr(row, key, ha_prfx, node_id, snr)
-        if 'dev' in ha:
-            device = self.info_devs[ha['dev']]
-            if 'dep' in device and self.ignore_this_device(device['dep']):  # noqa: E501
-                return None
-            attr['dev'] = self.__build_dev(device, key, ha, snr,
-                                           sug_area)
+        if dev is not None:
+            attr['dev'] = dev
             attr['o'] = self.__build_origin()
-
         else:
             self.inc_counter('Internal_Error')
             logging.error(f"Infos.info_defs: the row for {key} "
                           "missing 'dev' value for ha register")
-        return json.dumps(attr), component, node_id, attr['uniq_id']
+        res = json.dumps(attr), component, node_id, attr['uniq_id']
+        self.ha_cache[key] = (ctx, dev, res)
+        return res
 
     def __build_attr(self, row, key, ha_prfx, node_id, snr):
         attr = {}
@@ -1082,32 +1199,47 @@ class Infos:
 
         return d['name'], d['level'], d['unit'], must_incr
 
-    def update_db(self, keys: list, must_incr: bool, result):
-        name = ''
-        db_dict = self.db
-        for key in keys[:-1]:
-            if key not in db_dict:
-                db_dict[key] = {}
-            db_dict = db_dict[key]
-            name += key + '.'
-        if keys[-1] not in db_dict:
-            update = (not must_incr or result > 0)
-        else:
-            if must_incr:
-                update = db_dict[keys[-1]] < result
-            else:
-                update = db_dict[keys[-1]] != result
-        if update:
-            db_dict[keys[-1]] = result
-        name += keys[-1]
-        return name, update
+    def update_db(self, keys: list, must_incr: bool, result,
+                  filtered: bool = True):
+        slot = self.__layout.slot(keys)
+        update = self.store.update(slot, must_incr, result, filtered)
+        return self.__layout.names[slot], update
+
+    def key_slot(self, keys: list | tuple) -> int:
+        '''Returns the slot of the db key path keys'''
+        return self.__layout.slot(keys)
+
+    def update_db_slot(self, slot: int, must_incr: bool, result) -> int:
+        '''update_db() for a slot of key_slot(), which doesn't build the
+        name string. Returns PUBLISH or HELD, if the value was updated, and
+        0 if not'''
+        return self.store.update(slot, must_incr, result)
+
+    def value_changed(self, level: int, node_id: str, source: str,
+                      slot: int, result, unit: str,
+                      root: bool = False) -> None:
+        '''Report a changed value to the change log, the data tracer and
+        optionally the root logger. The log string is only built, if a
+        logger is enabled for the level'''
+        if ChangeLog.ring is not None:
+            ChangeLog.add(node_id, source, self.__layout.names[slot],
+                          result, unit)
+        trace = self.tracer.isEnabledFor(level)
+        log = root and logging.root.isEnabledFor(level)
+        if trace or log:
+            msg = (f'[{node_id}] {source}: {self.__layout.names[slot]} :'
+                   f' {result}{unit}')
+            if trace:
+                self.tracer.log(level, msg)
+            if log:
+                logging.log(level, msg)
 
     def set_db_def_value(self, id: Register, value) -> None:
         '''set default value'''
         row = self.info_defs[id]
         if isinstance(row, dict):
             keys = row['name']
-            self.update_db(keys, False, value)
+            self.update_db(keys, False, value, filtered=False)
 
     def reg_clr_at_midnight(self, prfx: str,
                             check_dependencies: bool = True) -> None:
@@ -1130,18 +1262,10 @@ class Infos:
 
     def get_db_value(self, id: Register, not_found_result: any = None):
         '''get database value'''
-        if id not in self.info_defs:
+        slot = self.__reg_slots.get(id)
+        if slot is None:
             return not_found_result
-        row = self.info_defs[id]
-        if isinstance(row, dict):
-            keys = row['name']
-            elm = self.db
-            for key in keys:
-                if key not in elm:
-                    return not_found_result
-                elm = elm[key]
-            return elm
-        return not_found_result
+        return self.store.get(slot, not_found_result)
 
     def ignore_this_device(self, dep: dict) -> bool:
         '''Checks the equation in the dep(endency) dict
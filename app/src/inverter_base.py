@@ -2,18 +2,19 @@ import weakref
 import asyncio
 import logging
 import traceback
-import json
 import gc
 import socket
 from aiomqtt import MqttCodeError
 from asyncio import StreamReader, StreamWriter
 from ipaddress import ip_address
+from functools import partial
 
 from inverter_ifc import InverterIfc
 from proxy import Proxy
 from async_stream import StreamPtr
 from async_stream import AsyncStreamClient
 from async_stream import AsyncStreamServer
+import async_protocol
 from cnf.config import Config
 from infos import Infos
 
@@ -38,6 +39,8 @@ class InverterBase(InverterIfc, Proxy):
             self.prot_class = prot_class
             self.use_emulation = False
         self.__ha_restarts = -1
+        self.__ha_published = {}
+        '''last published discovery payload by topic'''
         self.remote = StreamPtr(None)
         self.background_tasks = set()
         ifc = AsyncStreamServer(reader, writer,
@@ -106,7 +109,10 @@ class InverterBase(InverterIfc, Proxy):
 
         try:
             logging.info(f'[{stream.node_id}] Connect to {addr}')
-            connect = asyncio.open_connection(host, port)
+            if async_protocol.use_protocol_engine():
+                connect = async_protocol.open_connection(host, port)
+            else:
+                connect = asyncio.open_connection(host, port)
             reader, writer = await connect
             r_addr = writer.get_extra_info('peername')
             if r_addr is not None:
@@ -169,8 +175,9 @@ class InverterBase(InverterIfc, Proxy):
                         stream.new_data['collector'])
                     or self.mqtt.ha_restarts != self.__ha_restarts):
                 logging.info("Registering proxy entities with Home Assistant")
-                await self._register_proxy_stat_home_assistant()
-                await self.__register_home_assistant(stream)
+                force = self.mqtt.ha_restarts != self.__ha_restarts
+                await self._register_proxy_stat_home_assistant(force)
+                await self.__register_home_assistant(stream, force)
                 self.__ha_restarts = self.mqtt.ha_restarts
 
             for key in stream.new_data:
@@ -187,20 +194,30 @@ class InverterBase(InverterIfc, Proxy):
     async def __async_publ_mqtt_packet(self, stream, key):
         db = stream.db.db
         if key in db and stream.new_data[key]:
-            data_json = json.dumps(db[key])
+            data_json = db.group_json(key)
             node_id = stream.node_id
             logger_mqtt.debug(f'{key}: {data_json}')
             await self.mqtt.publish(f'{self.entity_prfx}{node_id}{key}', data_json)  # noqa: E501
             stream.new_data[key] = False
 
-    async def __register_home_assistant(self, stream) -> None:
-        '''register all our topics at home assistant'''
+    async def __register_home_assistant(self, stream, force: bool) -> None:
+        '''register all our topics at home assistant, unchanged topics are
+        only published again, if force is set'''
+        published = self.__ha_published
+        if force:
+            published.clear()
         for data_json, component, node_id, id in stream.db.ha_confs(
                 self.entity_prfx, stream.node_id, stream.unique_id,
                 stream.sug_area):
+            topic = f"{self.discovery_prfx}{component}/{node_id}{id}/config"
+            if published.get(topic) == data_json:
+                continue
             logger_mqtt.debug(f"MQTT Register: cmp:'{component}'"
                               f" node_id:'{node_id}' {data_json}")
-            await self.mqtt.publish(f"{self.discovery_prfx}{component}"
-                                    f"/{node_id}{id}/config", data_json)
+            # mark the entity only after it was published, the publish
+            # queue may drop it
+            await self.mqtt.publish(
+                topic, data_json,
+                on_sent=partial(published.__setitem__, topic, data_json))
 
         stream.db.reg_clr_at_midnight(f'{self.entity_prfx}{stream.node_id}')
@@ -0,0 +1,80 @@
+'''JSON encoding of the MQTT payloads
+
+The payload of a MQTT topic is the JSON object of a group dict, like
+{"Voltage": 230.1, "pv1": {"Voltage": 33.5, ...}, ...}. Most members of
+a group don't change between two publishes, so a JsonCache keeps the
+encoded members of the last payload per key and encodes only the members
+with a changed value again. The payload is identical to the output of
+json.dumps().
+
+If the optional package 'orjson' is installed, it is used to encode the
+scalar member values, which it encodes like json.dumps(). Dicts, lists,
+strings with non-printable or non-ASCII characters and floats which need
+an exponent or aren't finite are encoded by the json module of the
+standard library, since orjson encodes them differently.
+
+functions:
+    dumps():      returns the JSON string of an object
+'''
+import json
+
+try:  # pragma: no cover
+    import orjson
+    BACKEND = 'orjson'
+except ImportError:
+    orjson = None
+    BACKEND = 'json'
+
+
+def _dumps_orjson(obj) -> str:
+    '''JSON string of obj, scalar values are encoded by orjson'''
+    typ = type(obj)
+    if typ is str:
+        if obj.isascii() and obj.isprintable():
+            return orjson.dumps(obj).decode()
+    elif typ is int:
+        if -2**63 <= obj < 2**64:
+            return orjson.dumps(obj).decode()
+    elif typ is float:
+        # json.dumps() uses repr(), which needs an exponent out of this
+        # range
+        if obj == 0 or 1e-4 <= abs(obj) < 1e16:
+            res = orjson.dumps(obj).decode()
+            if 'e' not in res:
+                return res
+    elif obj is None or typ is bool:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+dumps = _dumps_orjson if orjson else json.dumps
+
+
+class JsonCache:
+    '''Encoded members of the last payload of every key
+
+    The values of the encoded dicts are compared by type and value with the
+    cached ones, so a nested dict must not be changed in place after it was
+    encoded. Build a new dict instead, like ValueStore.group_dict() does.'''
+    __slots__ = ('members',)
+
+    def __init__(self):
+        self.members = {}
+        '''{name: (value, encoded member)} of the last payload by key'''
+
+    def encode(self, key, data: dict) -> str:
+        '''Returns the JSON string of data, the cached members of the last
+        payload of key are reused, if their value is unchanged'''
+        last = self.members.get(key, {})
+        members = {}
+        for name, value in data.items():
+            mem = last.get(name)
+            if mem is None or type(mem[0]) is not type(value) or \
+                    mem[0] != value:
+                mem = (value, f'{json.dumps(name)}: {dumps(value)}')
+            members[name] = mem
+        self.members[key] = members
+        return '{' + ', '.join(mem[1] for mem in members.values()) + '}'
+
+    def clear(self) -> None:
+        self.members.clear()
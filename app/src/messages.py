@@ -8,6 +8,7 @@ from protocol_ifc import ProtocolIfc
 from infos import Infos, Register
 from modbus import Modbus
 from my_timer import Timer
+from publisher import Publisher
 
 logger = logging.getLogger('msg')
 
@@ -89,6 +90,11 @@ class Message(ProtocolIfc):
     '''start delay for Modbus polling in server mode'''
     MB_REGULAR_TIMEOUT = 60
     '''regular Modbus polling time in server mode'''
+    MB_SLOW_MAX_AGE = 4
+    '''lifetime of an unsent slow polling read in polling intervals'''
+    ACTIVITY_REGS = (Register.OUTPUT_POWER, Register.BATT_CUR)
+    '''registers for the activity detection of the adaptive polling, the
+    first one with a value is used'''
 
     def __init__(self, node_id, ifc: "AsyncIfc", server_side: bool,
                  send_modbus_cb: Callable[[bytes, int, str], None],
@@ -123,6 +129,13 @@ class Message(ProtocolIfc):
         self.mb_bytes = 0
         self.mb_inv_no = 1
         self.mb_scan = False
+        self.mb_max_len = Modbus.MAX_READ_LEN
+        '''max number of registers of a merged polling request'''
+        self.mb_max_gap = 0
+        '''max gap of unused registers in a merged polling request'''
+        self.mb_interval = None
+        '''limits of the adaptive polling interval, None: fixed interval'''
+        self.mb_last_activity = None
 
     @property
     def node_id(self):
@@ -147,6 +160,9 @@ class Message(ProtocolIfc):
         self.node_id = inv['node_id']
         self.sug_area = inv['suggested_area']
         self.modbus_polling = inv['modbus_polling']
+        self.mb_max_len = inv.get('modbus_max_len', Modbus.MAX_READ_LEN)
+        self.mb_max_gap = inv.get('modbus_max_gap', 0)
+        self.mb_interval = inv.get('modbus_interval')
         if 'modbus_scanning' in inv:
             scan = inv['modbus_scanning']
             self.mb_scan = True
@@ -160,6 +176,9 @@ class Message(ProtocolIfc):
                 self.mb_start_reg &= 0xffff
         if self.mb:
             self.mb.set_node_id(self.node_id)
+            self.mb.cache_age = inv.get('modbus_cache_age', 0)
+            if 'modbus_max_retries' in inv:
+                self.mb.max_retries = inv['modbus_max_retries']
 
     def _set_mqtt_timestamp(self, key, ts: float | None):
         if key not in self.new_data or \
@@ -186,16 +205,100 @@ class Message(ProtocolIfc):
             to = self.MAX_DEF_IDLE_TIME
         return to
 
-    def _send_modbus_cmd(self, dev_id, func, addr, val, log_lvl) -> None:
+    def _adapt_polling(self) -> None:
+        '''Adapt the MODBUS polling interval to the activity of the device,
+        called once per polling tick with the values of the last polling
+        cycle, so a cycle with several MODBUS responses counts only once.
+
+        The interval drops to the configured minimum, if the power (or the
+        battery current) has changed by more than the configured fraction
+        since the last response. It doubles up to the maximum while the
+        values are flat, and it is set to the maximum while the inverter
+        is off-line or off-grid or doesn't produce.'''
+        cnf = self.mb_interval
+        if not cnf or self.mb_scan:
+            return
+        status = self.db.get_db_value(Register.INVERTER_STATUS)
+        activity = next((val for reg in self.ACTIVITY_REGS
+                         if (val := self.db.get_db_value(reg)) is not None),
+                        None)
+        last, self.mb_last_activity = self.mb_last_activity, activity
+        if (status is not None and status != 1) or not activity:
+            interval = cnf['max']
+        elif last is None or \
+                abs(activity - last) > cnf['change'] * max(abs(last), 1):
+            interval = cnf['min']
+        else:
+            interval = min(self.mb_timeout * 2, cnf['max'])
+        interval = max(interval, cnf['min'])
+        if interval == self.mb_timeout:
+            return
+        logger.debug(f'[{self.node_id}] polling interval: {interval}s')
+        self.mb_timeout = interval
+        self.db.set_db_def_value(Register.POLLING_INTERVAL, interval)
+        self.new_data['controller'] = True
+
+    def _send_modbus_cmd(self, dev_id, func, addr, val, log_lvl,
+                         prio=Modbus.PRIO_CMD) -> None:
         if self.state != State.up:
             logger.log(log_lvl, f'[{self.node_id}] ignore MODBUS cmd,'
                        ' as the state is not UP')
             return
-        self.mb.build_msg(dev_id, func, addr, val, log_lvl)
+        # a polling request, which isn't sent until the next polling tick,
+        # is dropped by the MODBUS queue. A slow poll isn't repeated by the
+        # next tick, so it lives longer and overtakes the regular polls
+        # after the half of its lifetime
+        max_age = None
+        if prio == Modbus.PRIO_SLOW:
+            max_age = self.mb_timeout * self.MB_SLOW_MAX_AGE
+        elif prio != Modbus.PRIO_CMD:
+            max_age = self.mb_timeout
+        self.mb.build_msg(dev_id, func, addr, val, log_lvl, prio, max_age)
+
+    def _send_modbus_reads(self, regs: list[dict[str, int]], log_lvl,
+                           slow_regs: list[dict[str, int]] = ()) -> None:
+        '''send read requests for the register ranges regs and slow_regs,
+        adjacent ranges are merged into one request. Requests with
+        registers of regs are sent with the regular polling priority'''
+        for reg in Modbus.plan_reads(regs + list(slow_regs),
+                                     self.mb_max_len, self.mb_max_gap):
+            addr, end = reg['addr'], reg['addr'] + reg['len']
+            prio = Modbus.PRIO_SLOW
+            if any(r['addr'] < end and addr < r['addr'] + r['len']
+                   for r in regs):
+                prio = Modbus.PRIO_POLL
+            self._send_modbus_cmd(Modbus.INV_ADDR, Modbus.READ_REGS,
+                                  addr, reg['len'], log_lvl, prio)
 
     def send_modbus_cmd(self, func, addr, val, log_lvl) -> None:
+        if func in (Modbus.READ_REGS, Modbus.READ_INPUTS) and \
+                self.state == State.up and \
+                self.__answer_from_cache(func, addr, val, log_lvl):
+            return
         self._send_modbus_cmd(Modbus.INV_ADDR, func, addr, val, log_lvl)
 
+    def _publish_flushed(self, groups: list[str]) -> None:
+        '''Publish the groups with changes, which were held back by the
+        minimum publish interval'''
+        for key in groups:
+            self.new_data[key] = True
+        if self.ifc:
+            Publisher.notify(self.ifc)
+
+    def __answer_from_cache(self, func, addr, cnt, log_lvl) -> bool:
+        '''Answer a read command with fresh registers of the MODBUS cache.
+        The registers are only logged, the db and the published values
+        are already up to date. Returns False, if the registers must be
+        read from the inverter'''
+        res = self.mb.read_cache(func, addr, cnt)
+        if res is None:
+            return False
+        regs = ' '.join(f'{val:04x}' for val in res)
+        logger.log(log_lvl, f'[{self.node_id}] MODBUS read (FCode: {func}'
+                   f' Reg: 0x{addr:04x}, {cnt}) answered from the cache:'
+                   f' {regs}')
+        return True
+
     def _send_modbus_scan(self):
         self.mb_start_reg += self.mb_step
         if self.mb_start_reg > 0xffff:
@@ -209,7 +312,7 @@ class Message(ProtocolIfc):
                          f" reg:{self.mb_start_reg:04x}")
         self._send_modbus_cmd(self.mb_inv_no, Modbus.READ_REGS,
                               self.mb_start_reg, self.mb_bytes,
-                              logging.INFO)
+                              logging.INFO, Modbus.PRIO_SCAN)
 
     def _dump_modbus_scan(self, data, hdr_len, modbus_msg_len):
         expected_len = 5 + self.mb.last_len * 2
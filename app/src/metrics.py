@@ -0,0 +1,302 @@
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Iterable
+
+from infos import Infos
+from value_store import ValueStore
+from publisher import Publisher
+
+
+class Histogram():
+    '''Histogram with fixed buckets, like a Prometheus histogram
+
+    Observing a value costs a binary search over the bucket bounds and two
+    additions, so it can be used in the hot path of every connection.
+    The bounds are the upper limits of the buckets in seconds, the last
+    bucket (+Inf) is implicit.
+    '''
+    __slots__ = ('bounds', 'counts', 'sum', 'max')
+
+    BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+              0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, bounds: tuple = BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, val: float) -> None:
+        self.counts[bisect_left(self.bounds, val)] += 1
+        self.sum += val
+        if val > self.max:
+            self.max = val
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float, since: list[int] = None) -> float:
+        '''estimate the q-quantile (0..1) by linear interpolation inside the
+        matching bucket, like histogram_quantile() of Prometheus
+
+        since ==> bucket counts of a previous snapshot(), to get the
+                  quantile of the values observed after the snapshot
+        '''
+        counts = self.counts
+        if since:
+            counts = [act - old for act, old in zip(counts, since)]
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        lower = 0.0
+        cum = 0
+        for idx, cnt in enumerate(counts):
+            if cum + cnt >= rank and cnt:
+                if idx == len(self.bounds):
+                    return self.max    # the +Inf bucket has no upper bound
+                upper = self.bounds[idx]
+                return lower + (upper - lower) * (rank - cum) / cnt
+            cum += cnt
+            if idx < len(self.bounds):
+                lower = self.bounds[idx]
+        return self.max   # pragma: no cover
+
+    def snapshot(self) -> list[int]:
+        '''returns a copy of the bucket counts'''
+        return list(self.counts)
+
+    def prometheus(self, name: str, labels: str = '') -> list[str]:
+        '''returns the bucket, sum and count lines in Prometheus text
+        format. labels is a preformatted label string like 'node="x"'
+        '''
+        sep = ',' if labels else ''
+        lines = []
+        cum = 0
+        for bound, cnt in zip(self.bounds, self.counts):
+            cum += cnt
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cum}')
+        cum += self.counts[-1]
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {cum}')
+        lbl = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{lbl} {self.sum:.6f}')
+        lines.append(f'{name}_count{lbl} {cum}')
+        return lines
+
+
+class Metrics():
+    '''class Metrics collects the latency metrics of the proxy
+
+    proc_time:  processing time of received frames over all connections.
+                Every AsyncStream has its own histogram for its connection
+                in addition
+    loop_lag:   delay of the event loop, measured by a background task
+                which sleeps for LAG_INTERVAL and checks how late it
+                wakes up
+    mqtt_latency: time from the enqueuing of a MQTT message until it is
+                published
+    modbus_rtt: round-trip times of the MODBUS requests over all
+                inverters. Every Modbus instance has its own histogram in
+                addition
+    mqtt_queue: publish queue of the MQTT client, for the queue depth
+    mqtt_spool: offline spool of the MQTT client, if enabled
+
+    Every STAT_INTERVAL the P99 values and the maximum MQTT queue depth
+    of the last interval are written to the proxy statistics (Infos.stat),
+    so they are published as proxy entities with the next MQTT update.
+
+    class methods:
+        start():      start the event loop lag probe
+        stop():       stop the probe
+        update_stat(): copy the P99 values into Infos.stat
+        prometheus(): render all metrics in Prometheus text format
+    '''
+    LAG_INTERVAL = 0.5
+    STAT_INTERVAL = 60
+    PREFIX = 'tsun_proxy'
+
+    proc_time = Histogram()
+    loop_lag = Histogram()
+    mqtt_latency = Histogram()
+    modbus_rtt = Histogram()
+    mqtt_queue = None
+    mqtt_spool = None
+    lag_task = None
+    __proc_snap = None
+    __lag_snap = None
+    __mqtt_snap = None
+    __rtt_snap = None
+
+    @classmethod
+    def start(cls) -> None:
+        if cls.lag_task:
+            return
+        cls.lag_task = asyncio.create_task(cls._lag_probe())
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls.lag_task:
+            cls.lag_task.cancel()
+            cls.lag_task = None
+
+    @classmethod
+    async def _lag_probe(cls) -> None:
+        loop = asyncio.get_running_loop()
+        interval = cls.LAG_INTERVAL
+        next_stat = loop.time() + cls.STAT_INTERVAL
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            now = loop.time()
+            cls.loop_lag.observe(max(now - start - interval, 0.0))
+            if now >= next_stat:
+                next_stat = now + cls.STAT_INTERVAL
+                cls.update_stat()
+
+    @classmethod
+    def update_stat(cls) -> None:
+        '''store the P99 values in ms of the last interval in the proxy
+        statistic and flag them for publishing, if they have changed'''
+        proc = round(1000 * cls.proc_time.quantile(0.99, cls.__proc_snap))
+        lag = round(1000 * cls.loop_lag.quantile(0.99, cls.__lag_snap))
+        mqtt = round(1000 * cls.mqtt_latency.quantile(0.99, cls.__mqtt_snap))
+        rtt = round(1000 * cls.modbus_rtt.quantile(0.99, cls.__rtt_snap))
+        depth = cls.mqtt_queue.take_high_water() \
+            if cls.mqtt_queue is not None else 0
+        cls.__proc_snap = cls.proc_time.snapshot()
+        cls.__lag_snap = cls.loop_lag.snapshot()
+        cls.__mqtt_snap = cls.mqtt_latency.snapshot()
+        cls.__rtt_snap = cls.modbus_rtt.snapshot()
+
+        db_dict = Infos.stat['proxy']
+        if db_dict.get('Proc_Time_P99') != proc or \
+           db_dict.get('Loop_Lag_P99') != lag or \
+           db_dict.get('MQTT_Latency_P99') != mqtt or \
+           db_dict.get('MQTT_Queue_Depth') != depth or \
+           db_dict.get('Modbus_RTT_P99') != rtt:
+            db_dict['Proc_Time_P99'] = proc
+            db_dict['Loop_Lag_P99'] = lag
+            db_dict['MQTT_Latency_P99'] = mqtt
+            db_dict['MQTT_Queue_Depth'] = depth
+            db_dict['Modbus_RTT_P99'] = rtt
+            Infos.new_stat_data['proxy'] = True
+            logging.debug(f'Metrics: proc P99:{proc}ms lag P99:{lag}ms'
+                          f' mqtt P99:{mqtt}ms queue:{depth}'
+                          f' modbus P99:{rtt}ms')
+
+    @staticmethod
+    def __label(val) -> str:
+        return str(val).replace('\\', '\\\\').replace('"', '\\"')
+
+    @classmethod
+    def prometheus(cls, conns: Iterable[tuple[str, object]] = (),
+                   mbs: Iterable[tuple[str, object]] = ()) -> str:
+        '''render all metrics in the Prometheus text format
+
+        conns ==> (side, AsyncStream) tuples of the open connections,
+                  side is 'local' for inverter and 'remote' for cloud
+                  connections
+        mbs   ==> (node_id, Modbus) tuples of the inverter connections
+        '''
+        name = f'{cls.PREFIX}_proc_seconds'
+        lines = [f'# HELP {name} Processing time of received frames',
+                 f'# TYPE {name} histogram']
+        lines += cls.proc_time.prometheus(name)
+
+        name = f'{cls.PREFIX}_loop_lag_seconds'
+        lines += [f'# HELP {name} Delay of the asyncio event loop',
+                  f'# TYPE {name} histogram']
+        lines += cls.loop_lag.prometheus(name)
+
+        name = f'{cls.PREFIX}_conn_proc_seconds'
+        lines += [f'# HELP {name} Processing time per connection',
+                  f'# TYPE {name} histogram']
+        for side, ifc in conns:
+            labels = (f'node="{cls.__label(ifc.node_id)}",'
+                      f'conn="{ifc.conn_no}",side="{side}"')
+            lines += ifc.proc_hist.prometheus(name, labels)
+
+        mbs = list(mbs)
+        name = f'{cls.PREFIX}_modbus_queue_total'
+        lines += [f'# HELP {name} MODBUS requests per priority class',
+                  f'# TYPE {name} counter']
+        for node_id, mb in mbs:
+            for prio, cnt in mb.que.counter.items():
+                labels = f'node="{cls.__label(node_id)}",prio="{prio}"'
+                for key, val in cnt.items():
+                    lines.append(f'{name}{{{labels},result="{key}"}} {val}')
+
+        name = f'{cls.PREFIX}_modbus_queue_wait_seconds'
+        lines += [f'# HELP {name} Queue wait time of the sent MODBUS'
+                  ' requests per priority class',
+                  f'# TYPE {name} histogram']
+        for node_id, mb in mbs:
+            for prio, hist in mb.que.wait.items():
+                labels = f'node="{cls.__label(node_id)}",prio="{prio}"'
+                lines += hist.prometheus(name, labels)
+
+        name = f'{cls.PREFIX}_modbus_rtt_seconds'
+        lines += [f'# HELP {name} Round-trip time of the MODBUS requests',
+                  f'# TYPE {name} histogram']
+        for node_id, mb in mbs:
+            lines += mb.rtt_hist.prometheus(
+                name, f'node="{cls.__label(node_id)}"')
+
+        name = f'{cls.PREFIX}_modbus_cache_total'
+        lines += [f'# HELP {name} MODBUS read commands, which were answered'
+                  ' from the register cache (hit) or by the inverter (miss)',
+                  f'# TYPE {name} counter']
+        for node_id, mb in mbs:
+            for key, val in mb.counter['cache'].items():
+                lines.append(f'{name}{{node="{cls.__label(node_id)}",'
+                             f'result="{key}"}} {val}')
+
+        name = f'{cls.PREFIX}_mqtt_publish_seconds'
+        lines += [f'# HELP {name} Time from enqueuing until publishing of'
+                  ' MQTT messages',
+                  f'# TYPE {name} histogram']
+        lines += cls.mqtt_latency.prometheus(name)
+
+        if cls.mqtt_queue is not None:
+            name = f'{cls.PREFIX}_mqtt_queue_depth'
+            lines += [f'# HELP {name} Messages in the MQTT publish queue',
+                      f'# TYPE {name} gauge',
+                      f'{name} {len(cls.mqtt_queue)}']
+            name = f'{cls.PREFIX}_mqtt_queue_total'
+            lines += [f'# HELP {name} Messages of the MQTT publish queue',
+                      f'# TYPE {name} counter']
+            for key, val in cls.mqtt_queue.counter.items():
+                lines.append(f'{name}{{result="{key}"}} {val}')
+
+        if cls.mqtt_spool is not None:
+            name = f'{cls.PREFIX}_mqtt_spool_depth'
+            lines += [f'# HELP {name} Messages in the MQTT offline spool',
+                      f'# TYPE {name} gauge',
+                      f'{name} {len(cls.mqtt_spool)}']
+            name = f'{cls.PREFIX}_mqtt_spool_total'
+            lines += [f'# HELP {name} Messages of the MQTT offline spool',
+                      f'# TYPE {name} counter']
+            for key, val in cls.mqtt_spool.counter.items():
+                lines.append(f'{name}{{result="{key}"}} {val}')
+
+        name = f'{cls.PREFIX}_publisher_total'
+        lines += [f'# HELP {name} Notifications of the MQTT publisher task',
+                  f'# TYPE {name} counter']
+        for key, val in Publisher.counter.items():
+            lines.append(f'{name}{{result="{key}"}} {val}')
+
+        name = f'{cls.PREFIX}_value_updates_total'
+        lines += [f'# HELP {name} Value updates, which were published or'
+                  ' suppressed by a publish filter',
+                  f'# TYPE {name} counter']
+        for key, val in ValueStore.counter.items():
+            lines.append(f'{name}{{result="{key}"}} {val}')
+
+        name = f'{cls.PREFIX}_stat'
+        lines += [f'# HELP {name} Proxy statistic counters',
+                  f'# TYPE {name} gauge']
+        for key, val in Infos.stat.get('proxy', {}).items():
+            lines.append(f'{name}{{name="{key}"}} {val}')
+        return '\n'.join(lines) + '\n'
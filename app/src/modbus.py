@@ -8,21 +8,35 @@ A Modbus PDU consists of: 'Function-Code' + 'Data'
 A Modbus RTU message consists of: 'Addr' + 'Modbus-PDU' + 'CRC-16'
 The inverter is a MODBUS server and the proxy the MODBUS client.
 
-The 16-bit CRC is known as CRC-16-ANSI(reverse)
-see: https://en.wikipedia.org/wiki/Computation_of_cyclic_redundancy_checks
+The 16-bit CRC is known as CRC-16-ANSI(reverse), see crc16.py
+
+The response timeout adapts to the measured round-trip times, like the
+retransmission timeout of TCP (RFC 6298): a smoothed RTT and its variation
+give the timeout srtt + 4 * rttvar, which is limited by MIN_TIMEOUT and the
+configured timeout. Every retransmission doubles the timeout, and the RTT
+of a retransmitted request isn't measured, since the response can't be
+assigned to one of the transmissions (Karn's algorithm).
+
+With a cache_age, the registers of the received read responses are kept
+in a register cache, so a read request can be answered by read_cache()
+without a request to the inverter, as long as the registers are fresh.
+A cached answer doesn't update the db, since the values were stored with
+the response of the inverter.
 '''
+import time
 import struct
 import logging
 import asyncio
 from typing import Generator, Callable
 
 from infos import Register, Fmt
+from crc16 import calc_crc, verify_crc
+from modbus_queue import ModbusQueue
+from value_store import PUBLISH
+from metrics import Histogram, Metrics
 
 logger = logging.getLogger('data')
 
-CRC_POLY = 0xA001  # (LSBF/reverse)
-CRC_INIT = 0xFFFF
-
 
 class Modbus():
     '''Simple MODBUS implementation with TX queue and retransmit timer'''
@@ -34,8 +48,23 @@ class Modbus():
     '''MODBUS function code: Read Input Register'''
     WRITE_SINGLE_REG = 6
     '''Modbus function code: Write Single Register'''
+    MAX_READ_LEN = 125
+    '''max number of registers of a read request'''
+    MAX_PLANS = 64
+    '''max number of cached decode plans, the oldest plan is dropped'''
+    PRIO_CMD = 0
+    '''priority class of interactive commands'''
+    PRIO_POLL = 1
+    '''priority class of regular polling reads'''
+    PRIO_SLOW = 2
+    '''priority class of slow polling reads'''
+    PRIO_SCAN = 3
+    '''priority class of register scanning reads'''
+    MAX_RETRIES = 1
+    '''default of the max retransmissions of a MODBUS request'''
+    MIN_TIMEOUT = 0.5
+    '''lower limit of the adaptive response timeout in seconds'''
 
-    __crc_tab = []
     mb_reg_mapping = {
         # sensor_list: 0x3026
         0x0000: {'reg': Register.SERIAL_NUMBER,        'fmt': '!16s'},               # noqa: E501
@@ -201,28 +230,41 @@ class Modbus():
         0x3029: {'reg': Register.PV4_TOTAL_GENERATION, 'fmt': '!L', 'ratio': 0.01},  # noqa: E501
         # 0x302a
     }
+    __plans = {}
+    '''compiled decode plans of the mb_reg_mapping, by (first_reg, elmlen)'''
 
     def __init__(self, snd_handler: Callable[[bytes, int, str], None],
                  timeout: int = 1):
-        if not len(self.__crc_tab):
-            self.__build_crc_tab(CRC_POLY)
-        self.que = asyncio.Queue(100)
+        self.que = ModbusQueue(100)
         self.snd_handler = snd_handler
         '''Send handler to transmit a MODBUS RTU request'''
         self.rsp_handler = None
         '''Response handler to forward the response'''
         self.timeout = timeout
-        '''MODBUS response timeout in seconds'''
-        self.max_retries = 1
-        '''Max retransmit for MODBUS requests'''
+        '''max MODBUS response timeout in seconds, used until the first
+        round-trip time is measured'''
+        self.srtt = None
+        '''smoothed round-trip time in seconds'''
+        self.rttvar = 0.0
+        '''variation of the round-trip time in seconds'''
+        self.rtt_hist = Histogram()
+        '''measured round-trip times'''
+        self.send_ts = 0.0
+        self.cache_age = 0
+        '''max age of the register cache in seconds, 0: disabled'''
+        self.reg_cache = {}
+        '''(receive time, 2 data bytes) by (function code, register)'''
         self.retry_cnt = 0
         self.last_req = b''
         self.counter = {}
         '''Dictenary with statistic counter'''
         self.counter['timeouts'] = 0
         self.counter['retries'] = {}
-        for i in range(0, self.max_retries+1):
-            self.counter['retries'][f'{i}'] = 0
+        self.max_retries = self.MAX_RETRIES
+        self.counter['rtt'] = {'srtt': 0, 'rto': 0, 'p50': 0, 'p90': 0,
+                               'p99': 0}
+        '''round-trip time statistic in ms'''
+        self.counter['cache'] = {'hit': 0, 'miss': 0}
         self.last_log_lvl = logging.DEBUG
         self.last_addr = 0
         self.last_fcode = 0
@@ -240,14 +282,14 @@ class Modbus():
         self.__stop_timer()
         self.rsp_handler = None
         self.snd_handler = None
-        while not self.que.empty():
-            self.que.get_nowait()
+        self.que.clear()
 
     def set_node_id(self, node_id: str):
         self.node_id = node_id
 
     def build_msg(self, addr: int, func: int, reg: int, val: int,
-                  log_lvl=logging.DEBUG) -> None:
+                  log_lvl=logging.DEBUG, prio: int = PRIO_CMD,
+                  max_age: float | None = None) -> None:
         """Build MODBUS RTU request frame and add it to the tx queue
 
         Keyword arguments:
@@ -255,15 +297,55 @@ class Modbus():
             func: MODBUS function code
             reg:  16-bit register number
             val:  16 bit value
+            prio: priority class, PRIO_CMD .. PRIO_SCAN
+            max_age: seconds until an unsent request is dropped, or None
         """
         msg = struct.pack('>BBHH', addr, func, reg, val)
         msg += struct.pack('<H', self.__calc_crc(msg))
-        self.que.put_nowait({'req': msg,
-                             'rsp_hdl': None,
-                             'log_lvl': log_lvl})
-        if self.que.qsize() == 1:
+        if func == self.WRITE_SINGLE_REG:
+            self.reg_cache.pop((self.READ_REGS, reg), None)
+        deadline = time.monotonic() + max_age if max_age is not None \
+            else None
+        if self.que.put_nowait({'req': msg,
+                                'rsp_hdl': None,
+                                'log_lvl': log_lvl,
+                                'prio': prio,
+                                'deadline': deadline}):
             self.__send_next_from_que()
 
+    @staticmethod
+    def plan_reads(regs: list[dict[str, int]],
+                   max_len: int = MAX_READ_LEN,
+                   max_gap: int = 0) -> list[dict[str, int]]:
+        """Merge register ranges into the fewest read requests
+
+        Overlapping or adjacent ranges, and ranges with a gap of up to
+        max_gap registers, are merged, as long as the merged range isn't
+        longer than max_len registers. A longer range of regs is kept as it
+        is. The response of a merged range is decoded by recv_resp() like
+        the responses of the single ranges.
+
+        Keyword arguments:
+            regs: list of ranges {'addr': first register, 'len': count}
+
+        Returns the merged ranges in the order of their first range in regs
+        """
+        blocks = []     # [first idx, addr, end]
+        for idx, reg in sorted(enumerate(regs), key=lambda r: r[1]['addr']):
+            addr = reg['addr']
+            end = addr + reg['len']
+            if blocks:
+                block = blocks[-1]
+                if addr <= block[2] + max_gap and \
+                        max(end, block[2]) - block[1] <= max_len:
+                    block[0] = min(block[0], idx)
+                    block[2] = max(end, block[2])
+                    continue
+            blocks.append([idx, addr, end])
+        blocks.sort()
+        return [{'addr': addr, 'len': end - addr}
+                for _, addr, end in blocks]
+
     def recv_req(self, buf: bytes,
                  rsp_handler: Callable[[None], None] = None) -> bool:
         """Add the received Modbus RTU request to the tx queue
@@ -281,10 +363,15 @@ class Modbus():
             self.err = 1
             logger.error('Modbus recv: CRC error')
             return False
-        self.que.put_nowait({'req': buf,
-                             'rsp_hdl': rsp_handler,
-                             'log_lvl': logging.INFO})
-        if self.que.qsize() == 1:
+        if buf[1] == self.WRITE_SINGLE_REG:
+            reg = struct.unpack_from('>H', buf, 2)[0]
+            self.reg_cache.pop((self.READ_REGS, reg), None)
+        # copy the pdu, cause buf may be a view of the receive buffer
+        if self.que.put_nowait({'req': bytes(buf),
+                                'rsp_hdl': rsp_handler,
+                                'log_lvl': logging.INFO,
+                                'prio': self.PRIO_CMD,
+                                'deadline': None}):
             self.__send_next_from_que()
 
         return True
@@ -312,11 +399,15 @@ class Modbus():
         self.err = 0
         if self.__resp_error_check(buf, data_available):
             return
+        if self.retry_cnt == 0:
+            self.__measure_rtt(self.loop.time() - self.send_ts)
 
         if data_available:
             elmlen = buf[2] >> 1
             first_reg = self.last_reg  # save last_reg before sending next pdu
             self.__stop_timer()          # stop timer and send next pdu
+            if self.cache_age:
+                self.__cache_regs(fcode, first_reg, buf, elmlen)
             yield from self.__process_data(info_db, buf, first_reg, elmlen)
         else:
             self.__stop_timer()
@@ -355,33 +446,126 @@ class Modbus():
 
         return False
 
+    def __cache_regs(self, fcode: int, first_reg: int, buf: bytes,
+                     elmlen: int) -> None:
+        '''Store the registers of a read response in the register cache'''
+        ts = self.loop.time()
+        data = bytes(buf[3:3 + 2 * elmlen])
+        cache = self.reg_cache
+        for i in range(elmlen):
+            cache[(fcode, first_reg + i)] = (ts, data[2*i:2*i+2])
+
+    def read_cache(self, func: int, reg: int, cnt: int) -> list[int] | None:
+        """Answer a read request from the register cache
+
+        Keyword arguments:
+            func: MODBUS function code, READ_REGS or READ_INPUTS
+            reg:  first register
+            cnt:  number of registers
+
+        Returns None, if cnt isn't positive or a register isn't cached or
+        is older than cache_age. Otherwise the list of the raw register
+        values. The db isn't updated, since the values were already
+        stored with the response of the inverter
+        """
+        if not self.cache_age or cnt <= 0:
+            return None
+        oldest = self.loop.time() - self.cache_age
+        cache = self.reg_cache
+        data = []
+        for addr in range(reg, reg + cnt):
+            entry = cache.get((func, addr))
+            if entry is None or entry[0] < oldest:
+                self.counter['cache']['miss'] += 1
+                return None
+            data.append(entry[1])
+        self.counter['cache']['hit'] += 1
+        return list(struct.unpack(f'>{cnt}H', b''.join(data)))
+
     def __process_data(self, info_db, buf: bytes, first_reg, elmlen):
         '''Generator over received registers, updates the db'''
+        plan = self.__plans.get((first_reg, elmlen))
+        if plan is None:
+            plan = self.__compile_plan(info_db, first_reg, elmlen)
+
+        for ofs, get, group, slot, must_incr, level, unit in plan:
+            result = get(buf, ofs)
+            update = info_db.update_db_slot(slot, must_incr, result)
+            yield group, update == PUBLISH, result
+            if update:
+                info_db.value_changed(level, self.node_id, 'MODBUS', slot,
+                                      result, unit, root=True)
+
+    @classmethod
+    def __compile_plan(cls, info_db, first_reg, elmlen) -> list[tuple]:
+        '''Build the decode plan for a response with elmlen registers,
+        starting at first_reg. The plan holds an entry for every mapped
+        register with a db key: buffer offset, value getter, db group, db
+        slot, must_incr flag, log level and unit'''
+        plan = []
         for i in range(0, elmlen):
-            addr = first_reg+i
-            if addr in self.mb_reg_mapping:
-                row = self.mb_reg_mapping[addr]
-                info_id = row['reg']
-                keys, level, unit, must_incr = info_db._key_obj(info_id)
-                if keys:
-                    result = Fmt.get_value(buf, 3+2*i, row)
-                    name, update = info_db.update_db(keys, must_incr,
-                                                     result)
-                    yield keys[0], update, result
-                    if update:
-                        info_db.tracer.log(level,
-                                           f'[{self.node_id}] MODBUS: {name}'
-                                           f' : {result}{unit}')
-                        logging.log(level, f'[{self.node_id}] MODBUS: {name} :'
-                                           f' {result}{unit}')
+            row = cls.mb_reg_mapping.get(first_reg+i)
+            if row is None:
+                continue
+            keys, level, unit, must_incr = info_db._key_obj(row['reg'])
+            if keys:
+                plan.append((3+2*i, Fmt.getter(row), keys[0],
+                             info_db.key_slot(keys), must_incr, level,
+                             unit))
+        plans = cls.__plans
+        if len(plans) >= cls.MAX_PLANS:
+            # scanning or MQTT reads of arbitrary ranges must not grow the
+            # cache without limit
+            del plans[next(iter(plans))]
+        plans[(first_reg, elmlen)] = plan
+        return plan
+
+    @property
+    def max_retries(self) -> int:
+        '''Max retransmit for MODBUS requests'''
+        return self.__max_retries
+
+    @max_retries.setter
+    def max_retries(self, value: int) -> None:
+        self.__max_retries = value
+        retries = self.counter['retries']
+        for i in range(0, value+1):
+            retries.setdefault(f'{i}', 0)
 
     '''
     MODBUS response timer
     '''
+    def resp_timeout(self) -> float:
+        '''Returns the response timeout for the actual transmission in
+        seconds'''
+        if self.srtt is None:
+            return self.timeout
+        rto = max(self.srtt + 4 * self.rttvar, self.MIN_TIMEOUT)
+        return min(rto * (1 << self.retry_cnt), self.timeout)
+
+    def __measure_rtt(self, rtt: float) -> None:
+        '''Update the RTT estimation and the statistic with a new
+        measurement'''
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) / 4
+            self.srtt += (rtt - self.srtt) / 8
+        self.rtt_hist.observe(rtt)
+        Metrics.modbus_rtt.observe(rtt)
+        stat = self.counter['rtt']
+        stat['srtt'] = round(1000 * self.srtt)
+        stat['rto'] = round(1000 * self.resp_timeout())
+        for key, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            stat[key] = round(1000 * self.rtt_hist.quantile(q))
+
     def __start_timer(self) -> None:
         '''Start response timer and set `req_pend` to True'''
         self.req_pend = True
-        self.tim = self.loop.call_later(self.timeout, self.__timeout_cb)
+        self.send_ts = self.loop.time()
+        self.tim = self.loop.call_later(self.resp_timeout(),
+                                        self.__timeout_cb)
         # logging.debug(f'Modbus start timer {self}')
 
     def __stop_timer(self) -> None:
@@ -436,30 +620,12 @@ class Modbus():
     '''
     def __check_crc(self, msg: bytes) -> bool:
         '''Check CRC-16 and returns True if valid'''
-        valid = 0 == self.__calc_crc(msg)
+        valid, crc = verify_crc(msg)
         if not valid:
-            crc = self.__calc_crc(msg[:-2])
             logging.info(f'CRC error: {msg[-1]:02x}{msg[-2]:02x} != {crc:04x}'
                          f' for msg: {msg.hex()}')
         return valid
 
     def __calc_crc(self, buffer: bytes) -> int:
         '''Build CRC-16 for buffer and returns it'''
-        crc = CRC_INIT
-
-        for cur in buffer:
-            crc = (crc >> 8) ^ self.__crc_tab[(crc ^ cur) & 0xFF]
-        return crc
-
-    def __build_crc_tab(self, poly: int) -> None:
-        '''Build CRC-16 helper table, must be called exactly one time'''
-        for index in range(256):
-            data = index << 1
-            crc = 0
-            for _ in range(8, 0, -1):
-                data >>= 1
-                if (data ^ crc) & 1:
-                    crc = (crc >> 1) ^ poly
-                else:
-                    crc >>= 1
-            self.__crc_tab.append(crc)
+        return calc_crc(buffer)
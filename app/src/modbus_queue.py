@@ -0,0 +1,134 @@
+'''Transmit queue of the MODBUS requests of a connection
+
+The requests are scheduled by priority classes:
+    'cmd':  interactive commands from MQTT or forwarded from the cloud
+    'poll': regular polling reads
+    'slow': slow polling reads
+    'scan': reads of the register scanning
+
+A request of a higher class is sent before all queued requests of the
+lower classes; inside a class the requests are sent in FIFO order. To
+avoid starvation of the slow polls and scan reads by the regular polls, a
+request which has waited for AGING of its lifetime overtakes the regular
+polls. Interactive commands are always sent first.
+
+A request can have a deadline, e.g. the next polling tick for a polling
+read. A request which wasn't sent until its deadline is dropped (expired),
+since a fresh request will follow. A read request without a response
+handler, which is identical to a queued one of the same class, isn't
+queued again (deduped).
+
+If the queue is full, the oldest request of the lowest class is dropped
+to make room. If all queued requests belong to a higher class, the new
+request is dropped.
+'''
+import time
+import asyncio
+from collections import deque
+
+from metrics import Histogram
+
+
+class ModbusQueue:
+    '''Priority queue of MODBUS request items
+
+    An item is a dict with the keys 'req' (RTU request), 'rsp_hdl',
+    'log_lvl', 'prio' (index of CLASSES), 'deadline' (monotonic time or
+    None) and 'ts' (enqueue time, set by put_nowait())
+    '''
+    CLASSES = ('cmd', 'poll', 'slow', 'scan')
+    READ_FCODES = (3, 4)
+    AGING = 0.5
+    '''part of the lifetime until the deadline, after which a slow poll or
+    scan read is sent before the regular polls'''
+
+    def __init__(self, maxsize: int = 100):
+        self.ques = tuple(deque() for _ in self.CLASSES)
+        self.maxsize = maxsize
+        self.counter = {name: {'queued': 0, 'sent': 0, 'deduped': 0,
+                               'expired': 0, 'dropped': 0}
+                        for name in self.CLASSES}
+        '''statistic counter per class'''
+        self.wait = {name: Histogram() for name in self.CLASSES}
+        '''queue wait time of the sent requests per class'''
+
+    def qsize(self) -> int:
+        return sum(len(que) for que in self.ques)
+
+    def empty(self) -> bool:
+        return not any(self.ques)
+
+    def put_nowait(self, item: dict) -> bool:
+        '''Enqueue a request, returns False if it was deduped or dropped'''
+        prio = item['prio']
+        cnt = self.counter[self.CLASSES[prio]]
+        req = item['req']
+        if item['rsp_hdl'] is None and req[1] in self.READ_FCODES:
+            for queued in self.ques[prio]:
+                if queued['req'] == req:
+                    queued['deadline'] = item['deadline']
+                    cnt['deduped'] += 1
+                    return False
+        if self.qsize() >= self.maxsize and not self.__make_room(prio):
+            cnt['dropped'] += 1
+            return False
+        item['ts'] = time.monotonic()
+        self.ques[prio].append(item)
+        cnt['queued'] += 1
+        return True
+
+    def __make_room(self, prio: int) -> bool:
+        '''drop the oldest request of the lowest class, which isn't higher
+        than prio'''
+        for idx in range(len(self.ques) - 1, prio - 1, -1):
+            if self.ques[idx]:
+                self.ques[idx].popleft()
+                self.counter[self.CLASSES[idx]]['dropped'] += 1
+                return True
+        return False
+
+    def get_nowait(self) -> dict:
+        '''Returns the next request, expired requests are skipped. Raises
+        asyncio.QueueEmpty if there is no request'''
+        now = time.monotonic()
+        for prio in self.__schedule(now):
+            name, que = self.CLASSES[prio], self.ques[prio]
+            while que:
+                item = que.popleft()
+                if self.__expired(item, now):
+                    self.counter[name]['expired'] += 1
+                    continue
+                self.wait[name].observe(now - item['ts'])
+                self.counter[name]['sent'] += 1
+                return item
+        raise asyncio.QueueEmpty
+
+    def __schedule(self, now: float) -> list[int]:
+        '''returns the order of the classes: commands first, then the
+        highest lower class whose oldest request has aged, then the others
+        by priority'''
+        order = list(range(len(self.CLASSES)))
+        for prio in order[2:]:
+            que = self.ques[prio]
+            while que and self.__expired(que[0], now):
+                que.popleft()
+                self.counter[self.CLASSES[prio]]['expired'] += 1
+            if que and self.__aged(que[0], now):
+                order.remove(prio)
+                order.insert(1, prio)
+                break
+        return order
+
+    @staticmethod
+    def __expired(item: dict, now: float) -> bool:
+        deadline = item['deadline']
+        return deadline is not None and now > deadline
+
+    def __aged(self, item: dict, now: float) -> bool:
+        deadline = item['deadline']
+        return deadline is not None and \
+            now - item['ts'] >= self.AGING * (deadline - item['ts'])
+
+    def clear(self) -> None:
+        for que in self.ques:
+            que.clear()
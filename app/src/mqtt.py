@@ -3,12 +3,17 @@ import logging
 import aiomqtt
 import struct
 import inspect
+import time
+from typing import Callable
 
 from modbus import Modbus
 from messages import Message
 from cnf.config import Config
 from singleton import Singleton
 from datetime import datetime
+from metrics import Metrics
+from publish_queue import PublishQueue
+from mqtt_spool import MqttSpool
 
 
 logger_mqtt = logging.getLogger('mqtt')
@@ -18,6 +23,10 @@ class Mqtt(metaclass=Singleton):
     __client: aiomqtt.Client = None
     __cb_mqtt_is_up = None
     ctime = None
+    spool = None
+    EVENT_TOPICS = ('at_resp', 'dcu_resp')
+    '''suffixes of the topics with command responses, which the publish
+    queue doesn't coalesce'''
     published: int = 0
     received: int = 0
 
@@ -25,6 +34,21 @@ class Mqtt(metaclass=Singleton):
         logger_mqtt.debug('MQTT: __init__')
         if cb_mqtt_is_up:
             self.__cb_mqtt_is_up = cb_mqtt_is_up
+        mqtt = Config.get('mqtt')
+        self.window = mqtt.get('window', 8)
+        '''maximum number of messages in flight, the default stays below
+        the limit of 10 pending calls, above which aiomqtt logs warnings'''
+        self.queue = PublishQueue(mqtt.get('queue_size', 1000),
+                                  mqtt.get('queue_policy', 'block'),
+                                  self.EVENT_TOPICS)
+        Metrics.mqtt_queue = self.queue
+        self.spool = None
+        if mqtt.get('spool_size', 0) > 0:
+            self.spool = MqttSpool(mqtt['spool_size'],
+                                   mqtt.get('spool_file'),
+                                   mqtt.get('spool_all', []),
+                                   mqtt.get('spool_rate', 50))
+        Metrics.mqtt_spool = self.spool
         loop = asyncio.get_event_loop()
         self.task = loop.create_task(self.__loop())
         self.ha_restarts = 0
@@ -66,12 +90,93 @@ class Mqtt(metaclass=Singleton):
 
         except (asyncio.CancelledError, Exception) as e:
             logging.debug(f"Mqtt.close: exception: {e} ...")
+        if self.spool:
+            self.spool.close()
 
     async def publish(self, topic: str, payload: str | bytes | bytearray
-                      | int | float | None = None) -> None:
-        if self.__client:
+                      | int | float | None = None,
+                      on_sent: Callable[[], None] | None = None) -> None:
+        '''Publish a message to the broker
+
+        With a broker connection the message is put into the publish queue
+        and sent by the sender task. Without a connection the message is
+        stored in the offline spool, if it is enabled. Otherwise the client
+        raises a MqttError, so the caller can publish the message again
+        later.
+
+        on_sent is called, when the message was published to the broker.
+        It isn't called for a spooled message or for a message, which the
+        publish queue dropped'''
+        if self.ctime is None and self.spool is not None:
+            self.spool.put(topic, payload)
+            return
+        if not self.__client:
+            return
+        if self.ctime is None:
             await self.__client.publish(topic, payload)
             self.published += 1
+            if on_sent:
+                on_sent()
+            return
+        if self.spool:
+            self.spool.discard(topic)   # replaced by the newer message
+        await self.queue.put(topic, payload, on_sent)
+
+    async def __replay(self) -> None:
+        '''Publish the spooled messages after a new broker connection,
+        rate limited to spool.rate messages per second'''
+        spool = self.spool
+        logger_mqtt.info(f'MQTT: replay {len(spool)} spooled messages')
+        try:
+            while (msg := spool.head()) is not None:
+                key, topic, payload = msg
+                await self.__client.publish(topic, payload)
+                spool.done(key, payload)
+                self.published += 1
+                await asyncio.sleep(1 / spool.rate)
+        except aiomqtt.MqttError as error:
+            logger_mqtt.info(f'MQTT: replay aborted: {error}')
+            return
+        logger_mqtt.info('MQTT: replay finished')
+
+    async def __sender(self) -> None:
+        '''Publish the queued messages in batches, up to window messages
+        are in flight at the same time'''
+        queue = self.queue
+        while True:
+            batch = await queue.get_batch(self.window)
+            try:
+                res = await asyncio.gather(
+                    *(self.__client.publish(topic, payload)
+                      for topic, payload, _ in batch),
+                    return_exceptions=True)
+            except asyncio.CancelledError:
+                queue.requeue(batch)  # the connection is closed
+                raise
+            now = time.monotonic()
+            failed = []
+            error = None
+            for msg, err in zip(batch, res):
+                if err is None:
+                    Metrics.mqtt_latency.observe(now - msg[2])
+                    self.published += 1
+                    queue.done(msg[0])
+                elif isinstance(err, aiomqtt.MqttError):
+                    failed.append(msg)
+                    error = err
+                else:
+                    # a permanent error, e.g. an invalid topic or payload,
+                    # must not block the queue
+                    queue.counter['failed'] += 1
+                    queue.discard(msg[0])
+                    logger_mqtt.error(f'MQTT: drop message for topic'
+                                      f' {msg[0]}: {repr(err)}')
+            if failed:
+                queue.counter['failed'] += len(failed)
+                queue.requeue(failed)
+                logger_mqtt.warning(f'MQTT: {len(failed)} messages not'
+                                    f' published: {error}')
+                await asyncio.sleep(1)
 
     async def __loop(self) -> None:
         mqtt = Config.get('mqtt')
@@ -89,13 +194,25 @@ class Mqtt(metaclass=Singleton):
             try:
                 async with self.__client:
                     logger_mqtt.info('MQTT broker connection established')
-                    await self._init_new_conn()
+                    sender = asyncio.create_task(self.__sender())
+                    replay = None
+                    try:
+                        await self._init_new_conn()
+                        if self.spool:
+                            replay = asyncio.create_task(self.__replay())
 
-                    async for message in self.__client.messages:
-                        await self.dispatch_msg(message)
+                        async for message in self.__client.messages:
+                            await self.dispatch_msg(message)
+                    finally:
+                        sender.cancel()
+                        if replay:
+                            replay.cancel()
+                        # the sender requeues the messages in flight
+                        await asyncio.gather(sender, return_exceptions=True)
 
             except aiomqtt.MqttError:
                 self.ctime = None
+                self.__spool_queue()
 
                 if Config.is_default('mqtt'):
                     logger_mqtt.info(
@@ -115,8 +232,19 @@ class Mqtt(metaclass=Singleton):
             except Exception:
                 # self.inc_counter('SW_Exception')   # fixme
                 self.ctime = None
+                self.__spool_queue()
                 logger_mqtt.exception("Exception occurred")
 
+    def __spool_queue(self) -> None:
+        '''Move the unsent messages of the publish queue into the spool,
+        when the broker connection is lost. Otherwise an old queued
+        message would be published after the replay of a newer spooled
+        message of the same topic'''
+        if self.spool is None:
+            return
+        for topic, payload, _ in self.queue.take_all():
+            self.spool.put(topic, payload)
+
     async def _init_new_conn(self):
         self.ctime = datetime.now()
         self.published = 0
@@ -0,0 +1,172 @@
+'''Offline spool for the MQTT messages of the proxy
+
+While the broker isn't reachable, the MQTT client stores the published
+messages in the spool and replays them after the next connection, rate
+limited to `rate` messages per second.
+
+The messages are coalesced per topic: the latest payload wins and keeps
+the position of the first message of the topic. For the topics of the
+`keep_all` groups, like 'total', every message is stored. If the spool is
+full, the oldest message is dropped.
+
+With a file path, every spooled message is appended as JSON line to the
+file, so the spool survives a restart of the proxy. The file stays open
+and the appended lines are buffered and flushed at most once per
+FLUSH_DELAY seconds, so a publish doesn't wait for the disk. The file is
+compacted, if it has more than twice as many lines as the spool can hold,
+and it is truncated after a complete replay.
+'''
+import json
+import logging
+import asyncio
+from itertools import count
+
+
+class MqttSpool:
+    '''Bounded spool of (topic, payload) messages'''
+    FLUSH_DELAY = 1.0
+    '''max delay of the buffered file writes in seconds'''
+
+    def __init__(self, maxsize: int, path: str | None = None,
+                 keep_all: list[str] = (), rate: float = 50):
+        self.items = {}
+        '''(topic, payload) by the topic or by (topic, seq) for keep_all
+        topics, in the order of the spool'''
+        self.maxsize = maxsize
+        self.path = path
+        self.keep_all = set(keep_all)
+        self.rate = rate
+        self.counter = {'spooled': 0, 'coalesced': 0, 'dropped': 0,
+                        'replayed': 0}
+        self.__seq = count()
+        self.__lines = 0
+        '''number of lines in the spool file'''
+        self.__file = None
+        '''spool file, opened for appending'''
+        self.__flush_hdl = None
+        if path:
+            self.__load()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __key(self, topic: str):
+        if topic.rsplit('/', 1)[-1] in self.keep_all:
+            return (topic, next(self.__seq))
+        return topic
+
+    def put(self, topic: str, payload) -> None:
+        '''Spool a message'''
+        if isinstance(payload, (bytes, bytearray)):
+            payload = payload.decode()
+        self.__store(topic, payload)
+        if self.path:
+            self.__append(topic, payload)
+
+    def __store(self, topic: str, payload) -> None:
+        items = self.items
+        key = self.__key(topic)
+        if key in items:
+            self.counter['coalesced'] += 1
+        else:
+            if len(items) >= self.maxsize:
+                del items[next(iter(items))]
+                self.counter['dropped'] += 1
+            self.counter['spooled'] += 1
+        items[key] = (topic, payload)
+
+    def discard(self, topic: str) -> None:
+        '''Forget the spooled message of topic, since a newer message was
+        published'''
+        self.items.pop(topic, None)
+
+    def head(self) -> tuple | None:
+        '''Returns (key, topic, payload) of the oldest message'''
+        for key, (topic, payload) in self.items.items():
+            return key, topic, payload
+        return None
+
+    def done(self, key, payload) -> None:
+        '''Remove a replayed message, if it wasn't replaced meanwhile'''
+        msg = self.items.get(key)
+        if msg is not None and msg[1] == payload:
+            del self.items[key]
+        self.counter['replayed'] += 1
+        if not self.items and self.path:
+            self.__rewrite()
+
+    def __append(self, topic: str, payload) -> None:
+        try:
+            if self.__file is None:
+                self.__file = open(self.path, 'a', encoding='utf-8')
+            self.__file.write(json.dumps([topic, payload]) + '\n')
+            self.__lines += 1
+            if self.__lines > 2 * self.maxsize:
+                self.__rewrite()
+            else:
+                self.__schedule_flush()
+        except OSError as error:
+            logging.warning(f'MQTT spool: {error}')
+
+    def __schedule_flush(self) -> None:
+        if self.__flush_hdl is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()   # no loop, write the line immediately
+            return
+        self.__flush_hdl = loop.call_later(self.FLUSH_DELAY, self.flush)
+
+    def flush(self) -> None:
+        '''write the buffered lines into the spool file'''
+        self.__flush_hdl = None
+        if self.__file is None:
+            return
+        try:
+            self.__file.flush()
+        except OSError as error:
+            logging.warning(f'MQTT spool: {error}')
+
+    def close(self) -> None:
+        '''flush and close the spool file'''
+        if self.__flush_hdl is not None:
+            self.__flush_hdl.cancel()
+            self.__flush_hdl = None
+        if self.__file is None:
+            return
+        try:
+            self.__file.close()
+        except OSError as error:
+            logging.warning(f'MQTT spool: {error}')
+        self.__file = None
+
+    def __rewrite(self) -> None:
+        '''write the actual spool content into the file'''
+        self.close()
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                for topic, payload in self.items.values():
+                    f.write(json.dumps([topic, payload]) + '\n')
+            self.__lines = len(self.items)
+        except OSError as error:
+            logging.warning(f'MQTT spool: {error}')
+
+    def __load(self) -> None:
+        '''read the messages of a former run from the file'''
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        topic, payload = json.loads(line)
+                    except ValueError:
+                        continue   # skip an incomplete last line
+                    self.__store(topic, payload)
+        except FileNotFoundError:
+            return
+        except OSError as error:
+            logging.warning(f'MQTT spool: {error}')
+            return
+        logging.info(f'MQTT spool: {len(self.items)} messages loaded from'
+                     f' {self.path}')
+        self.__rewrite()
@@ -1,11 +1,12 @@
 import asyncio
 import logging
-import json
 from itertools import chain
+from functools import partial
 
 from cnf.config import Config
 from mqtt import Mqtt
 from infos import Infos
+from json_cache import JsonCache
 
 logger_mqtt = logging.getLogger('mqtt')
 
@@ -33,6 +34,11 @@ class Proxy():
         create_remote(): Establish a client connection to the TSUN cloud
         async_publ_mqtt(): Publish data to MQTT broker
     '''
+    __stat_json = JsonCache()
+    '''encoded members of the last published proxy statistics'''
+    __ha_published = {}
+    '''last published discovery payload of the proxy entities by topic'''
+
     @classmethod
     def class_init(cls) -> None:
         logging.debug('Proxy.class_init')
@@ -69,7 +75,7 @@ class Proxy():
     async def _cb_mqtt_is_up(cls) -> None:
         logging.info('Initialize proxy device on home assistant')
         # register proxy status counters at home assistant
-        await cls._register_proxy_stat_home_assistant()
+        await cls._register_proxy_stat_home_assistant(force=True)
 
         # send values of the proxy status counters
         await asyncio.sleep(0.15)            # wait a bit, before sending data
@@ -77,18 +83,28 @@ class Proxy():
         await cls._async_publ_mqtt_proxy_stat('proxy')
 
     @classmethod
-    async def _register_proxy_stat_home_assistant(cls) -> None:
-        '''register all our topics at home assistant'''
+    async def _register_proxy_stat_home_assistant(cls, force: bool = True) \
+            -> None:
+        '''register all our topics at home assistant, unchanged topics are
+        only published again, if force is set'''
+        published = cls.__ha_published
+        if force:
+            published.clear()
         for data_json, component, node_id, id in cls.db_stat.ha_proxy_confs(
                  cls.entity_prfx, cls.proxy_node_id, cls.proxy_unique_id):
+            topic = f'{cls.discovery_prfx}{component}/{node_id}{id}/config'
+            if published.get(topic) == data_json:
+                continue
             logger_mqtt.debug(f"MQTT Register: cmp:'{component}' node_id:'{node_id}' {data_json}")      # noqa: E501
-            await cls.mqtt.publish(f'{cls.discovery_prfx}{component}/{node_id}{id}/config', data_json)  # noqa: E501
+            await cls.mqtt.publish(
+                topic, data_json,
+                on_sent=partial(published.__setitem__, topic, data_json))
 
     @classmethod
     async def _async_publ_mqtt_proxy_stat(cls, key) -> None:
         stat = Infos.stat
         if key in stat and Infos.new_stat_data[key]:
-            data_json = json.dumps(stat[key])
+            data_json = cls.__stat_json.encode(key, stat[key])
             node_id = cls.proxy_node_id
             logger_mqtt.debug(f'{key}: {data_json}')
             await cls.mqtt.publish(f"{cls.entity_prfx}{node_id}{key}",
@@ -0,0 +1,155 @@
+'''Bounded queue for the MQTT messages of the proxy
+
+The proxy publishes state topics: only the latest payload of a topic is of
+interest. So the queue holds at most one message per topic, a new payload
+for a queued topic replaces the queued payload and keeps its position in
+the queue (coalescing). The age of a message is the time since the first
+enqueue of its topic.
+
+Event topics, like the responses of commands, carry one-off messages.
+They are given by their topic suffixes, aren't coalesced and are sent in
+FIFO order.
+
+If the queue is full, the policy decides:
+    'block': the publisher waits until the sender has taken messages from
+             the queue (back-pressure)
+    'drop':  the oldest message is dropped
+
+A message can have an on_sent callback, which the sender calls by done()
+after the message was published. The callback of a message, which was
+dropped or replaced by a newer payload, isn't called.
+'''
+import time
+import asyncio
+from itertools import islice, count
+from typing import Callable
+
+
+class PublishQueue:
+    '''Queue of (topic, payload, enqueue time) with one entry per state
+    topic'''
+    POLICIES = ('block', 'drop')
+
+    def __init__(self, maxsize: int = 1000, policy: str = 'block',
+                 events: tuple[str, ...] = ()):
+        self.items = {}
+        '''(payload, enqueue time) by key, in the order of the queue. The
+        key is the topic, or (topic, sequence number) for event topics'''
+        self.events = tuple(events)
+        '''topic suffixes of the event topics'''
+        self.__seq = count()
+        self.maxsize = maxsize
+        self.policy = policy
+        self.high_water = 0
+        '''maximum depth since the last take_high_water()'''
+        self.counter = {'queued': 0, 'coalesced': 0, 'dropped': 0,
+                        'failed': 0}
+        self.on_sent = {}
+        '''on_sent callback of the queued messages by topic'''
+        self.sending = {}
+        '''on_sent callback of the messages taken by get_batch()'''
+        self.__ready = asyncio.Event()
+        self.__space = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __key(self, topic: str) -> str | tuple[str, int]:
+        '''queue key of a new message, every event gets an own key'''
+        if self.events and topic.endswith(self.events):
+            return (topic, next(self.__seq))
+        return topic
+
+    async def put(self, topic: str, payload,
+                  on_sent: Callable[[], None] | None = None) -> None:
+        '''Enqueue a message, a queued message of the same state topic gets
+        the new payload'''
+        items = self.items
+        topic = self.__key(topic)
+        while topic not in items and len(items) >= self.maxsize:
+            if self.policy == 'drop':
+                dropped = next(iter(items))
+                del items[dropped]
+                self.on_sent.pop(dropped, None)
+                self.counter['dropped'] += 1
+            else:
+                self.__space.clear()
+                await self.__space.wait()
+        if on_sent:
+            self.on_sent[topic] = on_sent
+        else:
+            self.on_sent.pop(topic, None)
+        if topic in items:
+            items[topic] = (payload, items[topic][1])
+            self.counter['coalesced'] += 1
+            return
+        items[topic] = (payload, time.monotonic())
+        self.counter['queued'] += 1
+        if len(items) > self.high_water:
+            self.high_water = len(items)
+        self.__ready.set()
+
+    async def get_batch(self, size: int) -> list[tuple]:
+        '''Wait for messages and take up to size messages from the head of
+        the queue'''
+        items = self.items
+        while not items:
+            self.__ready.clear()
+            await self.__ready.wait()
+        batch = []
+        for key in list(islice(items, size)):
+            topic = key if type(key) is str else key[0]
+            batch.append((topic, *items.pop(key)))
+            if (on_sent := self.on_sent.pop(key, None)) is not None:
+                self.sending[topic] = on_sent
+        self.__space.set()
+        return batch
+
+    def done(self, topic: str) -> None:
+        '''A message of the last batches was published'''
+        on_sent = self.sending.pop(topic, None)
+        if on_sent:
+            on_sent()
+
+    def discard(self, topic: str) -> None:
+        '''A message of the last batches can't be published and is
+        dropped'''
+        self.sending.pop(topic, None)
+
+    def requeue(self, batch: list[tuple]) -> None:
+        '''Put unsent messages back to the head of the queue, messages with
+        a newer payload in the queue are skipped'''
+        items = self.items
+        head = {}
+        for topic, payload, ts in batch:
+            key = self.__key(topic)
+            if key in items:
+                self.sending.pop(topic, None)
+                continue
+            head[key] = (payload, ts)
+            on_sent = self.sending.pop(topic, None)
+            if on_sent:
+                self.on_sent[key] = on_sent
+        if head:
+            head.update(items)
+            items.clear()
+            items.update(head)
+            self.__ready.set()
+
+    def take_all(self) -> list[tuple]:
+        '''Take all queued messages, without calling their on_sent
+        callbacks'''
+        items = self.items
+        batch = [(key if type(key) is str else key[0], *msg)
+                 for key, msg in items.items()]
+        items.clear()
+        self.on_sent.clear()
+        self.__space.set()
+        return batch
+
+    def take_high_water(self) -> int:
+        '''Returns the maximum depth since the last call and restarts the
+        measurement with the actual depth'''
+        res = self.high_water
+        self.high_water = len(self.items)
+        return res
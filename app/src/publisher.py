@@ -0,0 +1,80 @@
+'''Publisher task for the MQTT updates of all connections
+
+The receive loop of a connection (AsyncStream.loop) only notifies the
+publisher about new data and continues with the next frame. The publisher
+task calls the MQTT publish handlers of the notified connections one after
+the other, so a slow or reconnecting broker doesn't delay the responses to
+the inverters.
+
+A connection is pending at most once: further notifications before its
+handler runs are coalesced. The handler publishes all groups with new
+data, so multiple updates of a group are published only once.
+'''
+import asyncio
+import logging
+
+from infos import Infos
+
+
+class Publisher():
+    '''class Publisher runs the MQTT publishing of all connections
+
+    class methods:
+        start():  start the publisher task
+        stop():   stop the publisher task and forget pending connections
+        notify(): register new data of a connection
+    '''
+    task = None
+    pending = {}
+    '''connections with new data, in the order of the first notification'''
+    counter = {'notified': 0, 'coalesced': 0, 'published': 0}
+    __event = None
+
+    @classmethod
+    def start(cls) -> None:
+        if cls.task:
+            return
+        cls.__event = asyncio.Event()
+        cls.task = asyncio.create_task(cls._run())
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls.task:
+            cls.task.cancel()
+            cls.task = None
+        cls.pending.clear()
+
+    @classmethod
+    def notify(cls, ifc) -> bool:
+        '''Register new data of the connection ifc, its async_publ_mqtt()
+        handler will be called by the publisher task. Returns False, if the
+        publisher isn't running'''
+        if cls.task is None:
+            return False
+        cls.counter['notified'] += 1
+        if ifc in cls.pending:
+            cls.counter['coalesced'] += 1
+        else:
+            cls.pending[ifc] = None
+            cls.__event.set()
+        return True
+
+    @classmethod
+    async def _run(cls) -> None:
+        pending = cls.pending
+        event = cls.__event
+        while True:
+            await event.wait()
+            event.clear()
+            while pending:
+                ifc = next(iter(pending))
+                del pending[ifc]
+                async_publ_mqtt = ifc.async_publ_mqtt
+                if async_publ_mqtt is None:
+                    continue          # the connection is already closed
+                try:
+                    await async_publ_mqtt()
+                    cls.counter['published'] += 1
+                except Exception:
+                    Infos.inc_counter('SW_Exception')
+                    logging.exception('Publisher: exception occurred')
@@ -5,9 +5,10 @@ import asyncio
 from asyncio import StreamReader, StreamWriter
 import os
 import sys
+import json
 import argparse
 from pathlib import Path
-from quart import Quart, Response
+from quart import Quart, Response, request
 
 from cnf.config import Config
 from cnf.config_read_env import ConfigReadEnv
@@ -20,8 +21,13 @@ from inverter_ifc import InverterIfc
 from gen3.inverter_g3 import InverterG3
 from gen3plus.inverter_g3p import InverterG3P
 from scheduler import Schedule
+from metrics import Metrics
+from publisher import Publisher
+from change_log import ChangeLog
+from infos import Infos
 
 from modbus_tcp import ModbusTcp
+import async_protocol
 
 
 class Server():
@@ -356,6 +362,51 @@ async def healthy():
     return Response(status=200, response="I'm fine")
 
 
+@app.route('/-/metrics')
+async def metrics():
+    """
+    Metrics endpoint in the Prometheus text format.
+
+    Exports the histograms of the frame processing time (global and per
+    open connection), the event loop lag, the MODBUS queue statistics of the
+    inverter connections and the proxy statistic counters.
+
+    Returns:
+        Response: 200 OK with the metrics as text/plain
+    """
+    conns = []
+    mbs = []
+    for inverter in InverterIfc:
+        for side in ('local', 'remote'):
+            stream = getattr(inverter, side, None)
+            if stream and stream.ifc:
+                conns.append((side, stream.ifc))
+                if side == 'local' and getattr(stream.stream, 'mb', None):
+                    mbs.append((stream.stream.node_id, stream.stream.mb))
+
+    return Response(status=200, response=Metrics.prometheus(conns, mbs),
+                    content_type='text/plain; version=0.0.4')
+
+
+@app.route('/-/changes')
+async def changes():
+    """
+    Debugging endpoint with the recorded value changes as JSON list.
+
+    The optional query parameters 'since' (sequence number of the last
+    read record) and 'node_id' filter the records. The recording must
+    be enabled with `proxy.change_log` in the config.
+
+    Returns:
+        Response: 200 OK with the change records as application/json
+    """
+    since = request.args.get('since', 0, type=int)
+    node_id = request.args.get('node_id')
+    return Response(status=200,
+                    response=json.dumps(ChangeLog.records(since, node_id)),
+                    content_type='application/json')
+
+
 async def handle_client(reader: StreamReader,
                         writer: StreamWriter,
                         inv_class):    # pragma: no cover
@@ -379,6 +430,9 @@ async def startup_app():    # pragma: no cover
     Initializes core components:
     - Saves logger states.
     - Initializes the Proxy and Scheduler.
+    - Starts the event loop lag probe of the metrics.
+    - Starts the MQTT publisher task.
+    - Enables the change log and the publish filters, if configured.
     - Starts the Modbus TCP handler.
     - Starts TCP servers (listeners) for different inverter types
       based on configuration.
@@ -387,6 +441,10 @@ async def startup_app():    # pragma: no cover
     loop = asyncio.get_event_loop()
     Proxy.class_init()
     Schedule.start()
+    Metrics.start()
+    Publisher.start()
+    ChangeLog.enable(Config.get('proxy').get('change_log', 0))
+    Infos.set_publish_filter(Config.get('publish'))
     ModbusTcp(loop)
 
     # Define supported inverter generations and their respective ports
@@ -394,6 +452,11 @@ async def startup_app():    # pragma: no cover
         (InverterG3, 'tsun', 5005),
         (InverterG3P, 'solarman', 10000)
     ]
+    if async_protocol.use_protocol_engine():
+        logging.info('Use the asyncio.Protocol connection engine')
+        start_server = async_protocol.start_server
+    else:
+        start_server = asyncio.start_server
 
     for inv_class, config_id, port in inverter_configs:
         config_arr = Config.get(config_id)
@@ -407,7 +470,7 @@ async def startup_app():    # pragma: no cover
 
         # Start a TCP server for the specific inverter type
         task = loop.create_task(
-            asyncio.start_server(
+            start_server(
                 lambda r, w, i=inv_class: handle_client(r, w, i),
                 '0.0.0.0', port
             )
@@ -444,6 +507,8 @@ async def handle_shutdown():   # pragma: no cover
 
     logging.info('Proxy disconnecting done')
     app.background_tasks.clear()
+    Publisher.stop()
+    Metrics.stop()
 
     await Proxy.class_close(loop)
 
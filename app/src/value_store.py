@@ -0,0 +1,403 @@
+'''Flat value store for the register values of a connection
+
+Every name path of the info_defs table, like ['input', 'pv1', 'Voltage'],
+gets a fixed slot index in the StoreLayout, which is shared by all
+connections. A ValueStore holds the values of one connection in a
+preallocated list, indexed by this slot number, so an update doesn't walk
+a nested dict tree and doesn't allocate any dicts.
+
+For every top-level group ('inverter', 'grid', 'input', ...) the store
+tracks a change flag. The nested dict of a group, which is published as
+JSON via MQTT, is built on request and cached until the next change of
+the group.
+
+Slots can have a publish filter with a deadband and a minimum publish
+interval. A filtered change is stored and reported as HELD, so it is
+logged, but it doesn't trigger a MQTT publish of the group. The next
+published update of the group contains the stored value. A change, which
+was suppressed by the minimum interval, is flushed when the interval
+expires, so the last value is published even if no further update follows.
+Default and config values bypass the filters.
+
+The JSON payload of a group is cached until the next change of the group,
+too. A changed group is encoded by a JsonCache, which encodes only the
+changed members of the group again.
+'''
+import time
+import asyncio
+from typing import Generator, Callable
+from json_cache import JsonCache
+
+_UNSET = object()
+'''marker for a slot without a value'''
+_PATH = object()
+'''marker for a slot without a value, whose parent dicts exist'''
+
+_EXISTS = 1
+'''group flag: the group is part of the nested dict'''
+_CHANGED = 2
+'''group flag: a value of the group was updated'''
+
+HELD = 1
+'''update result: the value was changed, but held back by the publish
+filter'''
+PUBLISH = 2
+'''update result: the value was changed and must be published'''
+
+
+class StoreLayout:
+    '''Assignment of name paths to slots and top-level groups'''
+    __slots__ = ('slots', 'paths', 'names', 'group_of', 'groups',
+                 'group_idx', 'filters')
+
+    def __init__(self):
+        self.slots = {}
+        '''slot number by the name path (tuple)'''
+        self.paths = []
+        '''name path of every slot'''
+        self.names = []
+        '''dotted name of every slot, for logging'''
+        self.group_of = []
+        '''group index of every slot'''
+        self.groups = []
+        '''name of every top-level group'''
+        self.group_idx = {}
+        '''group index by the group name'''
+        self.filters = {}
+        '''publish filter (deadband, min_interval) by slot'''
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def slot(self, keys: list | tuple) -> int:
+        '''Returns the slot for the name path keys, unknown paths get a new
+        slot'''
+        path = tuple(keys)
+        slot = self.slots.get(path)
+        if slot is None:
+            slot = self.slots[path] = len(self.paths)
+            self.paths.append(path)
+            self.names.append('.'.join(path))
+            self.group_of.append(self.group(path[0]))
+        return slot
+
+    def group(self, name: str) -> int:
+        '''Returns the index of the group name, unknown groups get a new
+        index'''
+        idx = self.group_idx.get(name)
+        if idx is None:
+            idx = self.group_idx[name] = len(self.groups)
+            self.groups.append(name)
+        return idx
+
+
+class ValueStore:
+    '''Values of one connection, stored in the slots of a StoreLayout
+
+    The store provides the read-only dict interface of the former nested
+    db dict, like `store['grid']`, `'grid' in store` and `store.items()`.
+    A group can be replaced by assigning a nested dict. The nested dicts
+    keep the order, in which the values were stored first, like the
+    former db dict did.'''
+    __slots__ = ('layout', 'values', 'flags', 'cache', 'order',
+                 'group_order', 'published', 'payload', 'json_cache',
+                 'pending', 'flush_hdl', 'flush_cb')
+
+    counter = {'published': 0, 'suppressed': 0}
+    '''updates of all stores, which were reported or suppressed by a
+    publish filter'''
+
+    def __init__(self, layout: StoreLayout):
+        self.layout = layout
+        self.values = [_UNSET] * len(layout)
+        self.flags = bytearray(len(layout.groups))
+        self.cache = [None] * len(layout.groups)
+        self.order = []
+        '''slots in the order of their first update'''
+        self.group_order = []
+        '''groups in the order of their first update'''
+        self.published = None
+        '''(value, time) of the last reported update of filtered slots'''
+        self.payload = [None] * len(layout.groups)
+        '''cached JSON payload of every group'''
+        self.json_cache = JsonCache()
+        self.pending = {}
+        '''due time of the flush by slot, for changes which were suppressed
+        by the minimum interval'''
+        self.flush_hdl = None
+        self.flush_cb: Callable[[list[str]], None] | None = None
+        '''called with the names of the flushed groups'''
+
+    def __grow(self) -> None:
+        '''adapt the store to new slots and groups of the layout'''
+        layout = self.layout
+        self.values.extend([_UNSET] * (len(layout) - len(self.values)))
+        grps = len(layout.groups) - len(self.flags)
+        self.flags.extend(bytes(grps))
+        self.cache.extend([None] * grps)
+        self.payload.extend([None] * grps)
+
+    def get(self, slot: int, not_found_result=None):
+        '''get the value of a slot'''
+        try:
+            val = self.values[slot]
+        except IndexError:
+            return not_found_result
+        if val is _UNSET or val is _PATH:
+            return not_found_result
+        return val
+
+    def update(self, slot: int, must_incr: bool, result,
+               filtered: bool = True) -> int:
+        '''Update the value of a slot, counters with must_incr can only be
+        increased. Returns PUBLISH or HELD, if the value was updated, and
+        0 if not. Default and config values are written with
+        filtered=False, which bypasses the publish filter'''
+        try:
+            val = self.values[slot]
+        except IndexError:
+            self.__grow()
+            val = _UNSET
+        if val is _UNSET or val is _PATH:
+            update = (not must_incr or result > 0)
+        elif must_incr:
+            update = val < result
+        else:
+            update = val != result
+        if update:
+            self.values[slot] = result
+            if self.layout.filters and slot in self.layout.filters and \
+                    self.__suppress(slot, result, filtered):
+                self.counter['suppressed'] += 1
+                res = HELD
+            else:
+                self.counter['published'] += 1
+                res = PUBLISH
+        elif val is _UNSET:
+            self.values[slot] = _PATH   # the former db created the path
+            res = 0
+        else:
+            return 0
+        if val is _UNSET:
+            self.order.append(slot)
+        grp = self.layout.group_of[slot]
+        flag = self.flags[grp]
+        if not flag & _EXISTS:
+            self.group_order.append(grp)
+        self.flags[grp] = flag | ((_EXISTS | _CHANGED) if res == PUBLISH
+                                  else _EXISTS)
+        self.cache[grp] = None
+        self.payload[grp] = None
+        return res
+
+    def __suppress(self, slot: int, result, filtered: bool) -> bool:
+        '''Check the publish filter of the slot, returns True if the update
+        must not be published'''
+        deadband, min_interval = self.layout.filters[slot]
+        now = time.monotonic()
+        if self.published is None:
+            self.published = {}
+        last = self.published.get(slot)
+        if last is not None and filtered:
+            value, ts = last
+            if min_interval and now - ts < min_interval:
+                self.__schedule_flush(slot, ts + min_interval)
+                return True
+            if deadband and isinstance(result, (int, float)) and \
+                    isinstance(value, (int, float)) and \
+                    abs(result - value) < deadband:
+                self.pending.pop(slot, None)
+                return True
+        self.pending.pop(slot, None)
+        self.published[slot] = (result, now)
+        return False
+
+    def __schedule_flush(self, slot: int, due: float) -> None:
+        '''remember the suppressed change of the slot and start the flush
+        timer, if a loop is running'''
+        self.pending[slot] = due
+        if self.flush_hdl is not None:
+            if self.flush_hdl.when() <= due:
+                return
+            self.flush_hdl.cancel()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return   # no loop, flush() must be called explicitly
+        self.flush_hdl = loop.call_later(max(0, due - time.monotonic()),
+                                         self.__flush_timeout)
+
+    def __flush_timeout(self) -> None:
+        self.flush_hdl = None
+        groups = self.flush()
+        if groups and self.flush_cb:
+            self.flush_cb(groups)
+        if self.pending:
+            slot = min(self.pending, key=self.pending.get)
+            self.__schedule_flush(slot, self.pending[slot])
+
+    def flush(self) -> list[str]:
+        '''Report the suppressed changes, whose minimum interval expired.
+        Returns the names of the changed groups'''
+        now = time.monotonic()
+        groups = self.layout.groups
+        res = []
+        for slot, due in list(self.pending.items()):
+            if due > now:
+                continue
+            del self.pending[slot]
+            val = self.values[slot]
+            if val is _UNSET or val is _PATH:
+                continue
+            self.published[slot] = (val, now)
+            self.counter['published'] += 1
+            grp = self.layout.group_of[slot]
+            self.flags[grp] |= _CHANGED
+            if groups[grp] not in res:
+                res.append(groups[grp])
+        return res
+
+    def cancel_flush(self) -> None:
+        '''stop the flush timer and forget the suppressed changes'''
+        if self.flush_hdl is not None:
+            self.flush_hdl.cancel()
+            self.flush_hdl = None
+        self.pending.clear()
+
+    def changed(self) -> list[str]:
+        '''Returns the groups with updated values since the last call and
+        resets the change flags'''
+        groups = self.layout.groups
+        flags = self.flags
+        res = []
+        for grp, flag in enumerate(flags):
+            if flag & _CHANGED:
+                flags[grp] = flag & ~_CHANGED
+                res.append(groups[grp])
+        return res
+
+    def group_dict(self, grp: int) -> dict:
+        '''Build the nested dict of a group'''
+        res = {}
+        values = self.values
+        paths = self.layout.paths
+        group_of = self.layout.group_of
+        for slot in self.order:
+            if group_of[slot] != grp:
+                continue
+            val = values[slot]
+            path = paths[slot]
+            db_dict = res
+            for key in path[1:-1]:
+                sub_dict = db_dict.get(key)
+                if sub_dict is None:
+                    sub_dict = db_dict[key] = {}
+                db_dict = sub_dict
+            if val is not _PATH:
+                db_dict[path[-1]] = val
+        return res
+
+    def __group(self, name: str) -> int | None:
+        grp = self.layout.group_idx.get(name)
+        if grp is None or grp >= len(self.flags) or \
+                not self.flags[grp] & _EXISTS:
+            return None
+        return grp
+
+    def __getitem__(self, name: str) -> dict:
+        grp = self.__group(name)
+        if grp is None:
+            raise KeyError(name)
+        res = self.cache[grp]
+        if res is None:
+            res = self.cache[grp] = self.group_dict(grp)
+        return res
+
+    def group_json(self, name: str) -> str:
+        '''Returns the JSON payload of the group name'''
+        grp = self.__group(name)
+        if grp is None:
+            raise KeyError(name)
+        res = self.payload[grp]
+        if res is None:
+            res = self.payload[grp] = self.json_cache.encode(grp, self[name])
+        return res
+
+    def __setitem__(self, name: str, value: dict) -> None:
+        '''replace all values of the group name with the nested dict'''
+        grp = self.layout.group(name)
+        self.__grow()
+        group_of = self.layout.group_of
+        order = []
+        for slot in self.order:
+            if group_of[slot] == grp:
+                self.values[slot] = _UNSET
+            else:
+                order.append(slot)
+        self.order = order
+        if not self.flags[grp] & _EXISTS:
+            self.group_order.append(grp)
+        self.flags[grp] = _EXISTS | _CHANGED
+        self.cache[grp] = None
+        self.payload[grp] = None
+        self.__load((name,), value)
+
+    def __load(self, path: tuple, value: dict) -> None:
+        for key, val in value.items():
+            if isinstance(val, dict):
+                if val:
+                    self.__load(path + (key,), val)
+                    continue
+                # keep the empty dict in the path
+                slot = self.layout.slot(path + (key, ''))
+                val = _PATH
+            else:
+                slot = self.layout.slot(path + (key,))
+            self.__grow()
+            self.values[slot] = val
+            self.order.append(slot)
+
+    def __contains__(self, name: str) -> bool:
+        return self.__group(name) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ValueStore):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def keys(self) -> list[str]:
+        groups = self.layout.groups
+        return [groups[grp] for grp in self.group_order]
+
+    def items(self) -> Generator[tuple[str, dict], None, None]:
+        for name in self.keys():
+            yield name, self[name]
+
+    def to_dict(self) -> dict:
+        '''Materialize the nested dict of all groups'''
+        return dict(self.items())
+
+    def load(self, db: dict) -> None:
+        '''replace all values with the nested dict db'''
+        self.clear()
+        for name, value in db.items():
+            self[name] = value
+
+    def clear(self) -> None:
+        self.__grow()
+        values = self.values
+        for slot in range(len(values)):
+            values[slot] = _UNSET
+        self.flags[:] = bytes(len(self.flags))
+        self.cache[:] = [None] * len(self.cache)
+        self.payload[:] = [None] * len(self.payload)
+        self.order = []
+        self.group_order = []
+        self.published = None
+        self.cancel_flush()
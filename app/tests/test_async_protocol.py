@@ -0,0 +1,165 @@
+# test_with_pytest.py
+import pytest
+import asyncio
+
+from mock import patch
+from infos import Infos
+from cnf.config import Config
+import async_protocol
+from async_protocol import StreamProtocol
+from async_stream import AsyncStreamServer, AsyncStreamClient, StreamPtr
+
+pytest_plugins = ('pytest_asyncio',)
+
+# initialize the proxy statistics
+Infos.static_init()
+
+
+class EchoServer():
+    '''starts a listener with the protocol engine, which answers every
+    received chunk with "ack:" + data'''
+    def __init__(self, timeout=2):
+        self.timeout = timeout
+        self.ifc = None
+        self.done = asyncio.Event()
+        self.server = None
+        self.rx_exc = False
+
+    async def start(self):
+        self.server = await async_protocol.start_server(
+            self.handle_client, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle_client(self, reader, writer):
+        self.ifc = AsyncStreamServer(reader, writer, None, None,
+                                     StreamPtr(None))
+        self.ifc.prot_set_timeout_cb(lambda: self.timeout)
+        self.ifc.rx_set_cb(self.app_read)
+        await self.ifc.loop()
+        self.ifc.close()
+        self.done.set()
+
+    def app_read(self):
+        if self.rx_exc:
+            self.rx_exc = False
+            self.ifc.rx_clear()
+            raise ValueError('parser error')
+        data = self.ifc.rx_get()
+        self.ifc.tx_add(b'ack:' + bytes(data))
+        self.ifc.tx_flush()
+        return 0
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+@pytest.fixture
+def config_protocol():
+    Config.act_config = {'proxy': {'engine': 'protocol'}}
+    yield
+    Config.act_config = {}
+
+
+def test_use_protocol_engine(config_protocol):
+    _ = config_protocol
+    assert async_protocol.use_protocol_engine()
+    Config.act_config = {'proxy': {'engine': 'stream'}}
+    assert not async_protocol.use_protocol_engine()
+    Config.act_config = {}
+    assert not async_protocol.use_protocol_engine()
+
+
+@pytest.mark.asyncio
+async def test_server_echo():
+    srv = EchoServer()
+    port = await srv.start()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'msg1')
+    assert b'ack:msg1' == await reader.readexactly(8)
+    writer.write(b'msg2')
+    assert b'ack:msg2' == await reader.readexactly(8)
+    assert isinstance(srv.ifc._reader, StreamProtocol)
+    assert srv.ifc.r_addr == writer.get_extra_info('sockname')
+
+    writer.close()     # the server loop must stop with 'Peer closed'
+    await writer.wait_closed()
+    await asyncio.wait_for(srv.done.wait(), 1)
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_server_idle_timeout():
+    srv = EchoServer(timeout=0.1)
+    port = await srv.start()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'msg1')
+    assert b'ack:msg1' == await reader.readexactly(8)
+
+    # the server disconnects after 0.1s without received data
+    await asyncio.wait_for(srv.done.wait(), 1)
+    assert b'' == await reader.read(10)
+    writer.close()
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_server_rx_exception():
+    srv = EchoServer()
+    port = await srv.start()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    srv.rx_exc = True
+    with patch.object(Infos, 'inc_counter') as spy:
+        writer.write(b'msg1')
+        await asyncio.sleep(0.05)
+        spy.assert_called_with('SW_Exception')
+
+    # the connection survives the exception of the parser
+    writer.write(b'msg2')
+    assert b'ack:msg2' == await reader.readexactly(8)
+    writer.close()
+    await asyncio.wait_for(srv.done.wait(), 1)
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_client_conn():
+    rx_data = b''
+    srv_closed = asyncio.Event()
+
+    async def handle_client(reader, writer):
+        nonlocal rx_data
+        rx_data = await reader.readexactly(4)
+        writer.write(b'rsp1')
+        await writer.drain()
+        writer.close()
+        srv_closed.set()
+
+    server = await asyncio.start_server(handle_client, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    reader, writer = await async_protocol.open_connection('127.0.0.1', port)
+    assert reader is writer
+    cnt = 0
+
+    def app_read():
+        nonlocal cnt
+        cnt += 1
+        return 0
+
+    def closed():
+        nonlocal cnt
+        cnt += 10
+
+    ifc = AsyncStreamClient(reader, writer, StreamPtr(None), closed)
+    ifc.rx_set_cb(app_read)
+    ifc.tx_add(b'req1')
+    ifc.tx_flush()
+    await asyncio.wait_for(ifc.client_loop(''), 1)
+    assert rx_data == b'req1'
+    assert b'rsp1' == ifc.rx_peek()
+    assert cnt == 11
+    await srv_closed.wait()
+    ifc.close()
+    server.close()
+    await server.wait_closed()
@@ -601,4 +601,100 @@ async def test_forward_resp2(spy_inc_cnt):
     assert Infos.get_counter('ProxyMode_Cnt') == 0
     assert cnt == 1
     del ifc
- 
\ No newline at end of file
+ 
+@pytest.mark.asyncio(loop_scope="module")
+async def test_write_coalesce():
+    assert asyncio.get_running_loop()
+    reader = FakeReader()
+    reader.test  = FakeReader.RD_TEST_13_BYTES
+    reader.on_recv.set()
+    writer =  FakeWriter()
+
+    def app_read():
+        # two responses are flushed while processing the received msg
+        ifc.tx_add(b'rsp1 ')
+        ifc.tx_flush()
+        ifc.tx_add(b'rsp2 ')
+        ifc.tx_flush()
+        ifc.tx_add(b'rsp3')
+        return 0
+
+    ifc =  AsyncStreamClient(reader, writer, None, None)
+    ifc.rx_set_cb(app_read)
+    await ifc.client_loop('')
+    assert b'rsp1 rsp2 rsp3' == writer.buf
+    assert 1 == writer.write_cnt
+    assert ifc.tx_stats == {'writes': 1, 'chunks': 3, 'bytes': 14,
+                            'drains': 0}
+    ifc.close()
+    del ifc
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_write_drain():
+    assert asyncio.get_running_loop()
+    writer =  FakeWriter()
+    ifc =  AsyncStreamClient(FakeReader(), writer, None, None)
+
+    ifc.tx_add(b'test-data-resp')
+    ifc.tx_flush()
+    assert 0 == writer.write_cnt     # queued until the next loop iteration
+    await asyncio.sleep(0)
+    assert b'test-data-resp' == writer.buf
+    assert ifc.tx_stats['drains'] == 0
+
+    # above the high-water mark we have to wait for the transport
+    writer.transport.buf_size = 70000
+    ifc.tx_add(b'-2')
+    await ifc._AsyncStream__async_write()
+    assert b'test-data-resp-2' == writer.buf
+    assert ifc.tx_stats == {'writes': 2, 'chunks': 2, 'bytes': 16,
+                            'drains': 1}
+    ifc.close()
+    del ifc
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_write_batch():
+    '''the writes of a loop iteration are sent with one writer call'''
+    assert asyncio.get_running_loop()
+    writer =  FakeWriter()
+    ifc =  AsyncStreamClient(FakeReader(), writer, None, None)
+
+    ifc.tx_add(b'rsp1 ')
+    await ifc._AsyncStream__async_write()
+    ifc.tx_add(b'rsp2')
+    await ifc._AsyncStream__async_write()
+    assert 0 == writer.write_cnt
+    await asyncio.sleep(0)
+    assert b'rsp1 rsp2' == writer.buf
+    assert 1 == writer.write_cnt
+
+    # a closing transport is reported like by StreamWriter.drain()
+    writer.closing = True
+    ifc.tx_add(b'rsp3')
+    with pytest.raises(ConnectionResetError):
+        await ifc._AsyncStream__async_write()
+    await asyncio.sleep(0)
+    assert b'rsp1 rsp2' == writer.buf
+    ifc.close()
+    del ifc
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_forward_closed_remote():
+    '''a broken remote connection is disconnected by the forward path'''
+    assert asyncio.get_running_loop()
+    remote = StreamPtr(None)
+    create_remote(remote, TestType.FWD_NO_EXCPT)
+    closed = 0
+    def close_cb():
+        nonlocal closed
+        closed += 1
+    remote.ifc.close_cb = close_cb
+    remote.ifc._writer.closing = True
+
+    ifc = AsyncStreamClient(FakeReader(), FakeWriter(), remote, None)
+    ifc.fwd_add(b'test-forward_msg')
+    await ifc._AsyncStream__async_forward()
+    assert closed == 1
+    assert remote.ifc._writer.buf == b''
+    ifc.close()
+    del ifc
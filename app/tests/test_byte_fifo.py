@@ -41,3 +41,48 @@ def test_fifo_observer():
     assert b'' == read.peek(2)
     assert b'' == read.get(2)
     assert 0 == len(read)
+
+def test_fifo_get_all():
+    read = ByteFifo()
+    read += b'1234'
+    buf = read.peek()
+    assert b'1234' == read.get(4)
+    assert buf is not read.peek()   # the old buffer was handed over
+    assert 0 == len(read)
+    read += b'56'
+    assert b'56' == read.get(10)
+    assert 0 == len(read)
+    assert b'1234' == buf
+
+def test_fifo_frames():
+    frame = b'\xa5' + bytes(range(20)) + b'\x15'
+    read = ByteFifo()
+    for _ in range(100):
+        read += frame
+    for _ in range(100):
+        assert frame == read.peek(len(frame))
+        assert frame == read.get(len(frame))
+    assert 0 == len(read)
+    assert b'' == read.peek()
+
+def test_fifo_view():
+    read = ByteFifo()
+    read += b'123456'
+    view = read.view(1, 3)
+    assert isinstance(view, memoryview)
+    assert b'234' == view
+    assert b'3456' == read.view(2)
+    read.peek()[2] = ord('x')     # the view shares the memory
+    assert b'2x4' == view
+    view.release()
+
+def test_fifo_view_alive():
+    read = ByteFifo()
+    read += b'123456'
+    view = read.view(0, 2)
+    # the buffer can't be resized in place, while the view is alive
+    read += b'78'
+    assert b'12345678' == read.peek()
+    assert b'12' == read.get(2)
+    assert b'345678' == read.peek()
+    assert b'12' == view
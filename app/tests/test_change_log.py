@@ -0,0 +1,60 @@
+# test_with_pytest.py
+import pytest
+import logging
+from infos import Infos
+from change_log import ChangeLog
+
+
+@pytest.fixture
+def change_log():
+    ChangeLog.enable(3)
+    yield ChangeLog
+    ChangeLog.enable(0)
+
+
+def test_disabled():
+    ChangeLog.enable(0)
+    assert ChangeLog.ring is None
+    assert ChangeLog.records() == []
+
+
+def test_ring(change_log):
+    seq = change_log.seq
+    for val in range(4):
+        change_log.add('inv_1/', 'MODBUS', 'grid.Voltage', val, ' V')
+    recs = change_log.records()
+    assert [rec['value'] for rec in recs] == [1, 2, 3]   # ring of 3 records
+    assert recs[0]['seq'] == seq + 2
+    assert recs[0]['node_id'] == 'inv_1/'
+    assert recs[0]['source'] == 'MODBUS'
+    assert recs[0]['name'] == 'grid.Voltage'
+    assert recs[0]['unit'] == ' V'
+    assert [rec['value'] for rec in change_log.records(seq + 3)] == [3]
+    assert change_log.records(node_id='inv_2/') == []
+
+    change_log.enable(5)     # a resize keeps the records
+    assert len(change_log.records()) == 3
+
+
+def test_value_changed(change_log, caplog):
+    i = Infos()
+    slot = i.key_slot(['grid', 'Voltage'])
+    with caplog.at_level(logging.INFO, logger='data'):
+        i.value_changed(logging.DEBUG, 'inv_1/', 'GEN3', slot, 230.1, ' V')
+        i.value_changed(logging.INFO, 'inv_1/', 'GEN3', slot, 230.2, ' V')
+    assert [rec['value'] for rec in change_log.records()] == [230.1, 230.2]
+    assert caplog.messages == ['[inv_1/] GEN3: grid.Voltage : 230.2 V']
+
+
+def test_value_changed_lazy(monkeypatch):
+    class Unformattable():
+        def __format__(self, spec):
+            raise AssertionError('must not be formatted')
+
+    ChangeLog.enable(0)
+    i = Infos()
+    slot = i.key_slot(['grid', 'Voltage'])
+    monkeypatch.setattr(i.tracer, 'isEnabledFor', lambda level: False)
+    monkeypatch.setattr(logging.root, 'isEnabledFor', lambda level: False)
+    i.value_changed(logging.INFO, 'inv_1/', 'MODBUS', slot, Unformattable(),
+                    ' V', root=True)
@@ -486,3 +486,17 @@ def test_read_cnf6():
         ConfigReadToml("config/config.toml")
         err = Config.get_error()
     assert err != None
+
+def test_read_cnf_publish():
+    test_buffer.rd = "[publish.grid]\ndeadband = 0.5\nmin_interval = 30\n" \
+                     "[publish.input]\nmin_interval = 10\n"
+
+    Config.init(ConfigReadToml("app/src/cnf/default_config.toml"))
+    for _ in patch_open():
+        ConfigReadToml("config/config.toml")
+        err = Config.get_error()
+
+    assert err == None
+    assert Config.get('publish') == {
+        'grid': {'deadband': 0.5, 'min_interval': 30},
+        'input': {'min_interval': 10}}
@@ -0,0 +1,46 @@
+# test_with_pytest.py
+import os
+import crc16
+from crc16 import calc_crc, verify_crc
+
+
+def crc_bitwise(buf: bytes) -> int:
+    '''reference implementation, bit by bit'''
+    crc = 0xFFFF
+    for cur in buf:
+        crc ^= cur
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def test_calc_crc():
+    assert 0xffff == calc_crc(b'')
+    assert 0x0b02 == calc_crc(b'\x01\x06\x20\x08\x00\x04')
+    assert 0x5c75 == calc_crc(b'\x01\x03\x08\x01\x2c\x00\x2c\x02\x2c\x2c\x46')
+    for size in range(0, 260):
+        buf = os.urandom(size)
+        assert crc_bitwise(buf) == calc_crc(buf)
+        assert crc_bitwise(buf) == calc_crc(bytearray(buf))
+        assert crc_bitwise(buf) == calc_crc(memoryview(buf))
+
+
+def test_calc_crc_py():
+    # test the python implementation, also if an other backend is used
+    for size in (0, 1, 2, 7, 8, 250):
+        buf = os.urandom(size)
+        assert crc_bitwise(buf) == crc16._calc_crc_py(buf)
+    assert 0x0b02 == crc16._calc_crc_py(b'\x20\x08\x00\x04',
+                                         crc16._calc_crc_py(b'\x01\x06'))
+
+
+def test_verify_crc():
+    assert (True, 0x0b02) == verify_crc(b'\x01\x06\x20\x08\x00\x04\x02\x0b')
+    assert (True, 0x0b02) == verify_crc(
+        memoryview(b'\x01\x06\x20\x08\x00\x04\x02\x0b'))
+    assert (False, 0x0b02) == verify_crc(b'\x01\x06\x20\x08\x00\x04\x0b\x02')
+    assert (False, 0xffff) == verify_crc(b'\x01')
+    assert (True, 0xffff) == verify_crc(b'\xff\xff')
@@ -4,6 +4,7 @@ import json, math
 import logging
 from infos import Register, ClrAtMidnight
 from infos import Infos, Fmt
+from value_store import HELD, PUBLISH
 
 def test_statistic_counter():
     i = Infos()
@@ -17,13 +18,13 @@ def test_statistic_counter():
     assert val == None or val == 0
 
     i.static_init()                # initialize counter
-    assert json.dumps(i.stat) == json.dumps({"proxy": {"Inverter_Cnt": 0, "Cloud_Conn_Cnt": 0, "Unknown_SNR": 0, "Unknown_Msg": 0, "Invalid_Data_Type": 0, "Internal_Error": 0,"Unknown_Ctrl": 0, "OTA_Start_Msg": 0, "SW_Exception": 0, "Invalid_Msg_Format": 0, "AT_Command": 0, "AT_Command_Blocked": 0, "DCU_Command": 0, "Modbus_Command": 0}})
+    assert json.dumps(i.stat) == json.dumps({"proxy": {"Inverter_Cnt": 0, "Cloud_Conn_Cnt": 0, "Unknown_SNR": 0, "Unknown_Msg": 0, "Invalid_Data_Type": 0, "Internal_Error": 0,"Unknown_Ctrl": 0, "OTA_Start_Msg": 0, "SW_Exception": 0, "Invalid_Msg_Format": 0, "AT_Command": 0, "AT_Command_Blocked": 0, "DCU_Command": 0, "Modbus_Command": 0, "Proc_Time_P99": 0, "Loop_Lag_P99": 0, "MQTT_Queue_Depth": 0, "MQTT_Latency_P99": 0, "Modbus_RTT_P99": 0}})
                                             
     val = i.dev_value(Register.INVERTER_CNT)  # valid and initiliazed addr
     assert val == 0
 
     i.inc_counter('Inverter_Cnt')
-    assert json.dumps(i.stat) == json.dumps({"proxy": {"Inverter_Cnt": 1, "Cloud_Conn_Cnt": 0, "Unknown_SNR": 0, "Unknown_Msg": 0, "Invalid_Data_Type": 0, "Internal_Error": 0,"Unknown_Ctrl": 0, "OTA_Start_Msg": 0, "SW_Exception": 0, "Invalid_Msg_Format": 0, "AT_Command": 0, "AT_Command_Blocked": 0, "DCU_Command": 0, "Modbus_Command": 0}})
+    assert json.dumps(i.stat) == json.dumps({"proxy": {"Inverter_Cnt": 1, "Cloud_Conn_Cnt": 0, "Unknown_SNR": 0, "Unknown_Msg": 0, "Invalid_Data_Type": 0, "Internal_Error": 0,"Unknown_Ctrl": 0, "OTA_Start_Msg": 0, "SW_Exception": 0, "Invalid_Msg_Format": 0, "AT_Command": 0, "AT_Command_Blocked": 0, "DCU_Command": 0, "Modbus_Command": 0, "Proc_Time_P99": 0, "Loop_Lag_P99": 0, "MQTT_Queue_Depth": 0, "MQTT_Latency_P99": 0, "Modbus_RTT_P99": 0}})
     val = i.dev_value(Register.INVERTER_CNT)
     assert val == 1
 
@@ -230,7 +231,7 @@ def test_update_value():
 
     keys = i.info_defs[Register.PV1_VOLTAGE]['name']
     _, update = i.update_db(keys, True, 30) 
-    assert update == True
+    assert update == PUBLISH
     assert 30 == i.get_db_value(Register.PV1_VOLTAGE, None)
 
     keys = i.info_defs[Register.PV1_VOLTAGE]['name']
@@ -240,9 +241,76 @@ def test_update_value():
 
     keys = i.info_defs[Register.PV1_VOLTAGE]['name']
     _, update = i.update_db(keys, False, 29) 
-    assert update == True
+    assert update == PUBLISH
     assert 29 == i.get_db_value(Register.PV1_VOLTAGE, None)
 
+def test_update_db_slot():
+    i = Infos()
+    slot = i.key_slot(['input', 'pv1', 'Voltage'])
+    assert slot == i.key_slot(('input', 'pv1', 'Voltage'))
+    assert i.update_db_slot(slot, True, 30)
+    assert 30 == i.get_db_value(Register.PV1_VOLTAGE, None)
+    assert not i.update_db_slot(slot, True, 30)
+    assert not i.update_db_slot(slot, True, 29)
+    assert i.update_db_slot(slot, False, 29)
+    assert 29 == i.get_db_value(Register.PV1_VOLTAGE, None)
+    slot = i.key_slot(['input', 'pv2', 'Voltage'])
+    assert not i.update_db_slot(slot, True, 0)
+    assert None == i.get_db_value(Register.PV2_VOLTAGE, None)
+    assert i.db == {'input': {'pv1': {'Voltage': 29}, 'pv2': {}}}
+
+def test_publish_filter(caplog):
+    i = Infos()
+    layout = Infos._Infos__layout
+    volt = i.key_slot(['grid', 'Voltage'])
+    freq = i.key_slot(['grid', 'Frequency'])
+    pv1 = i.key_slot(['input', 'pv1', 'Voltage'])
+    try:
+        Infos.set_publish_filter({
+            'grid.Voltage': {'deadband': 0.5},
+            'grid': {'min_interval': 10.0},
+            'unknown': {'deadband': 1.0},
+            'grid.Unknown': {'deadband': 1.0}})
+        assert layout.filters[volt] == (0.5, 10.0)
+        assert layout.filters[freq] == (0, 10.0)
+        assert pv1 not in layout.filters
+        assert 'unknown group "unknown"' in caplog.text
+        assert 'unknown register "grid.Unknown"' in caplog.text
+
+        # a held back change is still reported as update, but not published
+        assert i.update_db_slot(volt, False, 230.0) == PUBLISH
+        assert i.update_db_slot(volt, False, 230.1) == HELD
+        assert 230.1 == i.get_db_value(Register.GRID_VOLTAGE)
+
+        # default values bypass the filter
+        Infos.set_publish_filter({'controller': {'min_interval': 10.0}})
+        i.set_db_def_value(Register.POLLING_INTERVAL, 60)
+        i.set_db_def_value(Register.POLLING_INTERVAL, 120)
+        assert i.store.changed() == ['grid', 'controller']
+        assert 120 == i.get_db_value(Register.POLLING_INTERVAL)
+
+        Infos.set_publish_filter({'grid': {'deadband': 0}})
+        assert layout.filters == {}
+    finally:
+        layout.filters = {}
+
+def test_fmt_getter():
+    buf = b'\x01\x2c\xff\xfe' + b'abc\x00\x00\x00' + b'\x00\x00\x01\x00'
+    rows = [{'fmt': '!H'},
+            {'fmt': '!H', 'ratio': 0.01},
+            {'fmt': '!h', 'offset': -40},
+            {'fmt': '!H', 'quotient': 7},
+            {'fmt': '!H', 'func': Fmt.hex4},
+            {'fmt': '!L', 'ratio': 0.01, 'offset': 3}]
+    for row in rows:
+        get = Fmt.getter(row)
+        for idx in range(0, len(buf)):
+            # the compiled getter must return the same values
+            assert get(buf, idx) == Fmt.get_value(buf, idx, row)
+            assert get(memoryview(buf), idx) == Fmt.get_value(buf, idx, row)
+    assert Fmt.getter({'fmt': '!6s'})(buf, 4) == 'abc'
+    assert Fmt.getter(rows[0])(buf, len(buf)-1) == None  # buffer too short
+
 def test_key_obj():
     i = Infos()
     keys, level, unit, must_incr = i._key_obj(Register.PV1_VOLTAGE)
@@ -484,7 +484,7 @@ def test_parse_control(contr_data_seq):
     for key, result in i.parse (contr_data_seq, sensor=0x0e100000):
         pass  # side effect in calling i.parse()
 
-    assert json.dumps(i.db) == json.dumps(
+    assert json.dumps(i.db.to_dict()) == json.dumps(
 {"collector": {"Collector_Fw_Version": "RSW_400_V1.00.06", "Chip_Type": "Raymon", "Chip_Model": "RSW-1-10001", "Trace_URL": "t.raymoniot.com", "Logger_URL": "logger.talent-monitoring.com"}, "controller": {"Collect_Interval": 1, "Signal_Strength": 100, "Power_On_Time": 29, "Communication_Type": 1, "Connect_Count": 1, "Data_Up_Interval": 300}})        
 
 def test_parse_control2(contr2_data_seq):
@@ -492,7 +492,7 @@ def test_parse_control2(contr2_data_seq):
     for key, result in i.parse (contr2_data_seq, sensor=0x0e100000):
         pass  # side effect in calling i.parse()
 
-    assert json.dumps(i.db) == json.dumps(
+    assert json.dumps(i.db.to_dict()) == json.dumps(
 {"collector": {"Collector_Fw_Version": "RSW_400_V1.00.20", "Chip_Type": "Raymon", "Chip_Model": "RSW-1-10001", "Trace_URL": "t.raymoniot.com", "Logger_URL": "logger.talent-monitoring.com"}, "controller": {"Collect_Interval": 1, "Signal_Strength": 16, "Power_On_Time": 334, "Communication_Type": 1, "Connect_Count": 1, "Data_Up_Interval": 300}})
 
 def test_parse_control3(contr3_data_seq):
@@ -500,7 +500,7 @@ def test_parse_control3(contr3_data_seq):
     for key, result in i.parse (contr3_data_seq, sensor=0x0e100000):
         pass  # side effect in calling i.parse()
 
-    assert json.dumps(i.db) == json.dumps(
+    assert json.dumps(i.db.to_dict()) == json.dumps(
 {"collector": {"Collector_Fw_Version": "RSW_400_V2.01.13", "Chip_Type": "Raymon", "Chip_Model": "RSW-1-10001", "Trace_URL": "t.raymoniot.com", "Logger_URL": "logger.talent-monitoring.com"}, "controller": {"Collect_Interval": 1, "Signal_Strength": 98, "Power_On_Time": 335, "Communication_Type": 1, "Connect_Count": 1, "Data_Up_Interval": 300}})
 
 def test_parse_inverter(inv_data_seq):
@@ -508,7 +508,7 @@ def test_parse_inverter(inv_data_seq):
     for key, result in i.parse (inv_data_seq, sensor=0x01900001):
         pass  # side effect in calling i.parse()
 
-    assert json.dumps(i.db) == json.dumps(
+    assert json.dumps(i.db.to_dict()) == json.dumps(
 {"inverter": {"Product_Name": "Microinv", "Manufacturer": "TSUN", "Version": "V5.0.11", "Serial_Number": "T170000000000001", "Equipment_Model": "TSOL-MS600"}})
 
 def test_parse_cont_and_invert(contr_data_seq, inv_data_seq):
@@ -519,7 +519,7 @@ def test_parse_cont_and_invert(contr_data_seq, inv_data_seq):
     for key, result in i.parse (inv_data_seq, sensor=0x01900001):
         pass  # side effect in calling i.parse()
 
-    assert json.dumps(i.db) == json.dumps(
+    assert json.dumps(i.db.to_dict()) == json.dumps(
     {
 "collector": {"Collector_Fw_Version": "RSW_400_V1.00.06", "Chip_Type": "Raymon", "Chip_Model": "RSW-1-10001", "Trace_URL": "t.raymoniot.com", "Logger_URL": "logger.talent-monitoring.com"}, "controller": {"Collect_Interval": 1, "Signal_Strength": 100, "Power_On_Time": 29, "Communication_Type": 1, "Connect_Count": 1, "Data_Up_Interval": 300},
 "inverter": {"Product_Name": "Microinv", "Manufacturer": "TSUN", "Version": "V5.0.11", "Serial_Number": "T170000000000001", "Equipment_Model": "TSOL-MS600"}})
@@ -532,7 +532,7 @@ def test_parse_cont_and_invert2(contr3_data_seq, inv_data_seq3):
     for key, result in i.parse (inv_data_seq3, sensor=0x01900000):
         pass  # side effect in calling i.parse()
 
-    assert json.dumps(i.db) == json.dumps(
+    assert json.dumps(i.db.to_dict()) == json.dumps(
     {
 "collector": {"Collector_Fw_Version": "RSW_400_V2.01.13", "Chip_Type": "Raymon", "Chip_Model": "RSW-1-10001", "Trace_URL": "t.raymoniot.com", "Logger_URL": "logger.talent-monitoring.com"}, "controller": {"Collect_Interval": 1, "Signal_Strength": 98, "Power_On_Time": 335, "Communication_Type": 1, "Connect_Count": 1, "Data_Up_Interval": 300},
 "env": {"Inverter_Status": 0},
@@ -800,7 +800,28 @@ def test_invalid_data_type(invalid_data_seq):
 
     for key, result in i.parse (invalid_data_seq, sensor=0x01900001):
         pass  # side effect in calling i.parse()
-    assert json.dumps(i.db) == json.dumps({"inverter": {"Product_Name": "Microinv"}})
+    assert json.dumps(i.db.to_dict()) == json.dumps({"inverter": {"Product_Name": "Microinv"}})
 
     val = i.dev_value(Register.INVALID_DATA_TYPE)  # check invalid data type counter
     assert val == 1
+
+def test_skip_unmapped():
+    i = InfosG3()
+    # unmapped elements of all data types between mapped elements
+    msg  = b'\x00\x00\x00\x0a'
+    msg += b'\x00\x00\x00\x01\x54\x03abc'               # unmapped string
+    msg += b'\x00\x00\x00\x0a\x54\x08Microinv'          # Product_Name
+    msg += b'\x00\x00\x00\x02\x42\x01'                  # unmapped byte
+    msg += b'\x00\x00\x00\x03\x49\x00\x00\x00\x01'      # unmapped int32
+    msg += b'\x00\x00\x00\x04\x46\x3f\x80\x00\x00'      # unmapped float
+    msg += b'\x00\x00\x00\x05\x4c' + bytes(8)           # unmapped int64
+    msg += b'\x00\x00\x00\x06\x41'                      # Nop
+    msg += b'\x00\x00\x05\x14\x46\x43\x61\xe6\x66'      # Grid Voltage
+    msg += b'\x00\x00\x00\x00\x00'                      # Nul -> end
+    msg += b'\x00\x00\x05\x78\x53\x00\x10'              # behind the end
+    keys = [key for key, _ in i.parse(msg, sensor=0x01900000)]
+    assert keys == ['inverter', 'grid']
+    assert i.get_db_value(Register.PRODUCT_NAME) == 'Microinv'
+    assert i.get_db_value(Register.GRID_VOLTAGE) == 225.9
+    assert i.get_db_value(Register.GRID_CURRENT) is None
+    assert 0x00000001 not in i._InfosG3__plans[0x01900000]
@@ -115,7 +115,7 @@ def inverter_1097_data():  # 0x4210 ftype: 0x01
 def test_default_db():
     i = InfosG3P(client_mode=False)
     
-    assert json.dumps(i.db) == json.dumps({
+    assert json.dumps(i.db.to_dict()) == json.dumps({
         "inverter": {"Manufacturer": "TSUN", "Equipment_Model": "TSOL-MSxx00"}, 
         "collector": {"Chip_Type": "IGEN TECH"},
         })
@@ -126,7 +126,7 @@ def test_parse_4110(str_test_ip, device_data: bytes):
     for key, update in i.parse (device_data, 0x41, 2):
         pass  # side effect is calling generator i.parse()
 
-    assert json.dumps(i.db) == json.dumps({
+    assert json.dumps(i.db.to_dict()) == json.dumps({
         'controller': {"Data_Up_Interval": 300, "Collect_Interval": 1, "Heartbeat_Interval": 120, "Signal_Strength": 100, "IP_Address": str_test_ip, "Sensor_List": "02b0", "WiFi_SSID": "Allius-Home"},
         'collector': {"Chip_Model": "LSW5BLE_17_02B0_1.05", "MAC-Addr": "40:2a:8f:4f:51:54", "Collector_Fw_Version": "V1.1.00.0B"},
         })
@@ -149,7 +149,7 @@ def test_parse_4210_02b0(inverter_data: bytes):
     for key, update in i.parse (inverter_data, 0x42, 1, 0x02b0):
         pass  #  side effect is calling generator i.parse()
 
-    assert json.dumps(i.db) == json.dumps({
+    assert json.dumps(i.db.to_dict()) == json.dumps({
          "controller": {"Sensor_List": "02b0", "Power_On_Time": 2051}, 
          "inverter": {"Serial_Number": "Y17E00000000000E", "Version": "V4.0.10", "Rated_Power": 600, "BOOT_STATUS": 0, "DSP_STATUS": 21930, "Work_Mode": 0, "Max_Designed_Power": 2000, "Input_Coefficient": 100.0, "Country": 6, "Output_Coefficient": 100.0}, 
          "env": {"Inverter_Status": 1, "Detect_Status_1": 2, "Detect_Status_2": 0, "Inverter_Temp": 14}, 
@@ -171,7 +171,7 @@ def test_parse_4210_3026(batterie_data: bytes):
     for key, update in i.parse (batterie_data, 0x42, 1, 0x3026):
         pass  #  side effect is calling generator i.parse()
 
-    assert json.dumps(i.db) == json.dumps({
+    assert json.dumps(i.db.to_dict()) == json.dumps({
          "controller": {"Sensor_List": "3026", "Power_On_Time": 4684},
          "inverter": {"Serial_Number": "4101240701490314"}, 
          "batterie": {"pv1": {"Voltage": 33.86, "Current": 1.12, "MPPT-Status": 0}, 
@@ -190,7 +190,7 @@ def test_parse_4210_3026_prod(batterie_data1: bytes):
     for key, update in i.parse (batterie_data1, 0x42, 1, 0x3026):
         pass  #  side effect is calling generator i.parse()
 
-    assert json.dumps(i.db) == json.dumps({
+    assert json.dumps(i.db.to_dict()) == json.dumps({
          "controller": {"Sensor_List": "3026", "Power_On_Time": 4684},
          "inverter": {"Serial_Number": "4101240701490314"}, 
          "batterie": {"pv1": {"Voltage": 33.86, "Current": 1.12, "MPPT-Status": 0}, 
@@ -209,7 +209,7 @@ def test_parse_4210_3026_incomplete(batterie_data2: bytes):
     for key, update in i.parse (batterie_data2, 0x42, 1, 0x3026):
         pass  #  side effect is calling generator i.parse()
 
-    assert json.dumps(i.db) == json.dumps({
+    assert json.dumps(i.db.to_dict()) == json.dumps({
          "controller": {"Sensor_List": "3026", "Power_On_Time": 4684},
          "inverter": {"Serial_Number": "4101240701490314"}, 
          "batterie": {"pv1": {"Voltage": 33.86, "Current": 1.12, "MPPT-Status": 0}, 
@@ -248,6 +248,35 @@ def test_build_4210_1097(inverter_1097_data: bytes):
         build_msg[i] = inverter_1097_data[i]
     assert inverter_1097_data == build_msg    
 
+def test_parse_plan(inverter_data: bytes, inverter_1097_data: bytes):
+    InfosG3P.reset_plans()
+    i = InfosG3P(client_mode=False)
+    plan = i._InfosG3P__compile_plan(0x02b0, 0x42, 1)
+    # only the rows of the 0x4210 frame with a db key, sorted by offset
+    ofs = [entry[0] for entry in plan]
+    assert ofs == sorted(ofs)
+    assert ofs[0] == 0x0c
+    assert 0xffff02 & 0xffff not in ofs    # POLLING_INTERVAL has no format
+    assert 0x011c not in ofs               # const entry without register
+    assert plan[0][3] == 'controller'
+    assert i._InfosG3P__plans[(0x02b0, 0x42, 1)] is plan
+
+    # the values behind the frame end of 0x1097 are skipped
+    i.db.clear()
+    keys = [key for key, update in i.parse(inverter_1097_data, 0x42, 1,
+                                           0x1097)]
+    assert keys == ['controller', 'controller', 'inverter']
+    assert i.get_db_value(Register.PV1_VOLTAGE) is None
+
+    # the cached plan decodes like the first run
+    for _ in range(2):
+        i.db.clear()
+        for key, update in i.parse(inverter_data, 0x42, 1, 0x02b0):
+            pass
+        assert 14 == i.get_db_value(Register.INVERTER_TEMP, 0)
+    assert len(i._InfosG3P__plans) == 2
+
+
 def test_build_ha_conf1():
     i = InfosG3P(client_mode=False)
     i.static_init()                # initialize counter
@@ -488,6 +517,33 @@ def test_build_ha_conf6():
 
     assert tests==6
 
+def test_ha_conf_cache():
+    i = InfosG3P(client_mode=False)
+    i.static_init()                # initialize counter
+    i.set_db_def_value(Register.SENSOR_LIST, "02b0")
+    i.set_db_def_value(Register.NO_INPUTS, 2)
+
+    def ha_confs(sug_area=''):
+        return {res[3]: res for res in i.ha_confs(ha_prfx="tsun/", node_id="garagendach/", snr='123', sug_area=sug_area)}
+
+    first = ha_confs()
+    second = ha_confs()
+    assert first == second
+    # unchanged entities return the cached payload
+    assert second['out_power_123'] is first['out_power_123']
+    assert second['power_pv1_123'] is first['power_pv1_123']
+
+    # a changed device value rebuilds only the entities of the device
+    i.set_db_def_value(Register.VERSION, 'V5.1.0E')
+    third = ha_confs()
+    assert json.loads(third['out_power_123'][0])['dev']['sw'] == 'V5.1.0E'
+    assert third['out_power_123'] is not first['out_power_123']
+    assert third['power_pv1_123'] is first['power_pv1_123']
+
+    # other arguments rebuild the payload
+    fourth = ha_confs(sug_area='roof')
+    assert json.loads(fourth['power_pv1_123'][0])['dev']['name'] == 'Module PV1 - roof'
+
 def test_exception_and_calc(inverter_data: bytes):
 
     # patch table to convert temperature from °F to °C
@@ -499,6 +555,7 @@ def test_exception_and_calc(inverter_data: bytes):
     # set invalid maping entry for OUTPUT_POWER (string instead of dict type) 
     backup = RegisterMap.map_02b0[0x420100de]
     RegisterMap.map_02b0[0x420100de] = 'invalid_entry'
+    InfosG3P.reset_plans()
 
     i = InfosG3P(client_mode=False)
     i.db.clear()
@@ -516,6 +573,7 @@ def test_exception_and_calc(inverter_data: bytes):
     # remove a table entry and test parsing and building
     del RegisterMap.map_02b0[0x420100d8]['quotient']
     del RegisterMap.map_02b0[0x420100d8]['offset']
+    InfosG3P.reset_plans()
 
     i.db.clear()
     
@@ -532,6 +590,7 @@ def test_exception_and_calc(inverter_data: bytes):
     RegisterMap.map_02b0[0x420100d8]['offset'] = ofs
     RegisterMap.map_02b0[0x420100e0]['reg'] = Register.PV1_VOLTAGE # reset mapping
     RegisterMap.map_02b0[0x420100de] = backup # reset mapping
+    InfosG3P.reset_plans()
 
     # test orginial table 
     i.db.clear()    
@@ -4,7 +4,8 @@ import asyncio
 
 from mock import patch
 from enum import Enum
-from infos import Infos
+from infos import Infos, Register
+from mqtt import Mqtt
 from cnf.config import Config
 from proxy import Proxy
 from inverter_base import InverterBase
@@ -165,6 +166,52 @@ async def test_mqtt_publish(my_loop, config_conn, patch_open_connection):
         await inverter.async_publ_mqtt()
         assert Infos.new_stat_data['proxy'] == False
 
+@pytest.mark.asyncio(loop_scope="module")
+async def test_mqtt_ha_discovery(my_loop, config_conn, patch_open_connection):
+    _ = config_conn
+    _ = patch_open_connection
+    assert asyncio.get_running_loop()
+    topics = []
+
+    async def new_publish(self, topic, payload, on_sent=None):
+        topics.append(topic)
+        if on_sent:
+            on_sent()
+
+    Proxy.class_init()
+
+    with patch.object(Mqtt, 'publish', new_publish), \
+         InverterG3P(FakeReader(), FakeWriter(), client_mode=False) as inverter:
+        stream = inverter.local.stream
+        stream._set_serial_no(snr= 123344)
+        stream.db.set_db_def_value(Register.SENSOR_LIST, "02b0")
+
+        stream.new_data['inverter'] = True
+        stream.db.db['inverter'] = {}
+        await inverter.async_publ_mqtt()
+        discovery = [topic for topic in topics if topic.endswith('/config')]
+        assert len(discovery) > 0
+
+        # unchanged discovery payloads are not published again
+        topics.clear()
+        stream.new_data['inverter'] = True
+        await inverter.async_publ_mqtt()
+        assert [topic for topic in topics if topic.endswith('/config')] == []
+
+        # only the entities of a changed device are published again
+        topics.clear()
+        stream.new_data['inverter'] = True
+        stream.db.set_db_def_value(Register.VERSION, 'V5.1.0E')
+        await inverter.async_publ_mqtt()
+        changed = [topic for topic in topics if topic.endswith('/config')]
+        assert 0 < len(changed) < len(discovery)
+
+        # after a restart of home assistant all entities are published
+        topics.clear()
+        inverter.mqtt.ha_restarts += 1
+        await inverter.async_publ_mqtt()
+        assert len([topic for topic in topics if topic.endswith('/config')]) >= len(discovery)
+
 @pytest.mark.asyncio(loop_scope="module")
 async def test_mqtt_err(my_loop, config_conn, patch_open_connection, patch_mqtt_err):
     _ = config_conn
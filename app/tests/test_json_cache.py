@@ -0,0 +1,86 @@
+# test_with_pytest.py
+import json
+import math
+import pytest
+import json_cache
+from json_cache import JsonCache
+
+
+def test_encode():
+    cache = JsonCache()
+    data = {'Voltage': 230.1, 'pv1': {'Voltage': 33.5, 'Current': 1.2},
+            'Status': 'ok', 'Cnt': 1}
+    assert cache.encode('grid', data) == json.dumps(data)
+    assert cache.encode('grid', {}) == json.dumps({})
+    assert cache.encode('grid', data) == json.dumps(data)
+
+
+def test_reuse(monkeypatch):
+    calls = []
+
+    def dumps(obj):
+        calls.append(obj)
+        return json.dumps(obj)
+    monkeypatch.setattr(json_cache, 'dumps', dumps)
+
+    cache = JsonCache()
+    data = {'Voltage': 230.1, 'pv1': {'Voltage': 33.5}, 'Cnt': 1}
+    assert cache.encode('grid', data) == json.dumps(data)
+    assert len(calls) == 3
+
+    # only the changed members are encoded again
+    calls.clear()
+    data = {'Voltage': 230.1, 'pv1': {'Voltage': 33.6}, 'Cnt': 1}
+    assert cache.encode('grid', data) == json.dumps(data)
+    assert calls == [{'Voltage': 33.6}]
+
+    # a changed type is encoded again, even if the value is equal
+    calls.clear()
+    data = {'Voltage': 230.1, 'pv1': {'Voltage': 33.6}, 'Cnt': 1.0}
+    assert cache.encode('grid', data) == json.dumps(data)
+    assert calls == [1.0]
+
+    # the members are cached per key
+    calls.clear()
+    assert cache.encode('input', data) == json.dumps(data)
+    assert len(calls) == 3
+    cache.clear()
+    calls.clear()
+    assert cache.encode('grid', data) == json.dumps(data)
+    assert len(calls) == 3
+
+
+class FakeOrjson:
+    '''simulates the encoding differences of orjson to json.dumps()'''
+    @staticmethod
+    def dumps(obj) -> bytes:
+        if isinstance(obj, float):
+            if not math.isfinite(obj):
+                return b'null'
+            return repr(obj).replace('e+', 'e').replace('e-0', 'e-').encode()
+        return json.dumps(obj, ensure_ascii=False,
+                          separators=(',', ':')).encode()
+
+
+@pytest.fixture(params=['fake', 'orjson'])
+def orjson_dumps(request, monkeypatch):
+    if request.param == 'fake':
+        monkeypatch.setattr(json_cache, 'orjson', FakeOrjson)
+    elif json_cache.orjson is None:
+        pytest.skip('orjson is not installed')
+    monkeypatch.setattr(json_cache, 'dumps', json_cache._dumps_orjson)
+    return json_cache._dumps_orjson
+
+
+def test_orjson_path(orjson_dumps):
+    values = [230.1, 0.0, -0.0, 1e-5, 1e16, 123456789012345.6,
+              float('nan'), float('inf'), 1, -5, 2**64, True, False, None,
+              'ok', 'Grüße', 'a"b\\c', 'tab\t', '\x7f',
+              {'Voltage': 33.5, 'Current': 1.2}, [1, 2.5, 'x'], {}]
+    for value in values:
+        assert orjson_dumps(value) == json.dumps(value)
+
+    cache = JsonCache()
+    data = {'Voltage': 230.1, 'pv1': {'Voltage': 33.5, 'Current': 1.2},
+            'Status': 'Grüße', 'Cnt': 1, 'List': [1, 2]}
+    assert cache.encode('grid', data) == json.dumps(data)
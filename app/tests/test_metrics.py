@@ -0,0 +1,219 @@
+# test_with_pytest.py
+import pytest
+import asyncio
+
+from infos import Infos
+from metrics import Histogram, Metrics
+from publish_queue import PublishQueue
+from mqtt_spool import MqttSpool
+from modbus import Modbus
+from async_stream import AsyncStreamServer, StreamPtr
+
+from test_modbus_tcp import FakeReader, FakeWriter
+
+pytest_plugins = ('pytest_asyncio',)
+
+# initialize the proxy statistics
+Infos.static_init()
+
+
+@pytest.fixture
+def metrics():
+    proc_time, loop_lag = Metrics.proc_time, Metrics.loop_lag
+    mqtt_latency, mqtt_queue = Metrics.mqtt_latency, Metrics.mqtt_queue
+    Metrics.proc_time = Histogram()
+    Metrics.loop_lag = Histogram()
+    Metrics.mqtt_latency = Histogram()
+    Metrics.mqtt_queue = None
+    mqtt_spool, Metrics.mqtt_spool = Metrics.mqtt_spool, None
+    modbus_rtt, Metrics.modbus_rtt = Metrics.modbus_rtt, Histogram()
+    Metrics._Metrics__rtt_snap = None
+    Metrics._Metrics__proc_snap = None
+    Metrics._Metrics__lag_snap = None
+    Metrics._Metrics__mqtt_snap = None
+    yield Metrics
+    Metrics.stop()
+    Metrics.proc_time, Metrics.loop_lag = proc_time, loop_lag
+    Metrics.mqtt_latency, Metrics.mqtt_queue = mqtt_latency, mqtt_queue
+    Metrics.mqtt_spool = mqtt_spool
+    Metrics.modbus_rtt = modbus_rtt
+
+
+def test_histogram():
+    hist = Histogram((0.1, 1.0))
+    assert hist.count == 0
+    assert hist.quantile(0.99) == 0.0
+
+    hist.observe(0.05)
+    hist.observe(0.1)     # upper bound is inclusive
+    hist.observe(0.5)
+    hist.observe(2.0)
+    assert hist.counts == [2, 1, 1]
+    assert hist.count == 4
+    assert hist.sum == pytest.approx(2.65)
+    assert hist.max == 2.0
+
+    assert hist.quantile(0.25) == pytest.approx(0.05)
+    assert hist.quantile(0.5) == pytest.approx(0.1)
+    assert hist.quantile(0.75) == pytest.approx(1.0)
+    assert hist.quantile(1.0) == 2.0     # +Inf bucket returns the max
+
+
+def test_histogram_since():
+    hist = Histogram((0.1, 1.0))
+    for _ in range(100):
+        hist.observe(0.01)
+    snap = hist.snapshot()
+    hist.observe(0.5)
+    assert hist.quantile(0.99) == pytest.approx(0.09999)
+    assert hist.quantile(0.99, snap) == pytest.approx(0.991)
+    assert hist.snapshot() != snap
+
+
+def test_histogram_prometheus():
+    hist = Histogram((0.1, 1.0))
+    hist.observe(0.05)
+    hist.observe(2.0)
+    assert hist.prometheus('t') == [
+        't_bucket{le="0.1"} 1',
+        't_bucket{le="1.0"} 1',
+        't_bucket{le="+Inf"} 2',
+        't_sum 2.050000',
+        't_count 2']
+    assert hist.prometheus('t', 'a="1"')[0] == 't_bucket{a="1",le="0.1"} 1'
+    assert hist.prometheus('t', 'a="1"')[-1] == 't_count{a="1"} 2'
+
+
+def test_update_stat(metrics):
+    Infos.new_stat_data['proxy'] = False
+    metrics.update_stat()
+    assert Infos.stat['proxy']['Proc_Time_P99'] == 0
+    assert Infos.stat['proxy']['Loop_Lag_P99'] == 0
+    assert not Infos.new_stat_data['proxy']
+
+    for _ in range(100):
+        metrics.proc_time.observe(0.002)
+    metrics.loop_lag.observe(0.3)
+    metrics.update_stat()
+    assert Infos.stat['proxy']['Proc_Time_P99'] == 2
+    assert Infos.stat['proxy']['Loop_Lag_P99'] == 498
+    assert Infos.new_stat_data['proxy']
+
+    # the next interval starts with empty histograms
+    Infos.new_stat_data['proxy'] = False
+    metrics.update_stat()
+    assert Infos.stat['proxy']['Proc_Time_P99'] == 0
+    assert Infos.stat['proxy']['Loop_Lag_P99'] == 0
+    assert Infos.new_stat_data['proxy']
+
+
+
+@pytest.mark.asyncio
+async def test_mqtt_stat(metrics):
+    queue = PublishQueue()
+    metrics.mqtt_queue = queue
+    await queue.put('tsun/inv_1/grid', '{}')
+    await queue.put('tsun/inv_1/input', '{}')
+    await queue.get_batch(2)
+    for _ in range(100):
+        metrics.mqtt_latency.observe(0.02)
+    Infos.new_stat_data['proxy'] = False
+    metrics.update_stat()
+    assert Infos.stat['proxy']['MQTT_Latency_P99'] == 25
+    assert Infos.stat['proxy']['MQTT_Queue_Depth'] == 2
+    assert Infos.new_stat_data['proxy']
+
+    text = metrics.prometheus()
+    assert 'tsun_proxy_mqtt_publish_seconds_count 100\n' in text
+    assert 'tsun_proxy_mqtt_queue_depth 0\n' in text
+    assert 'tsun_proxy_mqtt_queue_total{result="queued"} 2\n' in text
+    assert 'tsun_proxy_mqtt_spool_depth' not in text
+
+    spool = MqttSpool(10)
+    spool.put('tsun/inv_1/grid', '{}')
+    metrics.mqtt_spool = spool
+    text = metrics.prometheus()
+    assert 'tsun_proxy_mqtt_spool_depth 1\n' in text
+    assert 'tsun_proxy_mqtt_spool_total{result="spooled"} 1\n' in text
+
+    # the next interval starts with the actual queue depth
+    metrics.update_stat()
+    assert Infos.stat['proxy']['MQTT_Latency_P99'] == 0
+    assert Infos.stat['proxy']['MQTT_Queue_Depth'] == 0
+
+
+@pytest.mark.asyncio
+async def test_lag_probe(metrics):
+    metrics.LAG_INTERVAL = 0.01
+    metrics.STAT_INTERVAL = 0
+    try:
+        metrics.start()
+        task = metrics.lag_task
+        metrics.start()       # a second start is ignored
+        assert task == metrics.lag_task
+        await asyncio.sleep(0.015)
+        await asyncio.sleep(0.015)
+        assert metrics.loop_lag.count >= 1
+        metrics.stop()
+        assert metrics.lag_task is None
+        await asyncio.sleep(0)
+        assert task.cancelled()
+    finally:
+        del metrics.LAG_INTERVAL
+        del metrics.STAT_INTERVAL
+
+
+def test_conn_proc_time(metrics):
+    ifc = AsyncStreamServer(FakeReader(), FakeWriter(), None, None,
+                            StreamPtr(None))
+    ifc.node_id = 'inv_1/'
+    ifc.proc_start = 1.0
+    ifc._AsyncStream__calc_proc_time()
+    assert ifc.proc_start is None
+    assert ifc.proc_hist.count == 1
+    assert metrics.proc_time.count == 1
+
+    ifc._AsyncStream__calc_proc_time()   # nothing to measure
+    assert ifc.proc_hist.count == 1
+
+    text = metrics.prometheus([('local', ifc)])
+    assert '# TYPE tsun_proxy_proc_seconds histogram' in text
+    assert 'tsun_proxy_proc_seconds_count 1\n' in text
+    assert 'tsun_proxy_loop_lag_seconds_count 0\n' in text
+    assert (f'tsun_proxy_conn_proc_seconds_count{{node="inv_1/",'
+            f'conn="{ifc.conn_no}",side="local"}} 1\n') in text
+    assert 'tsun_proxy_stat{name="Inverter_Cnt"} 0\n' in text
+    assert 'tsun_proxy_publisher_total{result="notified"}' in text
+    ifc.close()
+
+
+@pytest.mark.asyncio
+async def test_modbus_queue(metrics):
+    mb = Modbus(lambda pdu, log_lvl, state: None)
+    mb.build_msg(1, 3, 0x3000, 48, prio=Modbus.PRIO_POLL, max_age=10)
+    text = metrics.prometheus(mbs=[('inv_1/', mb)])
+    assert 'tsun_proxy_modbus_queue_total{node="inv_1/",prio="poll",' \
+        'result="sent"} 1\n' in text
+    assert 'tsun_proxy_modbus_queue_wait_seconds_count{node="inv_1/",' \
+        'prio="poll"} 1\n' in text
+    assert 'tsun_proxy_modbus_cache_total{node="inv_1/",result="hit"} 0\n' \
+        in text
+    mb.close()
+
+
+@pytest.mark.asyncio
+async def test_modbus_rtt(metrics):
+    mb = Modbus(lambda pdu, log_lvl, state: None)
+    for _ in range(100):
+        mb._Modbus__measure_rtt(0.3)
+    assert metrics.modbus_rtt.count == 100
+    Infos.new_stat_data['proxy'] = False
+    metrics.update_stat()
+    assert Infos.stat['proxy']['Modbus_RTT_P99'] == 498
+    assert Infos.new_stat_data['proxy']
+
+    text = metrics.prometheus(mbs=[('inv_1/', mb)])
+    assert 'tsun_proxy_modbus_rtt_seconds_count{node="inv_1/"} 100\n' in text
+    metrics.update_stat()
+    assert Infos.stat['proxy']['Modbus_RTT_P99'] == 0
+    mb.close()
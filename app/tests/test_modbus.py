@@ -210,6 +210,45 @@ async def test_parse_resp():
     assert mb.que.qsize() == 0
     assert not mb.req_pend
 
+@pytest.mark.asyncio(loop_scope="module")
+async def test_parse_resp_plan():
+    '''The decode plan is compiled once per register range'''
+    plans = Modbus._Modbus__plans
+    plans.pop((0x3007, 6), None)
+    rsp = b'\x01\x03\x0c\x01\x2c\x00\x2c\x00\x2c\x00\x46\x00\x46\x00\x46\x32\xc8'
+    mb = ModbusTestHelper()
+    mb.set_node_id('test')
+    mb.build_msg(1,3,0x3007,6)
+    res1 = list(mb.recv_resp(mb.db, rsp))
+    plan = plans[(0x3007, 6)]
+    assert 5 == len(plan)
+    assert 5 == plan[0][0]       # offset of the first mapped register 0x3008
+
+    mb.build_msg(1,3,0x3007,6)
+    res2 = list(mb.recv_resp(mb.db, rsp))
+    assert plan is plans[(0x3007, 6)]
+    assert [(key, val) for key, _, val in res1] == [(key, val) for key, _, val in res2]
+    assert all(update for _, update, _ in res1)
+    assert not any(update for _, update, _ in res2)
+
+def test_plan_cache_limit(monkeypatch):
+    '''The number of cached decode plans is limited'''
+    monkeypatch.setattr(Modbus, 'MAX_PLANS', 4)
+    plans = Modbus._Modbus__plans
+    saved = dict(plans)
+    plans.clear()
+    try:
+        db = Infos()
+        for reg in range(0x3000, 0x3006):
+            Modbus._Modbus__compile_plan(db, reg, 2)
+        assert len(plans) == 4
+        # the oldest plans were dropped
+        assert list(plans) == [(0x3002, 2), (0x3003, 2), (0x3004, 2),
+                               (0x3005, 2)]
+    finally:
+        plans.clear()
+        plans.update(saved)
+
 @pytest.mark.asyncio(loop_scope="module")
 async def test_queue():
     mb = ModbusTestHelper()
@@ -336,6 +375,19 @@ async def test_queue3():
     assert mb.que.qsize() == 0
     assert not mb.req_pend
 
+def test_max_retries():
+    '''The retry counters follow the configured max retransmissions'''
+    mb = ModbusTestHelper()
+    assert mb.max_retries == Modbus.MAX_RETRIES
+    assert mb.counter['retries'] == {'0': 0, '1': 0}
+    mb.counter['retries']['1'] = 2
+    mb.max_retries = 3
+    assert mb.counter['retries'] == {'0': 0, '1': 2, '2': 0, '3': 0}
+    mb.max_retries = 0
+    assert mb.max_retries == 0
+    assert mb.counter['retries'] == {'0': 0, '1': 2, '2': 0, '3': 0}
+    mb.close()
+
 @pytest.mark.asyncio(loop_scope="module")
 async def test_timeout(my_loop):
     '''Test MODBUS response timeout and RTU retransmitting'''
@@ -417,3 +469,140 @@ async def test_close():
     mb.close()
     assert mb.que.qsize() == 0
     assert mb.que.empty() == True 
+
+def test_plan_reads():
+    '''Overlapping and adjacent ranges are merged into one read request'''
+    regs = [{'addr': 0x3010, 'len': 0x10}, {'addr': 0x3000, 'len': 0x10},
+            {'addr': 0x2000, 'len': 0x20}, {'addr': 0x3018, 'len': 0x10}]
+    assert Modbus.plan_reads(regs) == [{'addr': 0x3000, 'len': 0x28},
+                                       {'addr': 0x2000, 'len': 0x20}]
+    # the max length limits the merging
+    assert Modbus.plan_reads(regs, max_len=0x20) == [
+        {'addr': 0x3000, 'len': 0x20}, {'addr': 0x2000, 'len': 0x20},
+        {'addr': 0x3018, 'len': 0x10}]
+    # ranges with a gap are only merged with a max_gap
+    regs = [{'addr': 0x1100, 'len': 0x10}, {'addr': 0x1120, 'len': 0x10}]
+    assert Modbus.plan_reads(regs) == regs
+    assert Modbus.plan_reads(regs, max_gap=0x10) == [
+        {'addr': 0x1100, 'len': 0x30}]
+    assert Modbus.plan_reads([]) == []
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_parse_merged_resp():
+    '''The response of a merged read is decoded like the single reads'''
+    regs = [{'addr': 0x3007, 'len': 3}, {'addr': 0x300a, 'len': 3}]
+    merged = Modbus.plan_reads(regs)
+    assert merged == [{'addr': 0x3007, 'len': 6}]
+
+    mb = ModbusTestHelper()
+    mb.set_node_id('test')
+    mb.build_msg(1, 3, merged[0]['addr'], merged[0]['len'])
+    res = list(mb.recv_resp(mb.db, b'\x01\x03\x0c\x01\x2c\x00\x2c\x00\x2c\x00\x46\x00\x46\x00\x46\x32\xc8'))
+    assert 0 == mb.err
+    assert [val for _, _, val in res] == ['V0.0.2C', 4.4, 0.7, 0.7, 30]
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_queue_prio():
+    '''A command is sent before the queued polling reads'''
+    mb = ModbusTestHelper()
+    mb.build_msg(1,3,0x3007,6, prio=Modbus.PRIO_POLL, max_age=10)
+    mb.build_msg(1,3,0x2000,96, prio=Modbus.PRIO_SLOW, max_age=10)
+    mb.build_msg(1,3,0x2000,96, prio=Modbus.PRIO_SLOW, max_age=10)  # deduped
+    mb.build_msg(1,6,0x2008,4)
+    assert mb.que.qsize() == 2
+    assert mb.send_calls == 1
+
+    for key, update, val in mb.recv_resp(mb.db, b'\x01\x03\x0c\x01\x2c\x00\x2c\x00\x2c\x00\x46\x00\x46\x00\x46\x32\xc8'):
+        pass
+    assert mb.send_calls == 2
+    assert mb.pdu == b'\x01\x06\x20\x08\x00\x04\x02\x0b'
+    assert mb.que.counter['slow']['deduped'] == 1
+    mb.close()
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_rtt_timeout():
+    '''The response timeout adapts to the measured round-trip times'''
+    mb = ModbusTestHelper()
+    mb.timeout = 8
+    assert mb.resp_timeout() == 8          # no measurement yet
+    mb.set_node_id('test')
+    mb.build_msg(1,3,0x3007,6)
+    mb.send_ts -= 0.3                      # response after 300ms
+    for _ in mb.recv_resp(mb.db, b'\x01\x03\x0c\x01\x2c\x00\x2c\x00\x2c\x00\x46\x00\x46\x00\x46\x32\xc8'):
+        pass
+    assert 0 == mb.err
+    assert mb.srtt == pytest.approx(0.3, abs=0.01)
+    assert mb.resp_timeout() == pytest.approx(0.9, abs=0.03)
+    rtt = mb.counter['rtt']
+    assert 290 <= rtt['srtt'] <= 310
+    assert 250 <= rtt['p50'] <= 500
+    assert rtt['rto'] == pytest.approx(900, abs=30)
+
+    # constant round-trip times reduce the variation
+    for _ in range(20):
+        mb._Modbus__measure_rtt(0.3)
+    assert mb.resp_timeout() == pytest.approx(0.5, abs=0.01)  # MIN_TIMEOUT
+    # exponential backoff for retransmissions, limited by the timeout
+    mb.retry_cnt = 1
+    assert mb.resp_timeout() == pytest.approx(1.0, abs=0.02)
+    mb.retry_cnt = 6
+    assert mb.resp_timeout() == 8
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_rtt_karn(my_loop):
+    '''The round-trip time of a retransmitted request isn't measured'''
+    mb = ModbusTestHelper()
+    mb.timeout = 0.05
+    mb.set_node_id('test')
+    mb.build_msg(1,3,0x3007,6)
+    await asyncio.sleep(0.06)              # timeout and retransmission
+    assert mb.retry_cnt == 1
+    for _ in mb.recv_resp(mb.db, b'\x01\x03\x0c\x01\x2c\x00\x2c\x00\x2c\x00\x46\x00\x46\x00\x46\x32\xc8'):
+        pass
+    assert 0 == mb.err
+    assert mb.srtt is None
+    assert mb.rtt_hist.count == 0
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_reg_cache():
+    '''Read requests are answered from the register cache'''
+    rsp = b'\x01\x03\x0c\x01\x2c\x00\x2c\x00\x2c\x00\x46\x00\x46\x00\x46\x32\xc8'
+    mb = ModbusTestHelper()
+    mb.set_node_id('test')
+    mb.build_msg(1,3,0x3007,6)
+    for _ in mb.recv_resp(mb.db, rsp):
+        pass
+    assert mb.reg_cache == {}              # the cache is disabled
+    assert mb.read_cache(3, 0x3007, 6) is None
+    assert mb.counter['cache'] == {'hit': 0, 'miss': 0}
+
+    mb.cache_age = 10
+    mb.build_msg(1,3,0x3007,6)
+    for _ in mb.recv_resp(mb.db, rsp):
+        pass
+    assert len(mb.reg_cache) == 6
+    mb.db.set_db_def_value(Register.GRID_VOLTAGE, 0)
+    assert mb.read_cache(3, 0x3008, 2) == [0x2c, 0x2c]
+    # the db isn't updated by a cached answer
+    assert mb.db.get_db_value(Register.GRID_VOLTAGE) == 0
+    assert mb.counter['cache'] == {'hit': 1, 'miss': 0}
+    assert mb.send_calls == 2
+
+    assert mb.read_cache(3, 0x3007, 7) is None   # 0x300d not cached
+    assert mb.read_cache(4, 0x3007, 6) is None   # input registers
+    assert mb.counter['cache'] == {'hit': 1, 'miss': 2}
+    assert mb.read_cache(3, 0x3008, 0) is None   # invalid count
+    assert mb.read_cache(3, 0x3008, -1) is None
+    assert mb.counter['cache'] == {'hit': 1, 'miss': 2}
+
+    # a write request invalidates the register
+    mb.build_msg(1,6,0x3008,4)
+    assert mb.read_cache(3, 0x3008, 2) is None
+    assert mb.read_cache(3, 0x3009, 2) is not None
+
+    # stale registers
+    mb.cache_age = 0.001
+    await asyncio.sleep(0.01)
+    assert mb.read_cache(3, 0x3009, 2) is None
+    assert mb.counter['cache'] == {'hit': 2, 'miss': 4}
+    mb.close()
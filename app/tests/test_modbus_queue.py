@@ -0,0 +1,86 @@
+# test_with_pytest.py
+import time
+import asyncio
+import pytest
+
+from modbus_queue import ModbusQueue
+
+READ_3000 = b'\x01\x03\x30\x00\x00\x30\x4a\xde'
+READ_2000 = b'\x01\x03\x20\x00\x00\x60\x4e\x22'
+WRITE_2008 = b'\x01\x06\x20\x08\x00\x04\x02\x0b'
+
+
+def item(req, prio, deadline=None, rsp_hdl=None):
+    return {'req': req, 'rsp_hdl': rsp_hdl, 'log_lvl': 0, 'prio': prio,
+            'deadline': deadline}
+
+
+def test_priority():
+    que = ModbusQueue()
+    assert que.put_nowait(item(READ_2000, 2))
+    assert que.put_nowait(item(READ_3000, 1))
+    assert que.put_nowait(item(WRITE_2008, 0))
+    assert que.qsize() == 3
+    assert [que.get_nowait()['req'] for _ in range(3)] == \
+        [WRITE_2008, READ_3000, READ_2000]
+    assert que.empty()
+    with pytest.raises(asyncio.QueueEmpty):
+        que.get_nowait()
+    assert que.counter['cmd']['sent'] == 1
+    assert que.wait['slow'].count == 1
+
+
+def test_dedup():
+    que = ModbusQueue()
+    assert que.put_nowait(item(READ_3000, 1, time.monotonic() - 1))
+    # an identical read refreshes the deadline of the queued one
+    assert not que.put_nowait(item(READ_3000, 1))
+    assert que.qsize() == 1
+    assert que.counter['poll']['deduped'] == 1
+    # requests with a response handler and writes aren't deduped
+    assert que.put_nowait(item(READ_3000, 1, rsp_hdl=print))
+    assert que.put_nowait(item(WRITE_2008, 0))
+    assert que.put_nowait(item(WRITE_2008, 0))
+    assert que.qsize() == 4
+    assert que.get_nowait()['req'] == WRITE_2008
+    assert que.get_nowait()['req'] == WRITE_2008
+    assert que.get_nowait()['deadline'] is None
+
+
+def test_deadline():
+    que = ModbusQueue()
+    que.put_nowait(item(READ_3000, 1, time.monotonic() - 1))
+    que.put_nowait(item(READ_2000, 2, time.monotonic() + 10))
+    assert que.get_nowait()['req'] == READ_2000    # the poll is stale
+    assert que.counter['poll']['expired'] == 1
+    assert que.counter['poll']['sent'] == 0
+
+
+def test_full():
+    que = ModbusQueue(maxsize=2)
+    assert que.put_nowait(item(READ_2000, 3))
+    assert que.put_nowait(item(READ_3000, 1))
+    # the scan read is dropped for the command
+    assert que.put_nowait(item(WRITE_2008, 0))
+    assert que.counter['scan']['dropped'] == 1
+    # a slow poll can't replace queued requests of higher classes
+    assert not que.put_nowait(item(READ_2000, 2))
+    assert que.counter['slow']['dropped'] == 1
+    assert que.qsize() == 2
+    que.clear()
+    assert que.empty()
+
+
+def test_aging():
+    que = ModbusQueue()
+    now = time.monotonic()
+    que.put_nowait(item(READ_2000, 2, now + 10))
+    que.put_nowait(item(READ_3000, 1, now + 10))
+    que.put_nowait(item(READ_3000, 1, now + 10, rsp_hdl=print))
+    assert que.get_nowait()['prio'] == 1
+    # the slow poll has waited for more than half of its lifetime
+    que.ques[2][0]['ts'] = now - 10
+    que.put_nowait(item(WRITE_2008, 0))
+    assert [que.get_nowait()['prio'] for _ in range(3)] == [0, 2, 1]
+    assert que.counter['slow']['sent'] == 1
+    assert que.counter['slow']['expired'] == 0
@@ -116,14 +116,29 @@ class FakeReader():
         return
 
 
+class FakeTransport():
+    def __init__(self):
+        self.buf_size = 0
+    def get_write_buffer_size(self):
+        return self.buf_size
+    def get_write_buffer_limits(self):
+        return (16384, 65536)
+
+
 class FakeWriter():
     def __init__(self, conn='remote.intern'):
         self.conn = conn
         self.closing = False
         self.buf = bytes()
+        self.write_cnt = 0
+        self.transport = FakeTransport()
     def write(self, buf: bytes):
         self.buf += buf
+        self.write_cnt += 1
         return
+    def writelines(self, data):
+        self.buf += b''.join(data)
+        self.write_cnt += 1
     async def drain(self):
         await asyncio.sleep(0)
     def get_extra_info(self, sel: str):
@@ -183,7 +198,7 @@ def patch_no_mqtt():
 
 @pytest.fixture
 def patch_mqtt_err():
-    def new_publish(self, key, data):
+    def new_publish(self, key, data, on_sent=None):
         raise MqttCodeError(None)
 
     with patch.object(Mqtt, 'publish', new_publish) as conn:
@@ -191,7 +206,7 @@ def patch_mqtt_err():
 
 @pytest.fixture
 def patch_mqtt_except():
-    def new_publish(self, key, data):
+    def new_publish(self, key, data, on_sent=None):
         raise ValueError("Test")
 
     with patch.object(Mqtt, 'publish', new_publish) as conn:
@@ -348,6 +348,165 @@ async def test_mqtt_dispatch_cb(config_mqtt_conn, aiomqtt_mock):
     finally:
         await m.close()
 
+@pytest.mark.asyncio(loop_scope="module")
+async def test_mqtt_publish_queue(config_mqtt_conn, aiomqtt_mock, monkeypatch):
+    _ = config_mqtt_conn
+    _ = aiomqtt_mock
+    sent = []
+    in_flight = []
+    release = asyncio.Event()
+
+    async def my_publish(self, topic, payload):
+        in_flight.append(topic)
+        await release.wait()
+        sent.append((topic, payload))
+
+    monkeypatch.setattr(aiomqtt.Client, "publish", my_publish)
+
+    on_connect =  asyncio.Event()
+    async def cb():
+        on_connect.set()
+    try:
+        m = Mqtt(cb)
+        assert m.window < 10     # no warnings about pending calls of aiomqtt
+        m.window = 2
+        await asyncio.wait_for(on_connect.wait(), 1)
+        published = m.published
+        # the publish calls return without waiting for the broker
+        confirmed = []
+        for idx in range(4):
+            await m.publish(f'tsun/inv_1/{idx}', str(idx),
+                            on_sent=lambda idx=idx: confirmed.append(idx))
+        await m.publish('tsun/inv_1/3', 'new')
+        await asyncio.sleep(0.01)
+        assert in_flight == ['tsun/inv_1/0', 'tsun/inv_1/1']   # window
+        assert confirmed == []
+        release.set()
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        assert sent == [('tsun/inv_1/0', '0'), ('tsun/inv_1/1', '1'),
+                        ('tsun/inv_1/2', '2'), ('tsun/inv_1/3', 'new')]
+        assert m.published == published + 4
+        assert confirmed == [0, 1, 2]    # the payload of 3 was replaced
+        assert len(m.queue) == 0
+        assert m.queue.counter['coalesced'] >= 1
+    finally:
+        await m.close()
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_mqtt_publish_invalid(config_mqtt_conn, aiomqtt_mock, monkeypatch):
+    '''a message with a permanent error is dropped, not retried'''
+    _ = config_mqtt_conn
+    _ = aiomqtt_mock
+    calls = []
+
+    async def my_publish(self, topic, payload):
+        calls.append(topic)
+        if topic == 'tsun/#':
+            raise ValueError('Invalid topic')
+
+    monkeypatch.setattr(aiomqtt.Client, "publish", my_publish)
+
+    on_connect =  asyncio.Event()
+    async def cb():
+        on_connect.set()
+    try:
+        m = Mqtt(cb)
+        await asyncio.wait_for(on_connect.wait(), 1)
+        failed = m.queue.counter['failed']
+        await m.publish('tsun/#', '1')
+        await m.publish('tsun/inv_1/grid', '2')
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        assert calls == ['tsun/#', 'tsun/inv_1/grid']
+        assert m.queue.counter['failed'] == failed + 1
+        assert len(m.queue) == 0
+
+        await m.publish('tsun/inv_1/grid', '3')   # the queue isn't blocked
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        assert calls == ['tsun/#', 'tsun/inv_1/grid', 'tsun/inv_1/grid']
+    finally:
+        await m.close()
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_mqtt_spool_replay(config_mqtt_conn, aiomqtt_mock, monkeypatch):
+    _ = config_mqtt_conn
+    _ = aiomqtt_mock
+    Config.act_config['mqtt'] |= {'spool_size': 10, 'spool_all': ['total'],
+                                  'spool_rate': 1000}
+    sent = []
+
+    async def my_publish(self, topic, payload):
+        sent.append((topic, payload))
+
+    monkeypatch.setattr(aiomqtt.Client, "publish", my_publish)
+
+    on_connect =  asyncio.Event()
+    async def cb():
+        on_connect.set()
+    try:
+        m = Mqtt(cb)
+        # no broker connection yet, the messages are spooled
+        await m.publish('tsun/inv_1/grid', '1')
+        await m.publish('tsun/inv_1/total', '2')
+        await m.publish('tsun/inv_1/grid', '3')
+        await m.publish('tsun/inv_1/total', '4')
+        assert len(m.spool) == 3
+        assert sent == []
+        await asyncio.wait_for(on_connect.wait(), 1)
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        assert sent == [('tsun/inv_1/grid', '3'), ('tsun/inv_1/total', '2'),
+                        ('tsun/inv_1/total', '4')]
+        assert len(m.spool) == 0
+        assert m.spool.counter['replayed'] == 3
+    finally:
+        await m.close()
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_mqtt_spool_queue(config_mqtt_conn, aiomqtt_mock, monkeypatch):
+    '''the unsent messages are moved into the spool on a connection loss'''
+    _ = config_mqtt_conn
+    _ = aiomqtt_mock
+    Config.act_config['mqtt'] |= {'spool_size': 10}
+    lost = asyncio.Event()
+    release = asyncio.Event()
+
+    async def my_publish(self, topic, payload):
+        await release.wait()
+
+    async def my_anext(self):
+        await lost.wait()
+        raise MqttError('connection lost')
+
+    monkeypatch.setattr(aiomqtt.Client, "publish", my_publish)
+    monkeypatch.setattr(MessagesIterator, "__anext__", my_anext)
+
+    on_connect =  asyncio.Event()
+    async def cb():
+        on_connect.set()
+    try:
+        m = Mqtt(cb)
+        m.window = 1
+        await asyncio.wait_for(on_connect.wait(), 1)
+        await m.publish('tsun/inv_1/grid', '1')      # in flight
+        await m.publish('tsun/inv_1/input', '2')
+        await asyncio.sleep(0.01)
+        lost.set()
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        assert m.ctime is None
+        assert len(m.queue) == 0
+        assert [msg for msg in m.spool.items.values()] == \
+            [('tsun/inv_1/grid', '1'), ('tsun/inv_1/input', '2')]
+
+        await m.publish('tsun/inv_1/grid', '3')      # spooled
+        assert [msg for msg in m.spool.items.values()] == \
+            [('tsun/inv_1/grid', '3'), ('tsun/inv_1/input', '2')]
+    finally:
+        await m.close()
+
 @pytest.mark.asyncio(loop_scope="module")
 async def test_mqtt_dispatch_err(config_mqtt_conn, aiomqtt_mock, spy_modbus_cmd, caplog):
     _ = config_mqtt_conn
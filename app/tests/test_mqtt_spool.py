@@ -0,0 +1,105 @@
+# test_with_pytest.py
+import pytest
+import asyncio
+from mqtt_spool import MqttSpool
+
+
+def test_coalesce():
+    spool = MqttSpool(10)
+    spool.put('tsun/inv_1/grid', '1')
+    spool.put('tsun/inv_1/input', b'2')
+    spool.put('tsun/inv_1/grid', '3')     # replaces the spooled payload
+    assert len(spool) == 2
+    assert spool.counter['spooled'] == 2
+    assert spool.counter['coalesced'] == 1
+    assert spool.head() == ('tsun/inv_1/grid', 'tsun/inv_1/grid', '3')
+
+    spool.discard('tsun/inv_1/grid')      # a newer message was published
+    assert spool.head() == ('tsun/inv_1/input', 'tsun/inv_1/input', '2')
+    spool.done('tsun/inv_1/input', '2')
+    assert len(spool) == 0
+    assert spool.head() is None
+    assert spool.counter['replayed'] == 1
+
+
+def test_keep_all():
+    spool = MqttSpool(10, keep_all=['total'])
+    spool.put('tsun/inv_1/total', '1')
+    spool.put('tsun/inv_1/grid', '2')
+    spool.put('tsun/inv_1/total', '3')
+    assert len(spool) == 3
+    assert [msg[1] for msg in spool.items.values()] == ['1', '2', '3']
+    key, topic, payload = spool.head()
+    assert (topic, payload) == ('tsun/inv_1/total', '1')
+    spool.done(key, payload)
+    assert spool.head()[2] == '2'
+
+
+def test_drop_oldest():
+    spool = MqttSpool(2)
+    for idx in range(3):
+        spool.put(f'tsun/inv_1/{idx}', str(idx))
+    assert len(spool) == 2
+    assert spool.counter['dropped'] == 1
+    assert spool.head()[1] == 'tsun/inv_1/1'
+
+
+def test_replaced_during_replay():
+    spool = MqttSpool(10)
+    spool.put('tsun/inv_1/grid', '1')
+    key, _, payload = spool.head()
+    spool.put('tsun/inv_1/grid', '2')     # while '1' is published
+    spool.done(key, payload)
+    assert spool.head()[2] == '2'
+
+
+def test_file(tmp_path):
+    path = tmp_path / 'spool.jsonl'
+    spool = MqttSpool(10, str(path))
+    spool.put('tsun/inv_1/grid', '1')
+    spool.put('tsun/inv_1/grid', '2')
+    spool.put('tsun/inv_1/input', '3')
+    assert len(path.read_text().splitlines()) == 3
+
+    # a restart loads the spool, an incomplete last line is skipped
+    with open(path, 'a') as f:
+        f.write('["tsun/inv_1/incompl')
+    spool = MqttSpool(10, str(path))
+    assert [msg for msg in spool.items.values()] == \
+        [('tsun/inv_1/grid', '2'), ('tsun/inv_1/input', '3')]
+    assert len(path.read_text().splitlines()) == 2  # compacted
+
+    while (msg := spool.head()) is not None:
+        spool.done(msg[0], msg[2])
+    assert path.read_text() == ''          # truncated after the replay
+
+
+def test_file_compaction(tmp_path):
+    path = tmp_path / 'spool.jsonl'
+    spool = MqttSpool(2, str(path))
+    for idx in range(5):
+        spool.put('tsun/inv_1/grid', str(idx))
+    assert path.read_text().splitlines() == ['["tsun/inv_1/grid", "4"]']
+
+
+def test_file_error(tmp_path, caplog):
+    spool = MqttSpool(10, str(tmp_path))   # a directory isn't writable
+    spool.put('tsun/inv_1/grid', '1')
+    assert len(spool) == 1
+    assert 'MQTT spool:' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_file_buffered(tmp_path):
+    path = tmp_path / 'spool.jsonl'
+    spool = MqttSpool(10, str(path))
+    spool.FLUSH_DELAY = 0.05
+    spool.put('tsun/inv_1/grid', '1')
+    spool.put('tsun/inv_1/input', '2')
+    assert path.read_text() == ''           # buffered, not yet written
+    await asyncio.sleep(0.1)
+    assert len(path.read_text().splitlines()) == 2
+
+    spool.put('tsun/inv_1/grid', '3')
+    spool.close()                           # flushes the buffer
+    assert len(path.read_text().splitlines()) == 3
@@ -0,0 +1,135 @@
+# test_with_pytest.py
+import pytest
+import asyncio
+
+from publish_queue import PublishQueue
+
+pytest_plugins = ('pytest_asyncio',)
+
+
+@pytest.mark.asyncio
+async def test_coalesce():
+    queue = PublishQueue()
+    await queue.put('tsun/grid', '1')
+    await queue.put('tsun/input', '2')
+    await queue.put('tsun/grid', '3')     # replaces the queued payload
+    assert len(queue) == 2
+    assert queue.counter['queued'] == 2
+    assert queue.counter['coalesced'] == 1
+
+    batch = await queue.get_batch(10)
+    assert [(topic, payload) for topic, payload, _ in batch] == \
+        [('tsun/grid', '3'), ('tsun/input', '2')]
+    assert len(queue) == 0
+    assert queue.take_high_water() == 2
+    assert queue.take_high_water() == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_and_requeue():
+    queue = PublishQueue()
+    for idx in range(5):
+        await queue.put(f'tsun/{idx}', str(idx))
+    batch = await queue.get_batch(3)
+    assert [topic for topic, _, _ in batch] == ['tsun/0', 'tsun/1', 'tsun/2']
+
+    # unsent messages go back to the head, newer payloads are kept
+    await queue.put('tsun/1', 'new')
+    queue.requeue(batch)
+    batch = await queue.get_batch(10)
+    assert [(topic, payload) for topic, payload, _ in batch] == \
+        [('tsun/0', '0'), ('tsun/2', '2'), ('tsun/3', '3'), ('tsun/4', '4'),
+         ('tsun/1', 'new')]
+
+
+@pytest.mark.asyncio
+async def test_get_waits():
+    queue = PublishQueue()
+    task = asyncio.create_task(queue.get_batch(10))
+    await asyncio.sleep(0)
+    assert not task.done()
+    await queue.put('tsun/grid', '1')
+    batch = await asyncio.wait_for(task, 1)
+    assert batch[0][:2] == ('tsun/grid', '1')
+
+
+@pytest.mark.asyncio
+async def test_drop_policy():
+    queue = PublishQueue(2, 'drop')
+    await queue.put('tsun/0', '0')
+    await queue.put('tsun/1', '1')
+    await queue.put('tsun/1', '2')       # coalesced, nothing is dropped
+    assert queue.counter['dropped'] == 0
+    await queue.put('tsun/2', '3')       # drops the oldest message
+    assert queue.counter['dropped'] == 1
+    assert list(queue.items) == ['tsun/1', 'tsun/2']
+
+
+@pytest.mark.asyncio
+async def test_block_policy():
+    queue = PublishQueue(2, 'block')
+    await queue.put('tsun/0', '0')
+    await queue.put('tsun/1', '1')
+    task = asyncio.create_task(queue.put('tsun/2', '2'))
+    await asyncio.sleep(0)
+    assert not task.done()               # back-pressure
+    await queue.put('tsun/0', 'x')       # coalescing doesn't block
+
+    await queue.get_batch(1)
+    await asyncio.wait_for(task, 1)
+    assert list(queue.items) == ['tsun/1', 'tsun/2']
+    assert queue.counter['dropped'] == 0
+
+
+@pytest.mark.asyncio
+async def test_on_sent():
+    sent = []
+    queue = PublishQueue(2, 'drop')
+    await queue.put('ha/0', '0', lambda: sent.append('0'))
+    await queue.put('ha/1', '1', lambda: sent.append('1'))
+    await queue.put('ha/2', '2', lambda: sent.append('2'))  # drops ha/0
+    batch = await queue.get_batch(1)
+    assert batch[0][:2] == ('ha/1', '1')
+
+    # a newer payload of a message in flight gets its own callback
+    await queue.put('ha/1', 'new', lambda: sent.append('new'))
+    queue.done('ha/1')
+    assert sent == ['1']
+
+    # an unsent message keeps its callback
+    batch = await queue.get_batch(1)
+    assert batch[0][:2] == ('ha/2', '2')
+    queue.requeue(batch)
+    batch = await queue.get_batch(10)
+    for topic, _, _ in batch:
+        queue.done(topic)
+    assert sent == ['1', '2', 'new']
+
+    # the callback of a replaced payload is dropped
+    await queue.put('ha/3', '3', lambda: sent.append('3'))
+    await queue.put('ha/3', '4')
+    batch = await queue.get_batch(10)
+    queue.done('ha/3')
+    assert sent == ['1', '2', 'new']
+    assert queue.on_sent == {} and queue.sending == {}
+
+
+@pytest.mark.asyncio
+async def test_event_topics():
+    queue = PublishQueue(events=('at_resp',))
+    await queue.put('tsun/inv/at_resp', 'a')
+    await queue.put('tsun/inv/grid', '1')
+    await queue.put('tsun/inv/at_resp', 'b')    # events aren't coalesced
+    await queue.put('tsun/inv/grid', '2')
+    assert len(queue) == 3
+    assert queue.counter['coalesced'] == 1
+
+    batch = await queue.get_batch(2)
+    assert [(topic, payload) for topic, payload, _ in batch] == \
+        [('tsun/inv/at_resp', 'a'), ('tsun/inv/grid', '2')]
+    await queue.put('tsun/inv/at_resp', 'c')
+    queue.requeue(batch)                         # keeps the FIFO order
+    batch = await queue.get_batch(10)
+    assert [(topic, payload) for topic, payload, _ in batch] == \
+        [('tsun/inv/at_resp', 'a'), ('tsun/inv/grid', '2'),
+         ('tsun/inv/at_resp', 'b'), ('tsun/inv/at_resp', 'c')]
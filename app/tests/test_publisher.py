@@ -0,0 +1,166 @@
+# test_with_pytest.py
+import pytest
+import asyncio
+import time
+
+from infos import Infos
+from publisher import Publisher
+from async_stream import AsyncStreamServer
+
+from test_modbus_tcp import FakeWriter
+
+pytest_plugins = ('pytest_asyncio',)
+
+# initialize the proxy statistics
+Infos.static_init()
+
+
+@pytest.fixture
+def publisher():
+    Publisher.stop()
+    Publisher.counter = {'notified': 0, 'coalesced': 0, 'published': 0}
+    yield Publisher
+    Publisher.stop()
+
+
+class FakeIfc():
+    def __init__(self):
+        self.cnt = 0
+        self.async_publ_mqtt = self.publ_mqtt
+
+    async def publ_mqtt(self):
+        self.cnt += 1
+
+
+class FrameReader():
+    '''delivers frames, which arrive every interval seconds'''
+    def __init__(self, frames: int, interval: float):
+        self.frames = frames
+        self.interval = interval
+        self.start = time.monotonic()
+        self.arrival = []
+
+    async def read(self, max_len: int):
+        if len(self.arrival) == self.frames:
+            return b''
+        arrival = self.start + self.interval * (len(self.arrival) + 1)
+        await asyncio.sleep(max(arrival - time.monotonic(), 0))
+        self.arrival.append(arrival)
+        return b'frame'
+
+    def feed_eof(self):
+        return
+
+
+class AckWriter(FakeWriter):
+    '''records the time of every written ack'''
+    def __init__(self):
+        super().__init__()
+        self.acks = []
+
+    def write(self, buf: bytes):
+        super().write(buf)
+        self.acks.extend([time.monotonic()] * buf.count(b'ack'))
+
+    def writelines(self, data):
+        for buf in data:
+            self.write(buf)
+
+
+class SlowBroker():
+    '''stand-in for a slow MQTT broker'''
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.published = 0
+
+    async def publish(self):
+        await asyncio.sleep(self.delay)
+        self.published += 1
+
+
+@pytest.mark.asyncio
+async def test_notify(publisher):
+    publisher.start()
+    task = publisher.task
+    publisher.start()       # a second start is ignored
+    assert task == publisher.task
+    ifc1 = FakeIfc()
+    ifc2 = FakeIfc()
+    assert publisher.notify(ifc1)
+    assert publisher.notify(ifc2)
+    assert publisher.notify(ifc1)     # coalesced
+    await asyncio.sleep(0.01)
+    assert ifc1.cnt == 1
+    assert ifc2.cnt == 1
+    assert publisher.counter == {'notified': 3, 'coalesced': 1,
+                                 'published': 2}
+
+    # closed connections are skipped
+    ifc1.async_publ_mqtt = None
+    publisher.notify(ifc1)
+    await asyncio.sleep(0.01)
+    assert publisher.counter['published'] == 2
+
+
+@pytest.mark.asyncio
+async def test_exception(publisher):
+    publisher.start()
+    cnt = Infos.get_counter('SW_Exception')
+
+    async def publ_mqtt():
+        raise ValueError('test')
+    ifc = FakeIfc()
+    ifc.async_publ_mqtt = publ_mqtt
+    publisher.notify(ifc)
+    await asyncio.sleep(0.01)
+    assert Infos.get_counter('SW_Exception') == cnt + 1
+
+    # the publisher task is still running
+    ifc = FakeIfc()
+    publisher.notify(ifc)
+    await asyncio.sleep(0.01)
+    assert ifc.cnt == 1
+
+
+def test_not_started():
+    Publisher.stop()
+    assert not Publisher.notify(FakeIfc())
+    assert Publisher.pending == {}
+
+
+async def run_conn(frames: int, interval: float, broker: SlowBroker):
+    '''run a server connection, which acks every received frame and
+    returns the ack latency of every frame'''
+    reader = FrameReader(frames, interval)
+    writer = AckWriter()
+    ifc = AsyncStreamServer(reader, writer, broker.publish, None, None)
+
+    def rx_cb():
+        ifc.rx_get()
+        ifc.tx_add(b'ack')
+    ifc.rx_set_cb(rx_cb)
+    await ifc.loop()
+    ifc.close()
+    assert len(writer.acks) == frames
+    return [ack - arrival for ack, arrival in zip(writer.acks,
+                                                   reader.arrival)]
+
+
+@pytest.mark.asyncio
+async def test_ack_latency_slow_broker(publisher):
+    publisher.start()
+    broker = SlowBroker(0.2)
+    latency = await run_conn(6, 0.02, broker)
+    # the acks don't wait for the broker
+    assert max(latency) < 0.05
+    # the updates of a busy publisher are coalesced
+    await asyncio.sleep(0.5)
+    assert broker.published < 6
+    assert publisher.counter['coalesced'] > 0
+
+    # without the publisher task, the broker delays the acks
+    publisher.stop()
+    broker = SlowBroker(0.2)
+    latency = await run_conn(3, 0.02, broker)
+    assert max(latency) > 0.15
+    assert broker.published == 3
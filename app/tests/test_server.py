@@ -6,6 +6,7 @@ from mock import patch
 from server import app, Server, ProxyState, HypercornLogHndl
 from inverter_base import InverterBase
 from gen3.talent import Talent
+from change_log import ChangeLog
 
 from test_inverter_base import FakeReader, FakeWriter
 
@@ -366,3 +367,52 @@ class TestApp:
             result = await response.get_data()
             assert result == b"I'm fine"
             assert self.EXCEPTION_LOG_MSG in caplog.text
+
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_metrics(self):
+        """Test the metrics route."""
+        reader = FakeReader()
+        writer = FakeWriter()
+        InverterBase._registry.clear()
+
+        with InverterBase(reader, writer, 'tsun', Talent) as inverter:
+            inverter.local.ifc.node_id = 'inv_1/'
+            app.testing = True
+            client = app.test_client()
+            response = await client.get('/-/metrics')
+            assert response.status_code == 200
+            assert response.content_type.startswith('text/plain')
+            result = await response.get_data()
+            assert b'tsun_proxy_proc_seconds_count ' in result
+            assert b'tsun_proxy_loop_lag_seconds_count ' in result
+            assert b'tsun_proxy_conn_proc_seconds_count{node="inv_1/",' \
+                   b'conn="' in result
+            assert b'side="local"} ' in result
+            assert b'side="remote"' not in result
+
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_changes(self):
+        """Test the change log route."""
+        app.testing = True
+        client = app.test_client()
+        ChangeLog.enable(0)
+        response = await client.get('/-/changes')
+        assert response.status_code == 200
+        assert response.content_type == 'application/json'
+        assert await response.get_json() == []
+
+        ChangeLog.enable(10)
+        try:
+            ChangeLog.add('inv_1/', 'MODBUS', 'grid.Voltage', 230.1, ' V')
+            ChangeLog.add('inv_2/', 'GEN3', 'grid.Voltage', 229.9, ' V')
+            seq = ChangeLog.seq
+            response = await client.get('/-/changes?node_id=inv_2/')
+            result = await response.get_json()
+            assert len(result) == 1
+            assert result[0]['seq'] == seq
+            assert result[0]['value'] == 229.9
+            response = await client.get(f'/-/changes?since={seq-1}')
+            result = await response.get_json()
+            assert [rec['node_id'] for rec in result] == ['inv_2/']
+        finally:
+            ChangeLog.enable(0)
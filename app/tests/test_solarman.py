@@ -38,7 +38,7 @@ class Mqtt():
         self.key = ''
         self.data = ''
 
-    async def publish(self, key, data):
+    async def publish(self, key, data, on_sent=None):
         self.key = key
         self.data = data
 
@@ -1486,6 +1486,26 @@ async def test_heartbeat_ind2(my_loop, config_tsun_inv1, heartbeat_ind_msg, hear
     assert m.db.stat['proxy']['Invalid_Msg_Format'] == 0
     m.close()
 
+@pytest.mark.asyncio(loop_scope="module")
+async def test_ack_rsp_tmpl(my_loop, config_tsun_inv1):
+    _ = config_tsun_inv1
+    m = MemoryStream(b'', (0,))
+    m.snr = 2070233889
+    for ctrl, ftype in ((0x1110, 2), (0x1210, 1), (0x1710, 1), (0x1810, 0)):
+        for seq in (0x0000, 0x84ff, 0xffff):
+            # build the reference with the generic header functions
+            m.seq.set_recv(seq)
+            m._build_header(ctrl)
+            m.ifc.tx_add(struct.pack('<BBLL', ftype, 1, timestamp, heartbeat))
+            m._finish_send_msg()
+            expected = m.ifc.tx_fifo.get()
+
+            m.seq.set_recv(seq)
+            m._SolarmanV5__send_ack_rsp(ctrl, ftype)
+            assert m.ifc.tx_fifo.get() == expected
+        assert (ctrl, ftype, 1, heartbeat) in m._SolarmanV5__ack_tmpl
+    m.close()
+
 @pytest.mark.asyncio(loop_scope="module")
 async def test_heartbeat_rsp(my_loop, config_tsun_inv1, heartbeat_rsp_msg):
     _ = config_tsun_inv1
@@ -1529,6 +1549,29 @@ async def test_sync_start_ind(my_loop, config_tsun_inv1, sync_start_ind_msg, syn
 
     m.close()
 
+@pytest.mark.asyncio(loop_scope="module")
+async def test_update_header_multi(my_loop, config_tsun_inv1, sync_start_ind_msg, heartbeat_ind_msg, inverter_ind_msg):
+    _ = config_tsun_inv1
+    m = MemoryStream(b'', (0,))
+    m.seq.set_recv(0x10ff)
+    msgs = (sync_start_ind_msg, heartbeat_ind_msg, inverter_ind_msg)
+    for msg in msgs:
+        m.ifc.fwd_add(msg)
+    m._SolarmanBase__update_header(m.ifc.fwd_fifo.peek())
+    buf = m.ifc.fwd_fifo.get()
+
+    ofs = 0
+    for seq, msg in zip((0x1000, 0x1001, 0x1002), msgs):
+        frame = buf[ofs:ofs+len(msg)]
+        assert struct.unpack_from('<H', frame, 5)[0] == seq
+        # the incremental checksum must match a full recalculation
+        assert frame[-2] == sum(frame[1:-2]) & 0xff
+        assert frame[:5] == msg[:5]
+        assert frame[7:-2] == msg[7:-2]
+        ofs += len(msg)
+    assert ofs == len(buf)
+    m.close()
+
 @pytest.mark.asyncio(loop_scope="module")
 async def test_sync_start_rsp(my_loop, config_tsun_inv1, sync_start_rsp_msg):
     _ = config_tsun_inv1
@@ -3086,3 +3129,101 @@ async def test_msg_modbus_inv_1097(my_loop, config_tsun_inv1, inv_1097_modbus_rs
     assert m.new_data['input'] == False
 
     m.close()
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_adaptive_polling(config_tsun_inv1):
+    _ = config_tsun_inv1
+    m = MemoryStream(b'')
+    m.mb_timeout = 60
+    m._adapt_polling()             # fixed polling interval without config
+    assert m.mb_timeout == 60
+
+    m.mb_interval = {'min': 10, 'max': 300, 'change': 0.05}
+    m.db.set_db_def_value(Register.INVERTER_STATUS, 1)
+    m.db.set_db_def_value(Register.OUTPUT_POWER, 500.0)
+    m._adapt_polling()
+    assert m.mb_timeout == 10
+    assert m.db.get_db_value(Register.POLLING_INTERVAL) == 10
+    assert m.new_data['controller']
+
+    # flat values: back off up to the maximum
+    intervals = []
+    for _ in range(6):
+        m.db.set_db_def_value(Register.OUTPUT_POWER, 510.0)
+        m._adapt_polling()
+        intervals.append(m.mb_timeout)
+    assert intervals == [20, 40, 80, 160, 300, 300]
+
+    # ramping power: poll fast again
+    m.db.set_db_def_value(Register.OUTPUT_POWER, 600.0)
+    m._adapt_polling()
+    assert m.mb_timeout == 10
+
+    # off-grid or off-line: slow polling
+    m.db.set_db_def_value(Register.INVERTER_STATUS, 0)
+    m._adapt_polling()
+    assert m.mb_timeout == 300
+    m.close()
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_adaptive_polling_per_tick(config_tsun_inv1, inv_1097_modbus_rsp):
+    '''the interval is adapted once per polling tick, not per response'''
+    _ = config_tsun_inv1
+    interval = {'min': 10, 'max': 300, 'change': 0.05}
+    Config.act_config['inverters']['Y170000000000001'][
+        'modbus_interval'] = interval
+    m = MemoryStream(b'')
+    m.mb_timeout = 60
+    m.mb_interval = interval
+    m.db.set_db_def_value(Register.INVERTER_STATUS, 1)
+    m.db.set_db_def_value(Register.OUTPUT_POWER, 500.0)
+    m.mb_timout_cb(1)
+    assert m.mb_timeout == 10
+    assert m.mb_timer.tim is not None
+
+    # several MODBUS responses within one polling cycle
+    m.mb.rsp_handler = m._SolarmanV5__forward_msg
+    for _ in range(3):
+        m.mb.last_addr = 1
+        m.mb.last_fcode = 3
+        m.mb.last_len = 0x30
+        m.mb.last_reg = 0x1200
+        m.mb.req_pend = True
+        m.db.set_db_def_value(Register.OUTPUT_POWER, 500.0)
+        m.append_msg(inv_1097_modbus_rsp)
+        m.read()
+        assert m.mb_timeout == 10
+    assert m.modbus_elms > 0
+
+    # flat values: the interval doubles once per tick
+    m.db.set_db_def_value(Register.OUTPUT_POWER, 500.0)
+    m.mb_timout_cb(2)
+    assert m.mb_timeout == 20
+    m.mb_timout_cb(3)
+    assert m.mb_timeout == 40
+    m.close()
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_modbus_read_cache(config_tsun_inv1):
+    _ = config_tsun_inv1
+    rsp = b'\x01\x03\x0c\x01\x2c\x00\x2c\x00\x2c\x00\x46\x00\x46\x00\x46\x32\xc8'
+    m = MemoryStream(b'')
+    m.state = State.up
+    m.mb.cache_age = 10
+    m.mb._Modbus__cache_regs(Modbus.READ_REGS, 0x3007, rsp, 6)
+
+    m.send_modbus_cmd(Modbus.READ_REGS, 0x3007, 6, logging.INFO)
+    assert not m.mb.req_pend             # answered from the cache
+    assert m.sent_pdu == b''
+    assert not m.new_data.get('grid') and not m.new_data.get('inverter')
+    assert m.mb.counter['cache']['hit'] == 1
+
+    m.send_modbus_cmd(Modbus.READ_REGS, 0x3007, 0, logging.INFO)
+    assert m.mb.req_pend                 # invalid count: sent to the inverter
+    m.mb.req_pend = False
+    m.mb.que.clear()
+
+    m.send_modbus_cmd(Modbus.READ_REGS, 0x3000, 6, logging.INFO)
+    assert m.mb.req_pend                 # sent to the inverter
+    assert m.mb.counter['cache']['miss'] == 1
+    m.close()
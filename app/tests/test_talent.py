@@ -1659,6 +1659,19 @@ def test_msg_cntrl_ind(config_tsun_inv1, msg_controller_ind, msg_controller_ind_
     assert m.db.stat['proxy']['Unknown_Ctrl'] == 0
     m.close()
 
+def test_update_header_multi(config_tsun_inv1, msg_controller_ind, msg_controller_ind_ts_offs, msg_controller_ack):
+    _ = config_tsun_inv1
+    m = MemoryStream(msg_controller_ind, (0,))
+    m.read()         # read complete msg, and dispatch msg
+    m.ifc.fwd_add(msg_controller_ack)   # msg without timestamp
+    m.ifc.fwd_add(msg_controller_ind)
+    m.ts_offset = -4096
+    m._update_header(m.ifc.fwd_fifo.peek())
+    # the timestamps of all messages in the buffer must be updated
+    assert m.ifc.fwd_fifo.get() == msg_controller_ind_ts_offs + \
+        msg_controller_ack + msg_controller_ind_ts_offs
+    m.close()
+
 def test_msg_cntrl_ack(config_tsun_inv1, msg_controller_ack):
     _ = config_tsun_inv1
     m = MemoryStream(msg_controller_ack, (0,), False)
@@ -2484,9 +2497,20 @@ async def test_modbus_polling(config_tsun_inv1, msg_inverter_ind):
     assert m.ifc.tx_fifo.get()==b''
     
     await asyncio.sleep(0.1)
-    assert m.sent_pdu==b'\x00\x00\x00 \x10R170000000000001pw\x00\x01\xa3(\x08\x01\x03\x20\x00\x00`N"'
+    # the regular poll of 0x3000 is sent before the older slow poll of 0x2000
+    assert m.sent_pdu==b'\x00\x00\x00 \x10R170000000000001pw\x00\x01\xa3(\x08\x01\x030\x00\x000J\xde'
     assert m.ifc.tx_fifo.get()==b''
+    assert m.mb.que.counter['poll']['sent'] == 2
+    assert m.mb.que.counter['slow']['queued'] == 1
+    assert m.mb.que.counter['slow']['sent'] == 0
     assert next(m.mb_timer.exp_count) == 4
+
+    await asyncio.sleep(0.25)
+    # the aged slow poll overtakes the regular poll
+    assert m.sent_pdu==b'\x00\x00\x00 \x10R170000000000001pw\x00\x01\xa3(\x08\x01\x03\x20\x00\x00`N"'
+    assert m.ifc.tx_fifo.get()==b''
+    assert m.mb.que.counter['slow']['sent'] == 1
+    assert m.mb.que.counter['slow']['expired'] == 0
     m.close()
 
 @pytest.mark.asyncio(loop_scope="module")
@@ -0,0 +1,269 @@
+# test_with_pytest.py
+import json
+import asyncio
+import pytest
+from value_store import StoreLayout, ValueStore, HELD, PUBLISH
+
+
+def test_layout():
+    layout = StoreLayout()
+    assert 0 == layout.slot(['grid', 'Voltage'])
+    assert 1 == layout.slot(['input', 'pv1', 'Voltage'])
+    assert 0 == layout.slot(('grid', 'Voltage'))
+    assert 2 == layout.slot(['grid', 'Current'])
+    assert len(layout) == 3
+    assert layout.groups == ['grid', 'input']
+    assert layout.group_of == [0, 1, 0]
+    assert layout.names[1] == 'input.pv1.Voltage'
+
+
+def test_update():
+    layout = StoreLayout()
+    volt = layout.slot(['grid', 'Voltage'])
+    total = layout.slot(['total', 'Total_Generation'])
+    store = ValueStore(layout)
+    assert store.get(volt) is None
+    assert store.get(volt, 0) == 0
+    assert store == {}
+    assert 'grid' not in store
+
+    assert store.update(volt, False, 230.1)
+    assert not store.update(volt, False, 230.1)
+    assert store.update(volt, False, 229.9)
+    assert store.get(volt) == 229.9
+
+    # counters can only be increased
+    assert not store.update(total, True, 0)
+    assert store.get(total) is None
+    assert store['total'] == {}
+    assert store.update(total, True, 17.3)
+    assert not store.update(total, True, 17.2)
+    assert store.get(total) == 17.3
+    assert store.keys() == ['grid', 'total']
+
+
+def test_slots_after_init():
+    layout = StoreLayout()
+    volt = layout.slot(['grid', 'Voltage'])
+    store = ValueStore(layout)
+    # a new path after the creation of the store
+    pwr = layout.slot(['env', 'Power'])
+    assert store.get(pwr) is None
+    assert store.update(pwr, False, 5)
+    assert store.update(volt, False, 230)
+    assert store.to_dict() == {'env': {'Power': 5}, 'grid': {'Voltage': 230}}
+
+
+def test_changed():
+    layout = StoreLayout()
+    volt = layout.slot(['grid', 'Voltage'])
+    temp = layout.slot(['env', 'Inverter_Temp'])
+    store = ValueStore(layout)
+    assert store.changed() == []
+    store.update(volt, False, 230)
+    store.update(temp, False, 22)
+    assert store.changed() == ['grid', 'env']
+    assert store.changed() == []
+    store.update(volt, False, 230)     # unchanged value
+    assert store.changed() == []
+    store.update(temp, False, 23)
+    assert store.changed() == ['env']
+
+
+def test_materialize():
+    layout = StoreLayout()
+    slots = [layout.slot(keys) for keys in (
+        ['input', 'pv1', 'Voltage'], ['input', 'pv1', 'Current'],
+        ['input', 'pv2', 'Voltage'], ['input', 'Timestamp'],
+        ['grid', 'Voltage'])]
+    store = ValueStore(layout)
+    # the nested dict keeps the order of the first update
+    for slot, val in zip(reversed(slots), (230, 1700000000, 33.5, 1.5, 34)):
+        store.update(slot, False, val)
+    assert json.dumps(store.to_dict()) == json.dumps(
+        {'grid': {'Voltage': 230},
+         'input': {'Timestamp': 1700000000, 'pv2': {'Voltage': 33.5},
+                   'pv1': {'Current': 1.5, 'Voltage': 34}}})
+
+    # the group dict is cached until the next update of the group
+    grid = store['grid']
+    inp = store['input']
+    assert grid is store['grid']
+    store.update(slots[0], False, 35)
+    assert grid is store['grid']
+    assert inp is not store['input']
+    assert store['input']['pv1']['Voltage'] == 35
+    assert [key for key, _ in store.items()] == ['grid', 'input']
+    assert len(store) == 2
+
+
+def test_assign():
+    layout = StoreLayout()
+    volt = layout.slot(['grid', 'Voltage'])
+    pwr = layout.slot(['grid', 'Output_Power'])
+    store = ValueStore(layout)
+    store.update(volt, False, 230)
+    store['grid'] = {'Output_Power': 100}
+    assert store.get(volt) is None
+    assert store.get(pwr) == 100
+    store['inverter'] = {}
+    assert store == {'grid': {'Output_Power': 100}, 'inverter': {}}
+
+    db = {'collector': {'Serial_Number': 'R170000000000001'},
+          'input': {'pv1': {'Voltage': 0.8}, 'pv2': {}}}
+    store.load(db)
+    assert store == db
+    assert store.get(volt) is None
+    assert 'grid' not in store
+
+    store.clear()
+    assert store == {}
+    assert store.keys() == []
+
+
+def test_publish_filter(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('value_store.time.monotonic', lambda: now[0])
+    layout = StoreLayout()
+    volt = layout.slot(['grid', 'Voltage'])
+    freq = layout.slot(['grid', 'Frequency'])
+    pwr = layout.slot(['grid', 'Output_Power'])
+    layout.filters = {volt: (0.5, 0), freq: (0, 10)}
+    store = ValueStore(layout)
+    cnt = dict(ValueStore.counter)
+
+    # the first value is always reported
+    assert store.update(volt, False, 230.0)
+    assert store.update(freq, False, 50.0)
+    assert store.changed() == ['grid']
+
+    # deadband: small changes are stored, but not reported
+    assert store.update(volt, False, 230.4) == HELD
+    assert store.get(volt) == 230.4
+    assert store.changed() == []
+    assert store.update(volt, False, 230.5) == PUBLISH
+
+    # min_interval: changes within 10s are not reported
+    now[0] += 5
+    assert store.update(freq, False, 50.1) == HELD
+    now[0] += 5
+    assert store.update(freq, False, 50.2) == PUBLISH
+
+    # slots without a filter are always reported
+    assert store.update(pwr, False, 100)
+    assert store.update(pwr, False, 101)
+    assert store['grid'] == {'Voltage': 230.5, 'Frequency': 50.2,
+                             'Output_Power': 101}
+
+    assert ValueStore.counter['published'] - cnt['published'] == 6
+    assert ValueStore.counter['suppressed'] - cnt['suppressed'] == 2
+
+    # after clear the next value is reported again
+    store.clear()
+    assert store.update(freq, False, 50.3)
+
+
+def test_group_json():
+    layout = StoreLayout()
+    volt = layout.slot(['grid', 'Voltage'])
+    pv1 = layout.slot(['input', 'pv1', 'Voltage'])
+    store = ValueStore(layout)
+    store.update(volt, False, 230)
+    store.update(pv1, False, 33.5)
+    assert store.group_json('input') == json.dumps({'pv1': {'Voltage': 33.5}})
+
+    # the payload is cached until the next update of the group
+    payload = store.group_json('grid')
+    assert payload == json.dumps({'Voltage': 230})
+    assert payload is store.group_json('grid')
+    store.update(volt, False, 231)
+    assert store.group_json('grid') == json.dumps({'Voltage': 231})
+    store['grid'] = {'Voltage': 232}
+    assert store.group_json('grid') == json.dumps({'Voltage': 232})
+
+    store.clear()
+    with pytest.raises(KeyError):
+        store.group_json('grid')
+
+
+def test_publish_filter_flush(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('value_store.time.monotonic', lambda: now[0])
+    layout = StoreLayout()
+    freq = layout.slot(['grid', 'Frequency'])
+    volt = layout.slot(['grid', 'Voltage'])
+    layout.filters = {freq: (0, 10)}
+    store = ValueStore(layout)
+    assert store.update(freq, False, 50.0)
+    assert store.update(volt, False, 230)
+    assert store.changed() == ['grid']
+    assert store.group_json('grid') == '{"Frequency": 50.0, "Voltage": 230}'
+
+    # a suppressed value invalidates the cached dict and payload
+    now[0] += 5
+    assert store.update(freq, False, 50.1) == HELD
+    assert store.group_json('grid') == '{"Frequency": 50.1, "Voltage": 230}'
+    assert store.changed() == []
+
+    # the suppressed value is reported, when the interval expires
+    assert store.flush() == []
+    now[0] += 5
+    assert store.flush() == ['grid']
+    assert store.changed() == ['grid']
+    assert store.flush() == []
+
+    # the next change within the interval is suppressed again
+    now[0] += 1
+    assert store.update(freq, False, 50.2) == HELD
+    assert store.pending
+    # a reported value clears the pending flush
+    now[0] += 10
+    assert store.update(freq, False, 50.3) == PUBLISH
+    assert not store.pending
+    assert store.flush() == []
+
+
+def test_publish_filter_bypass(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('value_store.time.monotonic', lambda: now[0])
+    layout = StoreLayout()
+    freq = layout.slot(['grid', 'Frequency'])
+    layout.filters = {freq: (0.5, 10)}
+    store = ValueStore(layout)
+    assert store.update(freq, False, 50.0) == PUBLISH
+    assert store.update(freq, False, 50.1) == HELD
+    assert store.pending
+    store.changed()
+
+    # default and config values are always published
+    assert store.update(freq, False, 50.2, filtered=False) == PUBLISH
+    assert not store.pending
+    assert store.changed() == ['grid']
+    # and are the reference of the next filtered update
+    now[0] += 10
+    assert store.update(freq, False, 50.5) == HELD
+    assert store.update(freq, False, 50.7) == PUBLISH
+
+
+@pytest.mark.asyncio
+async def test_publish_filter_flush_timer():
+    layout = StoreLayout()
+    freq = layout.slot(['grid', 'Frequency'])
+    layout.filters = {freq: (0, 0.2)}
+    store = ValueStore(layout)
+    flushed = []
+    store.flush_cb = flushed.append
+    assert store.update(freq, False, 50.0)
+    assert store.changed() == ['grid']
+    assert store.update(freq, False, 50.1) == HELD
+    assert store.flush_hdl is not None
+    await asyncio.sleep(0.3)
+    assert flushed == [['grid']]
+    assert store.flush_hdl is None
+    assert store.changed() == ['grid']
+
+    # cancel_flush stops the timer
+    assert store.update(freq, False, 50.2) == HELD
+    store.cancel_flush()
+    await asyncio.sleep(0.1)
+    assert flushed == [['grid']]